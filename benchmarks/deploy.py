@@ -0,0 +1,312 @@
+"""
+This file contains a benchmark harness for the `sdep` deploy path.
+
+It generates synthetic static sites of fixed shapes, deploys them with `Sdep`
+against either an in-process moto stand-in or a local moto server, and reports
+throughput, requests by s3 operation and peak memory for each scenario. Results
+are saved as JSON so that runs can be compared.
+
+Run `python benchmarks/deploy.py --help` for usage.
+"""
+
+# pylint: disable=import-error
+
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+import simplejson as json
+
+try:
+    from moto import mock_aws as mock_s3
+except ImportError:
+    from moto import mock_s3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# pylint: disable=wrong-import-position
+import sdep
+from sdep.app import Sdep
+from sdep.config import Config
+from sdep.metrics import DeployMetrics
+
+# The shapes of synthetic site we know how to generate. Each shape is a list of
+# `(count, size, extensions, depth)` groups of files, where counts are
+# multiplied by the `--scale` option.
+SHAPES = {
+    "tiny-files": [(2000, 1024, [".html", ".css", ".js", ".json"], 2)],
+    "small-files": [
+        (2000, 2 * 1024, [".html", ".css", ".js", ".json"], 3),
+        (1000, 12 * 1024, [".png", ".svg", ".woff2"], 3)
+    ],
+    "huge-files": [(4, 32 * 1024 * 1024, [".mp4", ".zip"], 1)],
+    "deep-tree": [(1000, 4096, [".html"], 12)],
+    "mixed": [
+        (600, 8 * 1024, [".html", ".css", ".js", ".svg"], 4),
+        (200, 256 * 1024, [".png", ".jpg", ".woff2"], 3),
+        (5, 8 * 1024 * 1024, [".mp4"], 1)
+    ]
+}
+
+# The extensions whose generated contents are compressible text.
+TEXT_EXTENSIONS = frozenset([".html", ".css", ".js", ".json", ".svg"])
+
+# The fraction of files we modify for the `update-partial` scenario.
+PARTIAL_FRACTION = 0.01
+
+BUCKET_NAME = "sdep-benchmark.com"
+
+def generate_site(site_dir, shape, scale, seed=0):
+    """
+    Generate a synthetic static site.
+
+    Args:
+        site_dir (str): The directory in which to generate the site.
+        shape (str): The name of the shape in `SHAPES`.
+        scale (float): A multiplier for the number of files.
+        seed (int): The seed for the random generator, so that the same shape
+            always generates the same site.
+
+    Returns:
+        (list, int): The paths of the generated files and their total size.
+    """
+    rand = random.Random(seed)
+    paths = []
+    total_size = 0
+
+    for group, (count, size, extensions, depth) in enumerate(SHAPES[shape]):
+        for i in range(max(1, int(count * scale))):
+            dirs = ["d{0}".format(rand.randint(0, 9)) for _ in range(rand.randint(0, depth))]
+            extension = extensions[i % len(extensions)]
+            file_dir = os.path.join(site_dir, *dirs)
+            full_path = os.path.join(file_dir, "g{0}-f{1}{2}".format(group, i, extension))
+
+            if not os.path.isdir(file_dir):
+                os.makedirs(file_dir)
+
+            with open(full_path, "wb") as site_file:
+                site_file.write(_contents(rand, size, extension))
+
+            paths.append(full_path)
+            total_size += size
+
+    return paths, total_size
+
+def _contents(rand, size, extension):
+    """
+    Generate the contents of a file: repetitive text for text extensions and
+    incompressible bytes for everything else.
+
+    Args:
+        rand (random.Random): The random generator.
+        size (int): The size of the file in bytes.
+        extension (str): The extension of the file.
+
+    Returns:
+        bytes: The contents.
+    """
+    if extension in TEXT_EXTENSIONS:
+        words = [b"static", b"site", b"deploy", b"bucket", b"<div>", b"</div>\n"]
+        chunk = b" ".join(rand.choice(words) for _ in range(256))
+        return (chunk * (size // len(chunk) + 1))[:size]
+
+    return os.urandom(size)
+
+def run_scenario(name, sdep_factory, action, files):
+    """
+    Run and measure a single deploy.
+
+    Args:
+        name (str): The name of the scenario.
+        sdep_factory (function): Creates the `Sdep` instance to deploy with.
+            We create a new instance per scenario, as a new process would.
+        action (str): Either `create` or `update`.
+        files (int): The number of files in the site.
+
+    Returns:
+        dict: The measurements.
+    """
+    start = time.time()
+    deployer = sdep_factory()
+    summary = getattr(deployer, action)()
+    elapsed = time.time() - start
+
+    metrics = deployer.metrics
+    requests = metrics.requests()
+    uploaded_bytes = metrics.counter(DeployMetrics.BYTES_SENT)
+
+    return {
+        "scenario": name,
+        "seconds": round(elapsed, 4),
+        "files": files,
+        "uploaded": summary.uploaded,
+        "skipped": summary.skipped,
+        "files_per_sec": round(files / elapsed, 2),
+        "mb_per_sec": round(uploaded_bytes / elapsed / (1024 * 1024), 2),
+        "requests": requests,
+        "total_requests": sum(requests.values()),
+        "phases": metrics.to_dict()["phases"]
+    }
+
+def benchmark_shape(shape, scale, max_workers, endpoint_url, direct_upload_max_size):
+    """
+    Benchmark the `create`, `update-noop` and `update-partial` scenarios for a
+    single shape of site.
+
+    Args:
+        shape (str): The name of the shape in `SHAPES`.
+        scale (float): A multiplier for the number of files.
+        max_workers (int): The number of upload workers.
+        endpoint_url (str): The url of a moto server, or `None` to use the in
+            process stand-in.
+        direct_upload_max_size (int): The size up to which files skip
+            `S3Transfer`, or `None` for the default.
+
+    Returns:
+        dict: The measurements for the shape.
+    """
+    work_dir = tempfile.mkdtemp(prefix="sdep-benchmark-")
+    site_dir = os.path.join(work_dir, "site")
+    paths, total_bytes = generate_site(site_dir, shape, scale)
+
+    config = Config(test_mode=True)
+    config.put(Config.SITE_DIR_FIELD, site_dir)
+    config.put(Config.DOMAIN_FIELD, BUCKET_NAME)
+    config.put(Config.MAX_WORKERS_FIELD, max_workers)
+    config.put(Config.HASH_CACHE_FILE_FIELD, os.path.join(work_dir, "hashes.sqlite"))
+    config.put(Config.ENDPOINT_URL_FIELD, endpoint_url)
+
+    if direct_upload_max_size is not None:
+        config.put(Config.DIRECT_UPLOAD_MAX_SIZE_FIELD, direct_upload_max_size)
+
+    def sdep_factory():
+        """
+        Returns:
+            Sdep: A new `Sdep` for the benchmark site.
+        """
+        return Sdep(config=config)
+
+    mock = mock_s3() if endpoint_url is None else None
+
+    if mock is not None:
+        mock.start()
+
+    try:
+        results = [
+            run_scenario("create", sdep_factory, "create", len(paths)),
+            run_scenario("update-noop", sdep_factory, "update", len(paths))
+        ]
+
+        # Touch a small fraction of the files, so the next update has a few
+        # changes to find among many unchanged files.
+        rand = random.Random(1)
+        for full_path in rand.sample(paths, max(1, int(len(paths) * PARTIAL_FRACTION))):
+            with open(full_path, "ab") as site_file:
+                site_file.write(b"changed")
+
+        results.append(run_scenario("update-partial", sdep_factory, "update",
+                                    len(paths)))
+    finally:
+        if mock is not None:
+            mock.stop()
+
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "shape": shape,
+        "files": len(paths),
+        "total_mb": round(total_bytes / (1024.0 * 1024), 2),
+        "scenarios": results,
+        "peak_rss_mb": round(_peak_rss_bytes() / (1024.0 * 1024), 2)
+    }
+
+def _peak_rss_bytes():
+    """
+    Returns:
+        int: The peak resident set size of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, while macOS reports bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+@click.command()
+@click.option("--shape", "shapes", multiple=True, type=click.Choice(sorted(SHAPES)),
+              help="The shape of site to benchmark. May be repeated. Defaults to all.")
+@click.option("--scale", type=float, default=1.0,
+              help="A multiplier for the number of files in each shape.")
+@click.option("--max-workers", type=int, default=10,
+              help="The number of upload workers.")
+@click.option("--endpoint-url", default=None,
+              help="The url of a running moto server. Defaults to in-process moto.")
+@click.option("--direct-upload-max-size", type=int, default=None,
+              help="The size up to which files skip S3Transfer. 0 disables it.")
+@click.option("--output", type=click.Path(), default=None,
+              help="The file in which to save the results as JSON.")
+@click.option("--child", is_flag=True, hidden=True)
+# pylint: disable=too-many-arguments
+def main(shapes, scale, max_workers, endpoint_url, direct_upload_max_size, output,
+         child):
+    """
+    Benchmark deploying synthetic sites with `sdep`.
+
+    Each shape runs in its own process, so that peak memory is measured per
+    shape.
+    """
+    shapes = shapes or sorted(SHAPES)
+
+    if child:
+        click.echo(json.dumps(benchmark_shape(shapes[0], scale, max_workers,
+                                              endpoint_url, direct_upload_max_size)))
+        return
+
+    shape_results = []
+
+    for shape in shapes:
+        args = [sys.executable, os.path.abspath(__file__), "--child",
+                "--shape", shape, "--scale", str(scale),
+                "--max-workers", str(max_workers)]
+
+        if endpoint_url is not None:
+            args.extend(["--endpoint-url", endpoint_url])
+
+        if direct_upload_max_size is not None:
+            args.extend(["--direct-upload-max-size", str(direct_upload_max_size)])
+
+        shape_result = json.loads(subprocess.check_output(args).decode("utf-8"))
+        shape_results.append(shape_result)
+
+        for result in shape_result["scenarios"]:
+            click.echo("{0:<12} {1:<15} {2:>8.2f}s {3:>10.1f} files/s "
+                       "{4:>8.2f} MB/s {5:>7} requests".format(
+                           shape, result["scenario"], result["seconds"],
+                           result["files_per_sec"], result["mb_per_sec"],
+                           result["total_requests"]))
+
+        click.echo("{0:<12} peak rss {1:.1f} MB".format(shape, shape_result["peak_rss_mb"]))
+
+    report = {
+        "sdep_version": sdep.__version__,
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "scale": scale,
+        "max_workers": max_workers,
+        "direct_upload_max_size": direct_upload_max_size,
+        "results": shape_results
+    }
+
+    if output is not None:
+        with open(output, "w") as output_file:
+            output_file.write(json.dumps(report, indent=2, sort_keys=True))
+
+if __name__ == "__main__":
+    # pylint: disable=no-value-for-parameter
+    main()
@@ -5,14 +5,57 @@ necessary for creating and updating a static website on S3.
 
 # pylint: disable=import-error
 
-import mimetypes
+import binascii
+import contextlib
+import copy
+import hashlib
 import os
+import shutil
+import tempfile
+import threading
+import weakref
 
-import boto3
+from collections import Counter, namedtuple
+from concurrent import futures
 
 import simplejson as json
 
-from .config import Config
+from .cache import HashCache
+from .compress import Compressor
+from .config import Config, ConfigImproperFormatError
+from .content_types import ContentTypeResolver
+from .git import GitError, GitWorkTree
+from .hashing import EtagCalculator, multipart_etag
+from .headers import HeaderRules
+from .inventory import RemoteIndex, RemoteObject
+from .journal import DeployJournal, replay
+from .manifest import Manifest
+from .metrics import DeployMetrics
+from .plan import Plan, PlanEntry, StalePlanError
+from .release import ReleaseError, ReleaseHistory
+from .scanner import IgnoreRules, SiteDirError, SiteScanner
+from .throttle import AdaptiveLimiter, ThrottleController
+from .transfer import TransferPolicy
+from .watch import SiteWatcher
+
+# UploadSummary is the result of a call to `Sdep#upload_files_to_s3`, recording
+# how many files we sent to s3, how many we copied from an object already on s3
+# with the same contents, how many we skipped because the copy on s3 was
+# already identical, and how many stale objects we pruned from s3.
+UploadSummary = namedtuple("UploadSummary", "uploaded copied skipped deleted")
+
+# ReleaseSummary is the result of a call to `Sdep#release`, recording the id of
+# the release we made live, how many of its files we uploaded and how many live
+# keys we copied within the bucket to make it live.
+ReleaseSummary = namedtuple("ReleaseSummary", "release_id uploaded copied")
+
+class DeleteObjectsError(Exception):
+    """
+    A specialized error we raise when s3 refuses to delete some of the objects
+    we asked it to prune.
+    """
+    # pylint: disable=too-few-public-methods
+    pass
 
 class Sdep(object):
     """
@@ -21,18 +64,87 @@ class Sdep(object):
 
     Args:
         config (Config): The configuration to use for this specific action.
+        s3_client (Optional[S3.Client]): A client shared with other sites, as
+            made by `connect`. By default, we connect our own.
+        executor (Optional[concurrent.futures.Executor]): A pool of workers
+            shared with other sites, in which we store and delete files. By
+            default, we start a pool of `max_workers` threads for each batch.
+        metrics (Optional[DeployMetrics]): The metrics to record to, i.e.
+            those of the site whose bucket we mirror.
 
     Returns:
         sdep: An instance of the `Sdep` class.
+
+    Raises:
+        ConfigImproperFormatError: If a target has no `bucket_name`.
     """
 
     # Constant names of AWS objects.
     BUCKET_NAME = "bucket_name"
 
-    def __init__(self, config):
+    # The size of the chunks in which we read files when computing their
+    # digest, so that hashing a large file does not require reading it into
+    # memory all at once.
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    # The maximum number of keys s3 accepts in a single `delete_objects` call.
+    DELETE_BATCH_SIZE = 1000
+
+    # The fields of a target which, when missing, we take from the site.
+    TARGET_FIELDS = {
+        "bucket_name": Config.DOMAIN_FIELD,
+        "region": Config.REGION_FIELD,
+        "aws_access_key_id": Config.AWS_ACCESS_KEY_ID_FIELD,
+        "aws_secret_access_key": Config.AWS_SECRET_ACCESS_KEY_FIELD,
+        "endpoint_url": Config.ENDPOINT_URL_FIELD
+    }
+
+    # The fields which decide the files we deploy and the bytes and headers of
+    # their objects, besides the files themselves.
+    SOURCE_SETTINGS_FIELDS = [
+        Config.FOLLOW_SYMLINKS_FIELD,
+        Config.COMPRESS_FIELD,
+        Config.COMPRESS_ENCODING_FIELD,
+        Config.COMPRESS_TYPES_FIELD,
+        Config.COMPRESS_MIN_RATIO_FIELD,
+        Config.HEADERS_FIELD,
+        Config.CONTENT_TYPES_FIELD
+    ]
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, config, s3_client=None, executor=None, metrics=None):
         self._config = config
-        self._s3_client = self._establish_s3_client()
-        self._s3_transfer = self._establish_s3_transfer(self._s3_client)
+        self._metrics = metrics or DeployMetrics()
+        self._transfer_policy = TransferPolicy(
+            self.config.get_json(Config.TRANSFER_CLASSES_FIELD) or None)
+        self._client = s3_client
+        self._transfers = None
+        self._client_lock = threading.Lock()
+        self._executor = executor
+        self._etags = EtagCalculator(self._transfer_policy,
+                                     chunk_size=self.HASH_CHUNK_SIZE)
+        self._direct_upload_max_size = self.config.get_int(
+            Config.DIRECT_UPLOAD_MAX_SIZE_FIELD) or 0
+        # We read these settings only once we deploy, so we check them here to
+        # report one which is not a number before we start.
+        self._max_workers()
+        self._verify_sample_size()
+        self._remote_index = None
+        self._index_from_manifest = False
+        self._manifest_invalidated = False
+        self._manifest_lock = threading.Lock()
+        # The commit and settings digest the bucket's manifest records, if our
+        # index came from a manifest which records them.
+        self._manifest_source = None
+        self._journal = None
+        self._hash_cache = self._establish_hash_cache()
+        self._compressor = self._establish_compressor()
+        self._header_rules = HeaderRules(
+            self.config.get_json(Config.HEADERS_FIELD) or [])
+        self._content_types = ContentTypeResolver(
+            self.config.get_json(Config.CONTENT_TYPES_FIELD))
+        self._mirrors = [Sdep(mirror_config, executor=executor, metrics=self._metrics)
+                         for mirror_config in self._mirror_configs()]
 
     @property
     def config(self):
@@ -51,58 +163,284 @@ class Sdep(object):
         """
         return self._config
 
-    def _establish_s3_client(self):
+    @property
+    def metrics(self):
+        """
+        The timings and counters recorded by every action this instance has
+        taken, including requests by s3 operation.
+
+        Returns:
+            DeployMetrics: The metrics.
+        """
+        return self._metrics
+
+    @property
+    def _s3_client(self):
+        """
+        The client we use to communicate with s3, connected the first time we
+        need it, so that commands which never reach s3 (or fail before they
+        do) pay for neither importing boto3 nor creating the client.
+
+        Returns:
+            S3.Client: The client.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.connect(
+                        self.config, self._max_workers(),
+                        self._transfer_policy.max_concurrency(), self._metrics)
+
+        return self._client
+
+    @property
+    def _s3_transfers(self):
+        """
+        Our `S3Transfer` objects, created the first time we upload a file
+        through one.
+
+        Returns:
+            [boto.s3.transfer.S3Transfer]: Our S3Transfer objects, indexed by
+                `TransferPolicy.class_index`.
+        """
+        if self._transfers is None:
+            s3_client = self._s3_client
+
+            with self._client_lock:
+                if self._transfers is None:
+                    self._transfers = self._establish_s3_transfers(s3_client)
+
+        return self._transfers
+
+    @staticmethod
+    def connect(config, max_workers, max_concurrency, metrics):
         """
-        Return a boto3 client connected to s3 with the configured auth tokens.
+        Return a boto3 client connected to s3 with the configured auth tokens,
+        whose requests are counted in `metrics` and adapted to throttling.
+
+        Args:
+            config (Config): The configuration with the auth tokens.
+            max_workers (int): The number of files we upload at once.
+            max_concurrency (int): The most parts of a single multipart
+                upload we send at once.
+            metrics (DeployMetrics): The metrics in which we record requests.
 
         Returns:
             S3.Client: The client we use to communicate with s3.
         """
+        # boto3 takes a good part of a second to import, so we only import it
+        # once we are about to talk to s3.
+        import boto3
+
+        from botocore.config import Config as BotocoreConfig
+
         # We will not even be attempting to create an instance of the `Sdep`
         # class, unless these values exist, so we are confident they do.
-        access_key = self.config.get(Config.AWS_ACCESS_KEY_ID_FIELD)
-        secret_key = self.config.get(Config.AWS_SECRET_ACCESS_KEY_FIELD)
+        access_key = config.get(Config.AWS_ACCESS_KEY_ID_FIELD)
+        secret_key = config.get(Config.AWS_SECRET_ACCESS_KEY_FIELD)
 
-        return boto3.client("s3", aws_access_key_id=access_key,
-                            aws_secret_access_key=secret_key)
+        # botocore only keeps 10 connections open by default, so without
+        # raising the pool size most of our upload workers would sit waiting
+        # for a connection instead of sending data. A multipart upload uses up
+        # to its class's concurrency in connections on top of its worker's.
+        # Our `ThrottleController` retries throttled requests itself, within
+        # the same number of attempts as botocore's retries of other errors.
+        max_connections = max_workers + max_concurrency
+        client_config = BotocoreConfig(
+            max_pool_connections=max_connections,
+            retries={"mode": "standard",
+                     "max_attempts": ThrottleController.MAX_ATTEMPTS})
 
-    @staticmethod
-    def _establish_s3_transfer(s3_client):
+        # An endpoint url is only configured when talking to an s3 compatible
+        # service other than AWS, such as a local moto server.
+        s3_client = boto3.client("s3", aws_access_key_id=access_key,
+                                 aws_secret_access_key=secret_key,
+                                 region_name=config.get(Config.REGION_FIELD),
+                                 endpoint_url=config.get(Config.ENDPOINT_URL_FIELD),
+                                 config=client_config)
+
+        metrics.attach(s3_client)
+        ThrottleController(AdaptiveLimiter(max_workers, max_connections),
+                           metrics=metrics).attach(s3_client)
+
+        return s3_client
+
+    def _establish_s3_transfers(self, s3_client):
         """
         To upload a file with a specified `ContentType`, which we need to do or
         else it is assumed that everything is a `binary/octet-stream`, we need
         to use `boto.s3.transfer.S3Transfer#upload_file` instead of `S3.Client`.
 
+        We create one `S3Transfer` for each class of our transfer policy, rather
+        than relying on the defaults, because the right settings for a favicon
+        and a video differ, and because we must predict the `ETag` of what we
+        upload.
+
         Args:
             s3_client (S3.Client): The S3 Client we will use for our connection.
 
         Returns:
-            boto.s3.transfer.S3Transfer: Our S3Transfer object.
+            [boto.s3.transfer.S3Transfer]: Our S3Transfer objects, indexed by
+                `TransferPolicy.class_index`.
+        """
+        from boto3.s3.transfer import S3Transfer
+
+        return [S3Transfer(s3_client, config=transfer_config)
+                for transfer_config in self._transfer_policy.transfer_configs()]
+
+    def _mirror_configs(self):
+        """
+        The configuration of each additional bucket in `targets`, to which we
+        deploy the same site. A target only needs a `bucket_name`: its region,
+        credentials and endpoint default to the site's.
+
+        Returns:
+            [Config]: The configurations of the mirrors.
+
+        Raises:
+            ConfigImproperFormatError: If a target has no `bucket_name`.
+        """
+        mirror_configs = []
+
+        for target in self.config.get_json(Config.TARGETS_FIELD) or []:
+            if not isinstance(target, dict) or not target.get("bucket_name"):
+                raise ConfigImproperFormatError(
+                    "Every target needs a `bucket_name`: {0}".format(target))
+
+            mirror_config = copy.deepcopy(self.config)
+
+            for target_field, field in self.TARGET_FIELDS.items():
+                if target.get(target_field) is not None:
+                    mirror_config.put(field, target[target_field])
+
+            # We scan, hash and compress the site once, for every target, so a
+            # mirror needs neither a hash cache nor targets of its own.
+            mirror_config.put(Config.TARGETS_FIELD, [])
+            mirror_config.put(Config.HASH_CACHE_FILE_FIELD, "")
+            mirror_config.put(Config.COMPRESS_FIELD, False)
+            mirror_configs.append(mirror_config)
+
+        return mirror_configs
+
+    def _targets(self):
+        """
+        Returns:
+            [Sdep]: Every bucket we deploy to: ours, then our mirrors'.
+        """
+        return [self] + self._mirrors
+
+    def _establish_hash_cache(self):
+        """
+        Open the local cache of file digests, unless the configuration disables
+        it by setting the cache file to an empty value.
+
+        Returns:
+            HashCache: The cache or `None` if caching is disabled.
+        """
+        cache_file = self.config.get(Config.HASH_CACHE_FILE_FIELD)
+
+        if not cache_file:
+            return None
+
+        return HashCache(os.path.expanduser(cache_file))
+
+    def _establish_compressor(self):
+        """
+        Create the `Compressor` we use to precompress text files, unless
+        compression is disabled. Compressed output is kept next to the hash
+        cache, or if the hash cache is disabled, in a temporary directory which
+        we remove once this instance is garbage collected or we exit.
+
+        Returns:
+            Compressor: The compressor or `None` if compression is disabled.
+        """
+        if not self.config.get_bool(Config.COMPRESS_FIELD):
+            return None
+
+        cache_file = self.config.get(Config.HASH_CACHE_FILE_FIELD)
+
+        if cache_file:
+            cache_dir = os.path.join(
+                os.path.dirname(os.path.expanduser(cache_file)), "compressed")
+        else:
+            cache_dir = tempfile.mkdtemp(prefix="sdep-")
+            weakref.finalize(self, shutil.rmtree, cache_dir, True)
+
+        return Compressor(
+            cache_dir,
+            encoding=self.config.get(Config.COMPRESS_ENCODING_FIELD),
+            content_types=self.config.get_list(Config.COMPRESS_TYPES_FIELD),
+            min_ratio=self.config.get_float(Config.COMPRESS_MIN_RATIO_FIELD),
+            max_cache_size=self.config.get_int(Config.COMPRESS_CACHE_MAX_SIZE_FIELD)
+        )
+
+    def clear_hash_cache(self):
+        """
+        Invalidate the cached digests of every file in this site, so that the
+        next deploy hashes all of them again.
         """
-        return boto3.s3.transfer.S3Transfer(s3_client)
+        if self._hash_cache is not None:
+            self._hash_cache.clear(self.config.get(Config.SITE_DIR_FIELD))
 
-    def create(self):
+    def close(self):
+        """
+        Close the local hash cache (and those of our targets), once we are done
+        deploying with this `Sdep`. A later deploy hashes every file again.
+        """
+        for target in self._targets():
+            if target._hash_cache is not None:
+                target._hash_cache.close()
+                target._hash_cache = None
+
+    def create(self, resume=False):
         """
         Perform the initial creation of the static website on AWS. This command
         will perform the following actions:
         - Create the s3 buckets with the proper permissions.
         - Upload all of the files.
         - Configure the s3 bucket to serve as a website.
+
+        Every bucket in `targets` is created and configured in the same way.
+
+        Args:
+            resume (bool): Whether to resume an interrupted deploy.
+
+        Returns:
+            UploadSummary: The number of files uploaded, skipped and deleted.
         """
-        self.create_s3_buckets()
-        self.upload_files_to_s3()
-        self.configure_bucket_as_website()
+        with self._metrics.phase(DeployMetrics.TOTAL):
+            for target in self._targets():
+                target.create_s3_buckets()
 
-    def update(self):
+            # If the bucket already existed and holds some of our files, there
+            # is no reason to upload them again.
+            summary = self.upload_files_to_s3(only_changed=True, resume=resume)
+
+            for target in self._targets():
+                target.configure_bucket_as_website()
+
+        return summary
+
+    def update(self, prune=False, resume=False):
         """
         Update the static website on AWS. This will perform the following
         actions:
         - Update static files that have changed.
+        - Optionally, delete objects whose local file no longer exists.
+
+        Args:
+            prune (bool): Whether to delete stale objects from s3.
+            resume (bool): Whether to resume an interrupted deploy.
+
+        Returns:
+            UploadSummary: The number of files uploaded, skipped and deleted.
         """
         # Because s3 uses the same operations for `create` and `updating` an
-        # object on s3, we can just reuse the same function.
-        # @TODO In the future, we should only update the files that changed.
-        self.upload_files_to_s3()
+        # object on s3, we can just reuse the same function, only asking it to
+        # skip the files s3 already has.
+        with self._metrics.phase(DeployMetrics.TOTAL):
+            return self.upload_files_to_s3(only_changed=True, prune=prune,
+                                           resume=resume)
 
     def create_s3_buckets(self):
         """
@@ -111,10 +449,23 @@ class Sdep(object):
         AWS specifies that we must name the bucket the same name as our domain.
         """
         bucket_name = self._bucket_name()
+        create_args = {}
+        region = self.config.get(Config.REGION_FIELD)
+
+        # s3 creates buckets in us-east-1 unless told otherwise, and refuses
+        # to be told us-east-1 explicitly.
+        if region is not None and region != "us-east-1":
+            create_args["CreateBucketConfiguration"] = {"LocationConstraint": region}
 
-        self._s3_client.create_bucket(Bucket=bucket_name)
-        self._s3_client.put_bucket_policy(
-            Bucket=bucket_name, Policy=self._public_bucket_policy(bucket_name))
+        with self._metrics.phase(DeployMetrics.CREATE_BUCKETS):
+            # Outside us-east-1, s3 refuses to create a bucket we already own
+            # rather than returning it, which we expect when we resume.
+            try:
+                self._s3_client.create_bucket(Bucket=bucket_name, **create_args)
+            except self._s3_client.exceptions.BucketAlreadyOwnedByYou:
+                pass
+            self._s3_client.put_bucket_policy(
+                Bucket=bucket_name, Policy=self._public_bucket_policy(bucket_name))
 
         # @TODO
         # This is where we will perform the check to see if we should also
@@ -124,137 +475,1865 @@ class Sdep(object):
         # @TODO This is where we will optionally configure logging (which would
         # require the creation of additional buckets).
 
-    def upload_files_to_s3(self):
+    def upload_files_to_s3(self, only_changed=False, prune=False, resume=False):
         """
         Upload every file from the static website directory to s3.
+
+        With `targets`, we scan, hash and compress the site once, then compare
+        each file against the index of every bucket, and send it to each bucket
+        which needs it. Small files are read once and the same bytes sent to
+        every such bucket. The summary then counts objects across buckets.
+
+        When `site_dir` is a clean git work tree, we record the commit we
+        deployed in the manifest. If every bucket's manifest records a commit
+        (deployed with the same settings), we ask git which files changed since
+        and deploy only those, including their deletions, rather than scanning
+        the site. The summary then only counts the files git reported. A dirty
+        tree, or a commit missing from our history, means a full scan.
+
+        Args:
+            only_changed (bool): If set, we compare the md5 digest of each local
+                file with the `ETag` of the object already on s3 (as recorded in
+                `remote_index`), and only upload the files which are new or
+                whose contents changed. At the end, we store a manifest of the
+                bucket so the next deploy does not need to list it.
+            prune (bool): If set, once every file is uploaded we delete the
+                objects on s3 which no longer have a local file.
+            resume (bool): If set, and a deploy to this bucket was interrupted,
+                we start from what its journal says the bucket holds, rather
+                than from the bucket's manifest or listing, and complete or
+                abort the multipart uploads it left behind.
+
+        Returns:
+            UploadSummary: The number of files uploaded, skipped and deleted.
+        """
+        targets = self._targets()
+
+        if resume:
+            for target in targets:
+                target._resume()
+
+        remote_indexes = [target.remote_index() if only_changed or prune else None
+                          for target in targets]
+
+        git_tree = None
+        source = None
+
+        if only_changed:
+            git_tree = GitWorkTree.find(self.config.get(Config.SITE_DIR_FIELD))
+            source = self._deploy_source(git_tree)
+
+        if source is not None:
+            summary = self._sync_git_changes(git_tree, source, prune)
+
+            if summary is not None:
+                return summary
+
+        deleted = 0
+        local_keys = set()
+
+        stored = self._store_everywhere(self._changed_files(
+            [(target, remote_index if only_changed else None)
+             for target, remote_index in zip(targets, remote_indexes)],
+            local_keys))
+        uploaded = stored[DeployMetrics.FILES_UPLOADED]
+        copied = stored[DeployMetrics.FILES_COPIED]
+
+        # Every local file we did not store was skipped as unchanged.
+        skipped = len(local_keys) * len(targets) - uploaded - copied
+
+        if self._hash_cache is not None:
+            self._hash_cache.flush()
+
+        # We only prune once every upload has finished, so that a renamed file
+        # exists under its new key before we remove the old one.
+        if prune:
+            deleted = sum(target.prune_remote_objects(local_keys)
+                          for target in targets)
+
+        for target, remote_index in zip(targets, remote_indexes):
+            # There is no need to rewrite a manifest we read at the start of
+            # this run if nothing changed since.
+            if remote_index is not None and (target._manifest_invalidated or
+                                             not target._index_from_manifest or
+                                             target._manifest_source != source):
+                target._write_manifest(source)
+
+            # Without an index we write no manifest, but the deploy is still
+            # done.
+            target._finish_journal()
+
+        # We count in local variables and record the totals once, to keep the
+        # per-file loop as light as possible.
+        self._metrics.incr(DeployMetrics.FILES_SCANNED, len(local_keys))
+        self._metrics.incr(DeployMetrics.FILES_SKIPPED, skipped)
+        self._metrics.incr(DeployMetrics.FILES_UPLOADED, uploaded)
+        self._metrics.incr(DeployMetrics.FILES_COPIED, copied)
+
+        return UploadSummary(uploaded=uploaded, copied=copied, skipped=skipped,
+                             deleted=deleted)
+
+    def watch(self, prune=False, watcher=None):
+        """
+        Deploy the site, then keep deploying each batch of files which change,
+        until interrupted.
+
+        We keep our client, remote index and hash cache for as long as we watch,
+        so each batch only costs the requests for the files it changed.
+
+        Args:
+            prune (bool): Whether the first deploy (and any deploy after we
+                lost track of the site) deletes the objects on s3 which no
+                longer have a local file. Files deleted while we watch are
+                always deleted from s3.
+            watcher (Optional[SiteWatcher]): The watcher reporting changes.
+                Defaults to watching `site_dir`.
+
+        Yields:
+            UploadSummary: The number of files uploaded, skipped and deleted
+                by the first deploy and by each batch of changes.
+        """
+        if watcher is None:
+            watcher = SiteWatcher(self.config.get(Config.SITE_DIR_FIELD))
+
+        # We start watching before the first deploy, so that we miss nothing
+        # changed while it runs.
+        watcher.start()
+
+        yield self.upload_files_to_s3(only_changed=True, prune=prune)
+
+        for key_names in watcher.batches():
+            if key_names is None:
+                yield self.upload_files_to_s3(only_changed=True, prune=prune)
+            else:
+                yield self.sync_files(key_names)
+
+    def sync_files(self, key_names):
+        """
+        Bring the objects for `key_names` in line with the local files: upload
+        the files which changed and delete the objects whose file no longer
+        exists. Files rewritten with the same bytes and headers are skipped.
+        With `targets`, we do so in every bucket.
+
+        Args:
+            key_names (iterable): The keys, relative to `site_dir`.
+
+        Returns:
+            UploadSummary: The number of files uploaded, skipped and deleted.
+        """
+        return self._sync_files(key_names)
+
+    def _sync_files(self, key_names, source=None):
+        """
+        Perform the uploads and deletions for `sync_files`.
+
+        Args:
+            key_names (iterable): The keys, relative to `site_dir`.
+            source ((str, str)): The commit and settings digest to record in
+                the manifest, if `site_dir` now holds exactly that commit.
+
+        Returns:
+            UploadSummary: The number of files uploaded, skipped and deleted.
         """
         site_dir = self.config.get(Config.SITE_DIR_FIELD)
+        targets = [(target, target.remote_index()) for target in self._targets()]
+        protected_prefixes = tuple(self._protected_prefixes())
+        ignore_rules = self._ignore_rules()
 
-        for path, _, files in os.walk(site_dir):
-            for file_name in files:
-                full_path = os.path.join(path, file_name)
+        local_keys = set()
+        missing_keys = []
+        uploads = []
 
-                # We want the key name to be the full path, assuming we treat
-                # `site_dir` as the root. We add `+ 1` to cut off a `/`.
-                key_name = full_path[len(site_dir) + 1:]
+        for key_name in sorted(key_names):
+            # A full scan would never have seen an ignored file, so we neither
+            # upload it nor delete its object.
+            if ignore_rules.ignores_path(key_name):
+                continue
 
-                content_type = self.predict_content_type(key_name)
+            full_path = os.path.join(site_dir, key_name)
 
-                self._s3_transfer.upload_file(full_path, self._bucket_name(),
-                                              key_name,
-                                              extra_args={"ContentType": content_type})
+            if os.path.isfile(full_path):
+                local_keys.add(key_name)
+                uploads.extend(self._changed_file(targets, full_path, key_name))
+            elif not key_name.startswith(protected_prefixes):
+                missing_keys.append(key_name)
 
-    def configure_bucket_as_website(self):
+        stored = self._store_everywhere(uploads)
+        uploaded = stored[DeployMetrics.FILES_UPLOADED]
+        copied = stored[DeployMetrics.FILES_COPIED]
+        skipped = len(local_keys) * len(targets) - uploaded - copied
+        deleted = 0
+
+        if self._hash_cache is not None:
+            self._hash_cache.flush()
+
+        for target, remote_index in targets:
+            stale_keys = [key for key in missing_keys if key in remote_index]
+
+            if stale_keys:
+                with self._metrics.phase(DeployMetrics.PRUNE):
+                    deleted += target._delete_keys(stale_keys)
+
+            if target._manifest_invalidated or target._manifest_source != source:
+                target._write_manifest(source)
+
+        self._metrics.incr(DeployMetrics.FILES_SCANNED, len(local_keys))
+        self._metrics.incr(DeployMetrics.FILES_SKIPPED, skipped)
+        self._metrics.incr(DeployMetrics.FILES_UPLOADED, uploaded)
+        self._metrics.incr(DeployMetrics.FILES_COPIED, copied)
+        self._metrics.incr(DeployMetrics.FILES_DELETED, deleted)
+
+        return UploadSummary(uploaded=uploaded, copied=copied, skipped=skipped,
+                             deleted=deleted)
+
+    def _deploy_source(self, git_tree):
         """
-        For a bucket to serve as a static website, AWS requires some specific
-        configuration.
+        Args:
+            git_tree (GitWorkTree): The work tree `site_dir` is in, if any.
+
+        Returns:
+            (str, str): The commit `site_dir` holds and a digest of the settings
+                which shape our objects, or `None` if `site_dir` is not a clean
+                git work tree.
         """
-        self._s3_client.put_bucket_website(
-            Bucket=self._bucket_name(),
-            WebsiteConfiguration=self._website_config()
-        )
+        if git_tree is None:
+            return None
 
-    def aws_naming(self):
+        ignore_rules = self._ignore_rules()
+
+        # git never reports `.git` itself as changed, so we can only trust it
+        # if a full scan would leave `.git` out too.
+        if not ignore_rules.ignores(".git", is_dir=True):
+            return None
+
+        try:
+            # Uncommitted changes to files we would not deploy anyway do not
+            # matter.
+            if any(not ignore_rules.ignores_path(path)
+                   for path in git_tree.uncommitted_paths()):
+                return None
+
+            return git_tree.head(), self._settings_digest(ignore_rules)
+        except GitError:
+            return None
+
+    def _settings_digest(self, ignore_rules):
         """
-        Many of our methods for generating the names that we use for AWS objects
-        (like buckets) are private, which makes sense. However, often in tests
-        we need to access these names. As such, this method returns a hash of
-        all AWS specific names. The implementation of this method means we can
-        access the information while keeping private methods private.
+        A digest of the settings which decide which files we deploy and the
+        bytes and headers of their objects. Changing them can change objects
+        whose file did not change, so git cannot tell us what to deploy until
+        we scanned the site once with the new settings.
+
+        Args:
+            ignore_rules (IgnoreRules): The files of the site we leave out.
 
         Returns:
-            dict: A dictionary of the names of aws objects.
+            str: The digest.
         """
-        return {self.BUCKET_NAME: self._bucket_name()}
+        settings = [self.config.get(field) for field in self.SOURCE_SETTINGS_FIELDS]
+        settings.append(ignore_rules.patterns)
 
+        return hashlib.md5(
+            json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
 
-    def _bucket_name(self):
+    def _sync_git_changes(self, git_tree, source, prune):
         """
-        The name of the bucket we use for hosting our static site.
+        Deploy only the files git reports as changed since the commit every
+        bucket's manifest records.
+
+        Args:
+            git_tree (GitWorkTree): The work tree `site_dir` is in.
+            source ((str, str)): The commit we deploy and our settings digest.
+            prune (bool): Whether to also delete every stale object.
 
         Returns:
-            str: The bucket name.
+            UploadSummary: The number of files uploaded, skipped and deleted, or
+                `None` if git cannot tell us what changed, and we must scan.
         """
-        return self.config.get(Config.DOMAIN_FIELD)
+        targets = self._targets()
+        deployed = set(target._manifest_source for target in targets)
 
-    @staticmethod
-    def _public_bucket_policy(bucket_name):
+        if len(deployed) != 1:
+            return None
+
+        deployed_source = deployed.pop()
+
+        if deployed_source is None or deployed_source[1] != source[1]:
+            return None
+
+        try:
+            key_names = git_tree.changed_paths(deployed_source[0])
+            local_keys = self._committed_keys(git_tree) if prune else None
+        except GitError:
+            return None
+
+        summary = self._sync_files(key_names, source=source)
+
+        if prune:
+            deleted = sum(target.prune_remote_objects(local_keys)
+                          for target in targets)
+            summary = summary._replace(deleted=summary.deleted + deleted)
+
+            for target in targets:
+                if target._manifest_invalidated:
+                    target._write_manifest(source)
+
+        return summary
+
+    def _committed_keys(self, git_tree):
         """
-        A helper method for getting a bucket policy which allows anyone to view
-        our static website.
+        Args:
+            git_tree (GitWorkTree): The clean work tree `site_dir` is in.
+
+        Returns:
+            set: The key of every file a full scan would find, which are the
+                committed files `.sdepignore` does not leave out.
+        """
+        ignore_rules = self._ignore_rules()
+
+        return set(path for path in git_tree.files()
+                   if not ignore_rules.ignores_path(path))
+
+    def plan(self, prune=False):
+        """
+        Compute every change a deploy would make to the bucket, without making
+        any of them. The plan can be saved and later passed to `apply`.
 
         Args:
-            bucket_name (str): The bucket for which we are creating the policy.
+            prune (bool): Whether the plan should delete the objects on s3
+                which no longer have a local file.
 
         Returns:
-            str: A json dump of the policy.
+            Plan: The plan.
         """
+        with self._metrics.phase(DeployMetrics.TOTAL):
+            # We learn the manifest's `ETag` before reading the bucket, so that
+            # a deploy which slips in between makes the plan stale rather than
+            # silently wrong.
+            manifest_etag = Manifest.head(self._s3_client, self._bucket_name())
+            remote_index = self.remote_index()
 
-        json_policy = {
-            "Version":"2012-10-17",
-            "Statement": [{
-                "Sid": "Allow Public Access to All Objects",
-                "Effect": "Allow",
-                "Principal": "*",
-                "Action": "s3:GetObject",
-                "Resource": "arn:aws:s3:::{0}/*".format(bucket_name)
-            }]
-        }
+            entries = []
+            local_keys = set()
+            local_files = self._metrics.timed_iter(DeployMetrics.SCAN,
+                                                   self._local_files())
 
-        return json.dumps(json_policy)
+            for full_path, key_name, stat_result in local_files:
+                local_keys.add(key_name)
+                entry = self._plan_entry(remote_index.get(key_name), full_path,
+                                         key_name, stat_result)
 
-    def _website_config(self):
+                if entry is not None:
+                    entries.append(entry)
+
+            # Every local file we do not plan to upload is unchanged.
+            skipped = len(local_keys) - len(entries)
+
+            if prune:
+                entries.extend(PlanEntry(Plan.DELETE, key, None, None, None, None, None)
+                               for key in self._stale_keys(local_keys))
+
+            if self._hash_cache is not None:
+                self._hash_cache.flush()
+
+        self._metrics.incr(DeployMetrics.FILES_SCANNED, len(local_keys))
+
+        return Plan(self._bucket_name(), manifest_etag,
+                    Manifest.from_index(remote_index), entries, skipped=skipped)
+
+    def apply(self, plan):
         """
-        Helper method returning the configuration for the api call to transform
-        our bucket into a website.
+        Make the changes recorded in `plan`, without walking the site or
+        listing the bucket. We check that neither the bucket nor any file we
+        upload changed since the plan was made before changing anything.
+
+        Args:
+            plan (Plan): The plan to apply.
 
         Returns:
-            dict: Configuration stored within a dictionary.
+            UploadSummary: The number of files uploaded, skipped and deleted.
+
+        Raises:
+            StalePlanError: If the bucket or the local files changed since the
+                plan was made.
         """
-        website_config = {
-            "IndexDocument": {
-                "Suffix": self._config.get(Config.INDEX_SUFFIX_FIELD)
-            },
-            "ErrorDocument": {
-                "Key": self._config.get(Config.ERROR_KEY_FIELD)
-            }
-        }
+        with self._metrics.phase(DeployMetrics.TOTAL):
+            plan.check_bucket(self._s3_client, self._bucket_name(),
+                              sample_size=self._verify_sample_size())
+            plan.check_local_files(self.config.get(Config.SITE_DIR_FIELD))
 
-        return website_config
+            # The plan's baseline is the bucket as it still is, so it can stand
+            # in for listing the bucket.
+            self._remote_index = plan.baseline.to_index()
+            self._index_from_manifest = plan.manifest_etag is not None
 
-    @staticmethod
-    def predict_content_type(key):
+            stored = self._store_all(
+                (self._plan_body(entry), entry.key, entry.extra_args, entry.etag)
+                for entry in plan.uploads())
+            uploaded = stored[DeployMetrics.FILES_UPLOADED]
+            copied = stored[DeployMetrics.FILES_COPIED]
+
+            deleted = 0
+            delete_keys = [entry.key for entry in plan.deletes()]
+
+            if delete_keys:
+                with self._metrics.phase(DeployMetrics.PRUNE):
+                    deleted = self._delete_keys(delete_keys)
+
+                self._metrics.incr(DeployMetrics.FILES_DELETED, deleted)
+
+            if uploaded > 0 or copied > 0 or deleted > 0 or not self._index_from_manifest:
+                self._write_manifest()
+
+        self._metrics.incr(DeployMetrics.FILES_SKIPPED, plan.skipped)
+        self._metrics.incr(DeployMetrics.FILES_UPLOADED, uploaded)
+        self._metrics.incr(DeployMetrics.FILES_COPIED, copied)
+
+        return UploadSummary(uploaded=uploaded, copied=copied, skipped=plan.skipped,
+                             deleted=deleted)
+
+    def release(self):
+        """
+        Deploy the site as a new release and make it live.
+
+        The bytes of every file are stored once below the release prefix, named
+        after their `ETag`, so a release only uploads the files no earlier
+        release had, and every release is recorded in a manifest of its own.
+        Making a release live copies, within the bucket, the stored bytes onto
+        each key whose live object differs from the release, and deletes the
+        live keys the release does not have. Releasing contents identical to an
+        earlier release only makes that release live again.
+
+        Returns:
+            ReleaseSummary: The id of the release, the number of files we
+                uploaded and the number of live keys we copied to make it live.
+
+        Raises:
+            ReleaseError: If the bucket holds objects which no release put
+                there, i.e. from `update`, which releasing would overwrite.
         """
-        Predict the `ContentType` we upload as part of the keys metadata.
+        uploaded = 0
+
+        with self._metrics.phase(DeployMetrics.TOTAL):
+            history = ReleaseHistory.fetch(self._s3_client, self._bucket_name())
+
+            if history.active is None and self._live_keys():
+                raise ReleaseError(
+                    "The bucket '{0}' holds objects which no release stored there. "
+                    "Empty it, or keep deploying it with update, rather than "
+                    "releasing into it.".format(self._bucket_name()))
+
+            files = []
+            local_files = self._metrics.timed_iter(DeployMetrics.SCAN,
+                                                   self._local_files())
+
+            for full_path, key_name, stat_result in local_files:
+                body_path, extra_args = self._prepare_upload(full_path, key_name)
+                files.append((body_path, key_name, extra_args,
+                              self._local_etag(body_path, stat_result=(
+                                  stat_result if body_path == full_path else None))))
+
+            if self._hash_cache is not None:
+                self._hash_cache.flush()
+
+            release_id = ReleaseHistory.release_id(
+                (key_name, etag, extra_args) for _, key_name, extra_args, etag in files)
+
+            if release_id not in history:
+                uploaded = self._store_release(history, release_id, files)
+
+            copied = self._activate_release(history, release_id)
+
+        self._metrics.incr(DeployMetrics.FILES_SCANNED, len(files))
+        self._metrics.incr(DeployMetrics.FILES_UPLOADED, uploaded)
+        self._metrics.incr(DeployMetrics.FILES_COPIED, copied)
+
+        return ReleaseSummary(release_id=release_id, uploaded=uploaded, copied=copied)
+
+    def rollback(self, release_id=None):
+        """
+        Make an earlier release live again. Its bytes are all in the bucket
+        already, so this only copies the keys which differ between the live
+        release and it, within the bucket.
 
         Args:
-            key (str): The key name.
+            release_id (Optional[str]): The release to make live. Defaults to
+                the release which was live before the live one.
 
         Returns:
-            str: The predicted content type (i.e. 'text/html').
+            str: The id of the release now live.
+
+        Raises:
+            ReleaseError: If there is no such release.
         """
-        # If we do not specify a content-type, s3 assumes everything is
-        # a `binary/octet-stream`.
-        content_type, _ = mimetypes.guess_type(key)
-
-        unrecognized_mappings = {
-            "eot": "application/vnd.ms-fontobject",
-            "ttf": "application/font-sfnt",
-            "woff": "application/font-woff",
-            "otf": "font/opentype",
-            "scss": "text/css",
-            "sass": "text/css",
-            "htc": "text/x-component"
-        }
+        with self._metrics.phase(DeployMetrics.TOTAL):
+            history = ReleaseHistory.fetch(self._s3_client, self._bucket_name())
 
-        if content_type is None:
-            _, file_extension = os.path.splitext(key)
+            if release_id is None:
+                release_id = history.previous()
 
-            for extension, poss_type in unrecognized_mappings.items():
-                if extension in file_extension:
-                    content_type = poss_type
+            history.get(release_id)
+            copied = self._activate_release(history, release_id)
 
-        # The content type to return if we unable to match.
-        default_content_type = "text/plain"
+        self._metrics.incr(DeployMetrics.FILES_COPIED, copied)
 
-        return content_type or default_content_type
+        return release_id
+
+    def _store_release(self, history, release_id, files):
+        """
+        Upload the bytes of every file of a new release which no earlier release
+        stored, followed by the release's manifest, and record the release in
+        `history`.
+
+        Args:
+            history (ReleaseHistory): The release history.
+            release_id (str): The id of the new release.
+            files (list): A `(body_path, key_name, extra_args, etag)` tuple for
+                every file in the release.
+
+        Returns:
+            int: The number of files we uploaded.
+        """
+        stored_etags = ReleaseHistory.stored_etags(self._s3_client, self._bucket_name())
+        calls = []
+
+        for body_path, _, extra_args, etag in files:
+            if etag not in stored_etags:
+                stored_etags.add(etag)
+                calls.append((body_path, ReleaseHistory.object_key(etag), extra_args))
+
+        self._run_bounded(self._transfer_file, calls)
+
+        release_manifest = Manifest(
+            RemoteObject(key=key_name, etag=etag, size=os.path.getsize(body_path),
+                         last_modified=None, content_type=extra_args["ContentType"],
+                         headers={k: v for k, v in extra_args.items()
+                                  if k != "ContentType"})
+            for body_path, key_name, extra_args, etag in files)
+
+        with self._metrics.phase(DeployMetrics.MANIFEST):
+            release_manifest.put(self._s3_client, self._bucket_name(),
+                                 key=ReleaseHistory.manifest_key(release_id))
+
+        history.add(release_id, len(files))
+
+        return len(calls)
+
+    def _activate_release(self, history, release_id):
+        """
+        Make a release live, by copying its stored bytes onto every live key
+        which differs from it and then deleting the live keys it does not have,
+        and record it as live in `history`.
+
+        We compare against our remote index of the bucket rather than the
+        manifest of the release we think is live, so keys an `update` or an
+        interrupted activation changed since are put right too. Keys below a
+        protected prefix are never deleted.
+
+        Args:
+            history (ReleaseHistory): The release history.
+            release_id (str): The id of the release.
+
+        Returns:
+            int: The number of live keys we copied.
+
+        Raises:
+            ReleaseError: If the release's manifest is missing from the bucket.
+        """
+        release_manifest = Manifest.fetch(self._s3_client, self._bucket_name(),
+                                          key=ReleaseHistory.manifest_key(release_id))
+
+        if release_manifest is None:
+            raise ReleaseError("The manifest of release '{0}' is missing from the "
+                               "bucket.".format(release_id))
+
+        remote_index = self.remote_index()
+        calls = []
+
+        for remote_object in release_manifest.to_index():
+            extra_args = dict(remote_object.headers or {},
+                              ContentType=remote_object.content_type)
+            live_object = remote_index.get(remote_object.key)
+
+            if live_object is None or not self._is_unchanged(
+                    live_object, remote_object.etag, extra_args):
+                calls.append((remote_object, extra_args))
+
+        release_keys = set(remote_object.key
+                           for remote_object in release_manifest.to_index())
+        stale_keys = sorted(key for key in self._live_keys() if key not in release_keys)
+
+        if calls:
+            self._invalidate_manifest()
+            self._run_bounded(self._activate_object, calls)
+
+        # We only delete once every key of the release is live, so no page of
+        # the release links to a key we already removed.
+        if stale_keys:
+            self._delete_keys(stale_keys)
+
+        if calls or stale_keys or not self._index_from_manifest:
+            self._write_manifest()
+
+        history.activate(release_id)
+        history.put(self._s3_client, self._bucket_name())
+
+        return len(calls)
+
+    def _activate_object(self, remote_object, extra_args):
+        """
+        Copy the stored bytes of a single file of a release onto its live key.
+        This method is safe to call from multiple worker threads at once.
+
+        Args:
+            remote_object (RemoteObject): The file, from the release's manifest.
+            extra_args (dict): The arguments, such as `ContentType`, with which
+                we store the live object.
+        """
+        copy_etag = self._copy_object(ReleaseHistory.object_key(remote_object.etag),
+                                      remote_object.key, extra_args, remote_object.size)
+        self._record_object(remote_object.key, copy_etag, remote_object.size,
+                            extra_args)
+
+    def _live_keys(self):
+        """
+        Returns:
+            list: The keys in our bucket which are not below a protected prefix,
+                i.e. those the website serves.
+        """
+        protected_prefixes = tuple(self._protected_prefixes())
+
+        return [key for key in self.remote_index().keys()
+                if not key.startswith(protected_prefixes)]
+
+    def _changed_files(self, targets, local_keys):
+        """
+        Generate the uploads of every local file to every target whose object
+        differs from it, adding the key of every local file to `local_keys` as
+        we go.
+
+        Args:
+            targets (list): Each target `Sdep` (ourselves, then our mirrors)
+                with the index to compare against, or `None` to upload every
+                file to it.
+            local_keys (set): The set to which we add every local key.
+
+        Yields:
+            (Sdep, str, str, dict, str, bytes): The uploads, as returned by
+                `_changed_file`.
+        """
+        local_files = self._metrics.timed_iter(DeployMetrics.SCAN, self._local_files())
+
+        for full_path, key_name, stat_result in local_files:
+            local_keys.add(key_name)
+
+            for upload in self._changed_file(targets, full_path, key_name,
+                                             stat_result):
+                yield upload
+
+    def _changed_file(self, targets, full_path, key_name, stat_result=None):
+        """
+        Work out the uploads of a local file to each target whose object does
+        not already match it.
+
+        We prepare and hash the file once, however many targets there are.
+        When several targets need a file which we send in a single request, we
+        also read it once here, and send the same bytes to each.
+
+        Args:
+            targets (list): Each target `Sdep` with the index to compare
+                against, or `None` to always upload the file to it.
+            full_path (str): The path to the local file.
+            key_name (str): The key under which we store the file.
+            stat_result (Optional[os.stat_result]): The `stat` of the file, if
+                we already have it.
+
+        Returns:
+            [(Sdep, str, str, dict, str, bytes)]: For each target which needs
+                the file, the target, the path to the bytes to upload, the key,
+                the arguments to upload with, the `ETag` of the bytes if we
+                computed it and the bytes if we read them.
+        """
+        body_path, extra_args = self._prepare_upload(full_path, key_name)
+
+        # Compressing leaves us other bytes, whose `stat` we do not have.
+        if body_path != full_path:
+            stat_result = None
+
+        # The `ETag` we computed for the bytes, by the remote `ETag` we compared
+        # them with, since the part sizes we try depend on it.
+        local_etags = {}
+        changed = []
+
+        for target, remote_index in targets:
+            remote_object = remote_index.get(key_name) if remote_index is not None else None
+            local_etag = None
+
+            if remote_object is not None:
+                if remote_object.etag not in local_etags:
+                    local_etags[remote_object.etag] = self._local_etag(
+                        body_path, remote_object.etag, stat_result)
+
+                local_etag = local_etags[remote_object.etag]
+
+                if self._is_unchanged(remote_object, local_etag, extra_args):
+                    continue
+
+            changed.append((target, local_etag))
+
+        if not changed:
+            return []
+
+        body = None
+        upload_etag = None
+
+        if len(changed) > 1:
+            upload_etag = self._local_etag(body_path, stat_result=stat_result)
+            body_size = (stat_result.st_size if stat_result is not None
+                         else os.path.getsize(body_path))
+
+            if self._sends_directly(body_size):
+                with open(body_path, "rb") as body_file:
+                    body = body_file.read()
+
+        return [(target, body_path, key_name, extra_args, local_etag or upload_etag,
+                 body)
+                for target, local_etag in changed]
+
+    def _store_all(self, uploads):
+        """
+        Store files in parallel with up to `max_workers` threads.
+
+        Whenever the bucket already holds an object with the same bytes as a
+        file (i.e. because the file was renamed or is duplicated elsewhere in
+        the site), we copy that object within the bucket instead of uploading
+        the file. A file with the same bytes as another file we are uploading
+        in this run waits until that upload is done, and is then copied.
+
+        Args:
+            uploads (iterable): The uploads, each a tuple of the arguments to
+                `_upload_file`.
+
+        Returns:
+            Counter: The number of files uploaded (`FILES_UPLOADED`) and
+                copied (`FILES_COPIED`).
+        """
+        return self._store_everywhere((self,) + tuple(upload) + (None,)
+                                      for upload in uploads)
+
+    def _store_everywhere(self, uploads):
+        """
+        Store files in the buckets of our targets, as `_store_all` does in ours,
+        in a single pool of workers.
+
+        A copy reads its source while other workers are storing files, so it
+        must never read a key this run replaces. We therefore first store the
+        files whose keys are new to their bucket, which only ever copy from
+        objects nothing in this run changes, and only then the files replacing
+        an existing object, which never copy from a key one of them replaces.
+
+        Args:
+            uploads (iterable): The uploads, each the target `Sdep`, the
+                arguments to its `_upload_file` and the bytes to upload, if we
+                already read them.
+
+        Returns:
+            Counter: The number of objects uploaded (`FILES_UPLOADED`) and
+                copied (`FILES_COPIED`), across every bucket.
+        """
+        deferred = []
+        overwrites = []
+
+        stored = self._run_bounded(self._store_on,
+                                   self._with_sources(uploads, deferred,
+                                                      overwrites=overwrites))
+        stored.update(self._run_bounded(self._store_on, deferred))
+
+        if overwrites:
+            deferred = []
+            replaced = set((target, key_name)
+                           for target, _, key_name, _, _, _ in overwrites)
+
+            stored.update(self._run_bounded(self._store_on,
+                                            self._with_sources(overwrites, deferred,
+                                                               replaced=replaced)))
+            stored.update(self._run_bounded(self._store_on, deferred))
+
+        return stored
+
+    def _with_sources(self, uploads, deferred, overwrites=None, replaced=frozenset()):
+        """
+        Find an object to copy for each upload, in the bucket of its target.
+        The uploads whose bytes are already being uploaded to the same bucket
+        under another key are added to `deferred` instead, with that key as
+        their source.
+
+        Args:
+            uploads (iterable): The uploads, as passed to `_store_everywhere`.
+            deferred (list): The list to which we add the deferred copies.
+            overwrites (Optional[list]): If given, the list to which we add the
+                uploads replacing an object already in their target's bucket,
+                instead of storing them. We leave out the bytes we read for
+                them, which we read again when we store them.
+            replaced (set): The `(target, key)` of every object this run
+                replaces, none of which we copy from.
+
+        Yields:
+            (Sdep, str, str, dict, str, str, bytes): The target, the arguments
+                to its `_store_file`.
+        """
+        in_flight = {}
+
+        for target, body_path, key_name, extra_args, local_etag, body in uploads:
+            local_etag = local_etag or self._local_etag(body_path)
+            source_key = None
+
+            if target._remote_index is not None:
+                if overwrites is not None and key_name in target._remote_index:
+                    overwrites.append((target, body_path, key_name, extra_args,
+                                       local_etag, None))
+                    continue
+
+                source_key = target._remote_index.find(local_etag)
+
+                if (target, source_key) in replaced:
+                    source_key = None
+
+            if source_key is None:
+                if (target, local_etag) in in_flight:
+                    deferred.append((target, body_path, key_name, extra_args, local_etag,
+                                     in_flight[(target, local_etag)], body))
+                    continue
+
+                in_flight[(target, local_etag)] = key_name
+
+            yield target, body_path, key_name, extra_args, local_etag, source_key, body
+
+    @staticmethod
+    def _store_on(target, *args):
+        """
+        Store a single file in the bucket of `target`.
+
+        Args:
+            target (Sdep): The target, i.e. ourselves or one of our mirrors.
+            *args: The arguments to its `_store_file`.
+
+        Returns:
+            str: Either `FILES_UPLOADED` or `FILES_COPIED`.
+        """
+        return target._store_file(*args)
+
+    def _store_file(self, body_path, key_name, extra_args, local_etag, source_key,
+                    body=None):
+        """
+        Store a single file in our bucket, by copying `source_key` if it is set
+        and by uploading the file otherwise. This method is safe to call from
+        multiple worker threads at once.
+
+        Args:
+            body_path (str): The path to the bytes to upload.
+            key_name (str): The key under which we store the file.
+            extra_args (dict): The arguments, such as `ContentType`, with which
+                we store the file.
+            local_etag (str): The `ETag` s3 assigns if we upload the bytes.
+            source_key (Optional[str]): The key of an object with the same
+                bytes.
+            body (Optional[bytes]): The bytes at `body_path`, if we already
+                read them.
+
+        Returns:
+            str: Either `FILES_UPLOADED` or `FILES_COPIED`.
+        """
+        if source_key is None:
+            self._upload_file(body_path, key_name, extra_args, local_etag, body=body)
+            return DeployMetrics.FILES_UPLOADED
+
+        self._invalidate_manifest()
+
+        body_size = os.path.getsize(body_path) if body is None else len(body)
+        copy_etag = self._copy_object(source_key, key_name, extra_args, body_size)
+
+        # We copy in the parts we would upload in, so a copy of the same bytes
+        # has the `ETag` of the file. If it does not, the source changed since
+        # we indexed it (i.e. someone else wrote to the bucket meanwhile), and
+        # we upload the file over the copy.
+        if copy_etag != local_etag:
+            self._upload_file(body_path, key_name, extra_args, local_etag, body=body)
+            return DeployMetrics.FILES_UPLOADED
+
+        self._record_object(key_name, copy_etag, body_size, extra_args)
+
+        return DeployMetrics.FILES_COPIED
+
+    def _copy_object(self, source_key, key_name, extra_args, size):
+        """
+        Copy an object within our bucket, giving the copy the headers in
+        `extra_args` rather than those of the source.
+
+        A single `copy_object` request cannot copy more than 5 GB, so objects
+        which our transfer policy would upload in parts are copied in parts too,
+        with the managed `copy` and the same part size, which keeps the `ETag`
+        of the copy the one we predict for the file.
+
+        Args:
+            source_key (str): The key of the object to copy.
+            key_name (str): The key of the copy.
+            extra_args (dict): The arguments, such as `ContentType`, with which
+                we store the copy.
+            size (int): The size of the object in bytes.
+
+        Returns:
+            str: The unquoted `ETag` of the copy.
+        """
+        bucket_name = self._bucket_name()
+        copy_source = {"Bucket": bucket_name, "Key": source_key}
+
+        if self._transfer_policy.part_size(size) is None:
+            with self._metrics.phase(DeployMetrics.COPY):
+                resp = self._s3_client.copy_object(
+                    Bucket=bucket_name, Key=key_name, CopySource=copy_source,
+                    MetadataDirective="REPLACE", **extra_args)
+
+            return resp["CopyObjectResult"]["ETag"].strip('"')
+
+        transfer_config = self._transfer_policy.transfer_configs()[
+            self._transfer_policy.class_index(size)]
+
+        with self._metrics.phase(DeployMetrics.COPY):
+            self._s3_client.copy(copy_source, bucket_name, key_name,
+                                 ExtraArgs=dict(extra_args, MetadataDirective="REPLACE"),
+                                 Config=transfer_config)
+
+        # The managed copy does not report the `ETag` of what it made.
+        return self._s3_client.head_object(Bucket=bucket_name,
+                                           Key=key_name)["ETag"].strip('"')
+
+    def _run_bounded(self, func, calls):
+        """
+        Call `func` once per tuple of arguments in `calls`, in parallel with up
+        to `max_workers` threads, or in the shared pool of workers if we have
+        one. Either way, we keep at most twice `max_workers` calls pending.
+
+        Args:
+            func (function): The function to call, which must be thread safe.
+            calls (iterable): The tuples of arguments.
+
+        Returns:
+            Counter: The number of calls which returned each value.
+        """
+        completed = Counter()
+        max_workers = self._max_workers()
+
+        # We bound the number of calls we have submitted but not yet finished,
+        # so that a site with many files does not queue a future for every
+        # single one of them up front.
+        max_pending = max_workers * 2
+        pending = set()
+
+        with self._workers() as executor:
+            for args in calls:
+                if len(pending) >= max_pending:
+                    done, pending = futures.wait(
+                        pending, return_when=futures.FIRST_COMPLETED)
+                    completed.update(self._count_completed(done))
+
+                pending.add(executor.submit(func, *args))
+
+            done, _ = futures.wait(pending)
+            completed.update(self._count_completed(done))
+
+        return completed
+
+    @contextlib.contextmanager
+    def _workers(self):
+        """
+        The pool of workers in which we store and delete files, for use with a
+        `with` statement.
+
+        Yields:
+            concurrent.futures.Executor: The pool shared with other sites, or
+                else a pool of `max_workers` threads, which we shut down when
+                the `with` statement ends.
+        """
+        if self._executor is not None:
+            yield self._executor
+        else:
+            with futures.ThreadPoolExecutor(max_workers=self._max_workers()) as executor:
+                yield executor
+
+    def _plan_entry(self, remote_object, full_path, key_name, stat_result=None):
+        """
+        Decide how a plan should change the object for a single local file.
+
+        Args:
+            remote_object (Optional[RemoteObject]): The object currently on s3.
+            full_path (str): The path to the local file.
+            key_name (str): The key under which we store the file.
+            stat_result (Optional[os.stat_result]): The `stat` of the file, if
+                we already have it.
+
+        Returns:
+            PlanEntry: The change or `None` if the object is already identical.
+        """
+        if stat_result is None:
+            stat_result = os.stat(full_path)
+
+        body_path, extra_args = self._prepare_upload(full_path, key_name)
+        local_etag = self._local_etag(
+            body_path, remote_object.etag if remote_object is not None else None,
+            stat_result if body_path == full_path else None)
+
+        if remote_object is None:
+            action = Plan.UPLOAD
+        elif self._is_unchanged(remote_object, local_etag, extra_args):
+            return None
+        elif remote_object.etag == local_etag:
+            action = Plan.HEADERS
+        else:
+            action = Plan.OVERWRITE
+
+        source_etag = None
+
+        if body_path != full_path:
+            source_etag = self._local_etag(full_path, stat_result=stat_result)
+
+        return PlanEntry(action, key_name, local_etag, stat_result.st_size,
+                         stat_result.st_mtime_ns, extra_args, source_etag)
+
+    def _plan_body(self, entry):
+        """
+        Find the bytes to upload for a planned upload, which are either the
+        local file or its compressed copy.
+
+        Args:
+            entry (PlanEntry): The planned upload.
+
+        Returns:
+            str: The path to the bytes to upload.
+
+        Raises:
+            StalePlanError: If the plan compresses the file in a way our
+                configuration cannot.
+        """
+        full_path = os.path.join(self.config.get(Config.SITE_DIR_FIELD), entry.key)
+        encoding = entry.extra_args.get("ContentEncoding")
+
+        if encoding is None:
+            return full_path
+
+        if self._compressor is None or self._compressor.encoding != encoding:
+            raise StalePlanError(
+                "The plan compresses files with '{0}', which is not configured.".format(
+                    encoding))
+
+        # The compressed copy is cached by digest, so this normally finds the
+        # copy we made while planning.
+        with self._metrics.phase(DeployMetrics.COMPRESS):
+            compressed_path = self._compressor.compress(full_path, entry.source_etag)
+
+        if compressed_path is None:
+            raise StalePlanError(
+                "'{0}' no longer compresses as planned.".format(entry.key))
+
+        return compressed_path
+
+    def prune_remote_objects(self, local_keys):
+        """
+        Delete every object in the bucket which does not correspond to a key
+        in `local_keys`, except for those below a protected prefix.
+
+        We delete with `delete_objects`, which removes up to `DELETE_BATCH_SIZE`
+        keys per request, and send the batches in parallel.
+
+        Args:
+            local_keys (set): The keys of every file in the static website
+                directory.
+
+        Returns:
+            int: The number of objects deleted.
+
+        Raises:
+            DeleteObjectsError: If s3 failed to delete any of the objects.
+            SiteDirError: If `local_keys` is empty while the bucket is not.
+        """
+        with self._metrics.phase(DeployMetrics.PRUNE):
+            deleted = self._prune_remote_objects(local_keys)
+
+        self._metrics.incr(DeployMetrics.FILES_DELETED, deleted)
+
+        return deleted
+
+    def _prune_remote_objects(self, local_keys):
+        """
+        Perform the deletions for `prune_remote_objects`.
+
+        Args:
+            local_keys (set): The keys of every file in the static website
+                directory.
+
+        Returns:
+            int: The number of objects deleted.
+        """
+        stale_keys = self._stale_keys(local_keys)
+
+        if not stale_keys:
+            return 0
+
+        return self._delete_keys(stale_keys)
+
+    def _stale_keys(self, local_keys):
+        """
+        Find the objects in the bucket which do not correspond to a key in
+        `local_keys` and are not below a protected prefix.
+
+        Args:
+            local_keys (set): The keys of every file in the static website
+                directory.
+
+        Returns:
+            list: The stale keys, sorted.
+
+        Raises:
+            SiteDirError: If `local_keys` is empty while the bucket is not.
+                An empty site is far more likely a broken build or a wrong
+                `site_dir` than a wish to delete every object.
+        """
+        protected_prefixes = tuple(self._protected_prefixes())
+        stale_keys = sorted(key for key in self.remote_index().keys()
+                            if key not in local_keys and
+                            not key.startswith(protected_prefixes))
+
+        if stale_keys and not local_keys:
+            raise SiteDirError(
+                "Refusing to prune: the site directory '{0}' has no files to "
+                "deploy, so pruning would delete every object in the "
+                "bucket.".format(self.config.get(Config.SITE_DIR_FIELD)))
+
+        return stale_keys
+
+    def _delete_keys(self, keys):
+        """
+        Delete `keys` from our bucket, in parallel batches of up to
+        `DELETE_BATCH_SIZE` keys.
+
+        Args:
+            keys (list): The keys to delete.
+
+        Returns:
+            int: The number of objects deleted.
+
+        Raises:
+            DeleteObjectsError: If s3 failed to delete any of the objects.
+        """
+        self._invalidate_manifest()
+
+        batches = [keys[i:i + self.DELETE_BATCH_SIZE]
+                   for i in range(0, len(keys), self.DELETE_BATCH_SIZE)]
+
+        with self._workers() as executor:
+            errors = []
+
+            for batch_errors in executor.map(self._delete_batch, batches):
+                errors.extend(batch_errors)
+
+        if errors:
+            raise DeleteObjectsError(
+                "Failed to delete: {0}".format(", ".join(e["Key"] for e in errors)))
+
+        return len(keys)
+
+    def _delete_batch(self, keys):
+        """
+        Delete a single batch of keys from our bucket and from our index.
+
+        Args:
+            keys (list): At most `DELETE_BATCH_SIZE` keys.
+
+        Returns:
+            list: The errors s3 returned for the keys it did not delete.
+        """
+        resp = self._s3_client.delete_objects(
+            Bucket=self._bucket_name(),
+            Delete={
+                "Objects": [{"Key": key} for key in keys],
+                "Quiet": True
+            }
+        )
+
+        errors = resp.get("Errors", [])
+        failed_keys = set(e["Key"] for e in errors)
+
+        for key in keys:
+            if key not in failed_keys:
+                self.remote_index().discard(key)
+
+                if self._journal is not None:
+                    self._journal.record_delete(key)
+
+        return errors
+
+    def _protected_prefixes(self):
+        """
+        The key prefixes we never prune. These always include the prefix under
+        which `sdep` keeps its own objects.
+
+        Returns:
+            list: The protected prefixes.
+        """
+        return [Manifest.PREFIX] + self.config.get_list(Config.PROTECTED_PREFIXES_FIELD)
+
+    def _prepare_upload(self, full_path, key_name):
+        """
+        Work out exactly what we would upload for a local file: which bytes
+        (the file itself or its compressed copy) and with which arguments
+        (its content type and the headers from the configured rules).
+
+        Args:
+            full_path (str): The path to the local file.
+            key_name (str): The key under which we store the file.
+
+        Returns:
+            (str, dict): The path to the bytes to upload and the arguments, such
+                as `ContentType`, to upload them with.
+        """
+        with self._metrics.phase(DeployMetrics.CONTENT_TYPE):
+            # Headers from the configured rules, including an explicit
+            # `Content-Type`, take precedence over the predicted content type.
+            extra_args = {"ContentType": self._content_types.resolve(key_name)}
+            extra_args.update(self._header_rules.resolve(key_name))
+            content_type = extra_args["ContentType"]
+
+        if self._compressor is not None and self._compressor.should_compress(content_type):
+            digest = self._local_etag(full_path)
+
+            with self._metrics.phase(DeployMetrics.COMPRESS):
+                compressed_path = self._compressor.compress(full_path, digest)
+
+            if compressed_path is not None:
+                extra_args["ContentEncoding"] = self._compressor.encoding
+                return compressed_path, extra_args
+
+        return full_path, extra_args
+
+    @staticmethod
+    def _is_unchanged(remote_object, local_etag, extra_args):
+        """
+        Determine whether the object on s3 already matches the local file, both
+        in contents and, when we know them, in headers.
+
+        Args:
+            remote_object (RemoteObject): The object currently on s3.
+            local_etag (str): The `ETag` of the bytes we would upload.
+            extra_args (dict): The arguments we would upload the file with.
+
+        Returns:
+            bool: Whether we can skip uploading the file.
+        """
+        if remote_object.etag != local_etag:
+            return False
+
+        # A listing does not include the `ContentType` or other headers, so we
+        # can only compare them when we learned them from a manifest.
+        if remote_object.content_type is not None:
+            headers = {k: v for k, v in extra_args.items() if k != "ContentType"}
+
+            return (remote_object.content_type == extra_args["ContentType"] and
+                    (remote_object.headers or {}) == headers)
+
+        return True
+
+    def _upload_file(self, body_path, key_name, extra_args, local_etag=None,
+                     body=None):
+        """
+        Upload a single file to our bucket. This method is safe to call from
+        multiple worker threads at once.
+
+        Args:
+            body_path (str): The path to the bytes to upload, which is either
+                the local file or its compressed copy.
+            key_name (str): The key under which we store the file.
+            extra_args (dict): The arguments, such as `ContentType`, with which
+                we upload the file.
+            local_etag (Optional[str]): The `ETag` of the file, if we already
+                computed it, which we record in the remote index.
+            body (Optional[bytes]): The bytes at `body_path`, if we already
+                read them.
+        """
+        self._invalidate_manifest()
+
+        body_size = self._transfer_file(body_path, key_name, extra_args, body=body)
+
+        if self._remote_index is not None:
+            self._record_object(key_name, local_etag or self._local_etag(body_path),
+                                body_size, extra_args)
+
+    def _transfer_file(self, body_path, key_name, extra_args, body=None):
+        """
+        Send the bytes at `body_path` to our bucket, with the transfer settings
+        of their size class.
+
+        Files of at most `direct_upload_max_size` bytes which we would upload
+        in a single request anyway skip `S3Transfer` and go out with a single
+        `put_object`, since for them its futures and bookkeeping cost more than
+        sending the bytes.
+
+        Args:
+            body_path (str): The path to the bytes to upload.
+            key_name (str): The key under which we store the bytes.
+            extra_args (dict): The arguments, such as `ContentType`, with which
+                we upload the bytes.
+            body (Optional[bytes]): The bytes at `body_path`, if we already
+                read them to send to several buckets.
+
+        Returns:
+            int: The number of bytes sent.
+        """
+        body_size = os.path.getsize(body_path) if body is None else len(body)
+
+        if body is not None or self._sends_directly(body_size):
+            if body is None:
+                with open(body_path, "rb") as body_file:
+                    body = body_file.read()
+
+            with self._metrics.phase(DeployMetrics.UPLOAD):
+                self._s3_client.put_object(Bucket=self._bucket_name(), Key=key_name,
+                                           Body=body, **extra_args)
+        else:
+            s3_transfer = self._s3_transfers[self._transfer_policy.class_index(body_size)]
+
+            with self._metrics.phase(DeployMetrics.UPLOAD):
+                s3_transfer.upload_file(body_path, self._bucket_name(), key_name,
+                                        extra_args=extra_args)
+
+        self._metrics.incr(DeployMetrics.BYTES_SENT, body_size)
+
+        return body_size
+
+    def _sends_directly(self, body_size):
+        """
+        Args:
+            body_size (int): The size of the bytes to upload.
+
+        Returns:
+            bool: Whether we send the bytes with a single `put_object` rather
+                than through `S3Transfer`.
+        """
+        return (body_size <= self._direct_upload_max_size and
+                self._transfer_policy.part_size(body_size) is None)
+
+    def _record_object(self, key_name, etag, size, extra_args):
+        """
+        Record an object we stored in the journal and in the remote index, if
+        we have them. This keeps the index reflecting the bucket for the rest of
+        the run, so a later `update` on this instance does not store the file
+        again, and so the manifest we write at the end is accurate.
+
+        Args:
+            key_name (str): The key of the object.
+            etag (str): The `ETag` of the object.
+            size (int): The size of the object in bytes.
+            extra_args (dict): The arguments, such as `ContentType`, with which
+                we stored the object.
+        """
+        if self._journal is not None:
+            self._journal.record_put(key_name, etag, size, extra_args)
+
+        if self._remote_index is None:
+            return
+
+        headers = {k: v for k, v in extra_args.items() if k != "ContentType"}
+
+        self._remote_index.add(RemoteObject(
+            key=key_name, etag=etag, size=size, last_modified=None,
+            content_type=extra_args["ContentType"], headers=headers))
+
+    def _invalidate_manifest(self):
+        """
+        Delete the manifest from the bucket before we first change the bucket
+        during this run. If the deploy then dies halfway, the next one finds no
+        manifest and falls back to listing the bucket, instead of trusting a
+        manifest which no longer matches it.
+
+        This is also when we start the journal of the deploy, with the objects
+        in the bucket before any change as its baseline.
+
+        Several upload workers may call this at once, in which case the first
+        deletes the manifest and the others wait until it is gone.
+        """
+        with self._manifest_lock:
+            if not self._manifest_invalidated:
+                journal_file = self._journal_file()
+
+                if journal_file is not None:
+                    baseline = (Manifest.from_index(self._remote_index)
+                                if self._remote_index is not None else None)
+                    self._journal = DeployJournal.begin(journal_file,
+                                                        self._bucket_name(), baseline)
+
+                Manifest.delete(self._s3_client, self._bucket_name())
+                self._manifest_invalidated = True
+                self._manifest_source = None
+
+    def _write_manifest(self, source=None):
+        """
+        Store a manifest of the bucket, built from our remote index, in the
+        bucket.
+
+        Args:
+            source ((str, str)): The commit the bucket now holds and the digest
+                of the settings we stored it with, if we know them.
+        """
+        commit, settings = source or (None, None)
+
+        with self._metrics.phase(DeployMetrics.MANIFEST):
+            Manifest.from_index(self.remote_index(), commit=commit,
+                                settings=settings).put(self._s3_client,
+                                                       self._bucket_name())
+        self._index_from_manifest = True
+        self._manifest_source = source
+        self._manifest_invalidated = False
+        self._finish_journal()
+
+    def _journal_file(self):
+        """
+        Returns:
+            str: The path of the journal of deploys to our bucket, or `None` if
+                the configuration disables journals by setting the journal
+                directory to an empty value.
+        """
+        journal_dir = self.config.get(Config.JOURNAL_DIR_FIELD)
+
+        if not journal_dir:
+            return None
+
+        return os.path.join(os.path.expanduser(journal_dir),
+                            "{0}.journal".format(self._bucket_name()))
+
+    def _finish_journal(self):
+        """
+        Remove the journal of this deploy, once the bucket no longer needs it to
+        be recovered.
+        """
+        if self._journal is not None:
+            self._journal.finish()
+            self._journal = None
+
+    def _resume(self):
+        """
+        Pick up from where an interrupted deploy to our bucket left off.
+
+        The journal's baseline plus every object it recorded is what the bucket
+        holds, so it becomes our remote index, and every file the interrupted
+        deploy stored compares as unchanged. If the bucket has a manifest, a
+        deploy finished since, and we ignore the journal.
+        """
+        journal_file = self._journal_file()
+
+        if journal_file is None:
+            return
+
+        journal = DeployJournal.read(journal_file, self._bucket_name())
+
+        if journal is None or Manifest.head(self._s3_client,
+                                            self._bucket_name()) is not None:
+            return
+
+        baseline, entries = journal
+
+        with self._metrics.phase(DeployMetrics.INDEX):
+            if baseline is not None:
+                self._remote_index = baseline.to_index()
+            else:
+                self._remote_index = RemoteIndex.build(
+                    self._s3_client, self._bucket_name(),
+                    max_workers=self._max_workers())
+
+            replay(self._remote_index, entries)
+
+        # The bucket has no manifest until we write one at the end.
+        self._index_from_manifest = False
+        self._manifest_source = None
+
+        self._recover_multipart_uploads()
+
+    def _recover_multipart_uploads(self):
+        """
+        Deal with the multipart uploads an interrupted deploy left in our
+        bucket, whose parts s3 keeps (and bills for) until they are completed
+        or aborted. We complete the uploads for which every part was sent and
+        matches the local file, and abort the others, except below a protected
+        prefix.
+        """
+        bucket_name = self._bucket_name()
+        site_dir = self.config.get(Config.SITE_DIR_FIELD)
+        protected_prefixes = tuple(self._protected_prefixes())
+
+        paginator = self._s3_client.get_paginator("list_multipart_uploads")
+        uploads = [upload for page in paginator.paginate(Bucket=bucket_name)
+                   for upload in page.get("Uploads", [])]
+
+        for upload in uploads:
+            key_name = upload["Key"]
+
+            if key_name.startswith(protected_prefixes):
+                continue
+
+            full_path = os.path.join(site_dir, key_name)
+
+            if os.path.isfile(full_path) and self._complete_multipart_upload(
+                    full_path, key_name, upload["UploadId"]):
+                self._metrics.incr(DeployMetrics.MULTIPART_COMPLETED)
+            else:
+                self._s3_client.abort_multipart_upload(
+                    Bucket=bucket_name, Key=key_name, UploadId=upload["UploadId"])
+                self._metrics.incr(DeployMetrics.MULTIPART_ABORTED)
+
+    def _complete_multipart_upload(self, full_path, key_name, upload_id):
+        """
+        Complete a multipart upload of a local file, if every part was sent and
+        the parts match the file's current contents.
+
+        Args:
+            full_path (str): The path to the local file.
+            key_name (str): The key of the upload.
+            upload_id (str): The id of the upload.
+
+        Returns:
+            bool: Whether we completed the upload.
+        """
+        bucket_name = self._bucket_name()
+        body_path, extra_args = self._prepare_upload(full_path, key_name)
+
+        paginator = self._s3_client.get_paginator("list_parts")
+        parts = [part for page in paginator.paginate(Bucket=bucket_name, Key=key_name,
+                                                      UploadId=upload_id)
+                 for part in page.get("Parts", [])]
+
+        if not parts:
+            return False
+
+        part_size = parts[0]["Size"]
+
+        if ([part["PartNumber"] for part in parts] != list(range(1, len(parts) + 1)) or
+                any(part["Size"] != part_size for part in parts[:-1]) or
+                sum(part["Size"] for part in parts) != os.path.getsize(body_path)):
+            return False
+
+        etag = multipart_etag([binascii.unhexlify(part["ETag"].strip('"'))
+                               for part in parts])
+
+        if self._file_etags(body_path, [part_size])[part_size] != etag:
+            return False
+
+        self._invalidate_manifest()
+
+        self._s3_client.complete_multipart_upload(
+            Bucket=bucket_name, Key=key_name, UploadId=upload_id,
+            MultipartUpload={"Parts": [{"ETag": part["ETag"],
+                                        "PartNumber": part["PartNumber"]}
+                                       for part in parts]})
+
+        # The upload was started with the headers of its time, which we only
+        # trust if they are still the ones we would upload with. `Expires`
+        # comes back parsed, so we do not compare it.
+        head = self._s3_client.head_object(Bucket=bucket_name, Key=key_name)
+
+        if all(head.get(arg) == value for arg, value in extra_args.items()
+               if arg != "Expires"):
+            self._record_object(key_name, etag, os.path.getsize(body_path), extra_args)
+
+        return True
+
+    @staticmethod
+    def _count_completed(done):
+        """
+        Count the results of finished futures, re-raising the error of any
+        call that failed.
+
+        Args:
+            done (set): A set of completed `concurrent.futures.Future`.
+
+        Returns:
+            Counter: The number of futures which returned each value.
+        """
+        # `result` re-raises any exception raised in the worker thread.
+        return Counter(future.result() for future in done)
+
+    def _max_workers(self):
+        """
+        The maximum number of files we upload at once.
+
+        Returns:
+            int: The number of upload workers.
+        """
+        return max(1, self.config.get_int(Config.MAX_WORKERS_FIELD))
+
+    def _verify_sample_size(self):
+        """
+        The number of keys we check against the bucket before trusting a
+        manifest or a plan's baseline.
+
+        Returns:
+            int: The sample size.
+        """
+        return self.config.get_int(Config.MANIFEST_VERIFY_SAMPLE_SIZE_FIELD)
+
+    def _local_files(self):
+        """
+        Generate the path, key name and `stat` of every file in the static
+        website directory which `.sdepignore` does not leave out.
+
+        Yields:
+            (str, str, os.stat_result): The full path to the file, the key we
+                store it under on s3 and its `stat`.
+        """
+        scanner = SiteScanner(self.config.get(Config.SITE_DIR_FIELD),
+                              ignore_rules=self._ignore_rules(),
+                              follow_symlinks=self.config.get_bool(
+                                  Config.FOLLOW_SYMLINKS_FIELD))
+
+        for scanned_file in scanner.scan():
+            yield scanned_file
+
+    def _ignore_rules(self):
+        """
+        Returns:
+            IgnoreRules: The files of the site we leave out. We read the site's
+                `.sdepignore` on every call, since the site may change between
+                the deploys of a `watch`.
+        """
+        return IgnoreRules.load(self.config.get(Config.SITE_DIR_FIELD))
+
+    def remote_index(self, refresh=False):
+        """
+        The index of every object currently in our bucket, built once the first
+        time it is needed. Every later decision during this run is made against
+        it instead of asking s3 about individual keys.
+
+        We build the index from the manifest the previous deploy stored in the
+        bucket, which is a single request. If there is no manifest, or a spot
+        check shows it no longer matches the bucket, we fall back to listing the
+        bucket (paginated, and for large buckets in parallel).
+
+        Args:
+            refresh (bool): If set, discard any existing index and list the
+                bucket again.
+
+        Returns:
+            RemoteIndex: The index of the bucket.
+        """
+        if self._remote_index is None or refresh:
+            with self._metrics.phase(DeployMetrics.INDEX):
+                self._build_remote_index(refresh)
+
+        return self._remote_index
+
+    def _build_remote_index(self, refresh):
+        """
+        Build the index for `remote_index`, from the manifest if possible.
+
+        Args:
+            refresh (bool): If set, ignore the manifest and list the bucket.
+        """
+        manifest = None
+
+        if not refresh:
+            manifest = Manifest.fetch(self._s3_client, self._bucket_name())
+
+            if manifest is not None and not manifest.verify(
+                    self._s3_client, self._bucket_name(),
+                    sample_size=self._verify_sample_size()):
+                manifest = None
+
+        if manifest is not None:
+            self._remote_index = manifest.to_index()
+            self._manifest_source = ((manifest.commit, manifest.settings)
+                                     if manifest.commit is not None else None)
+        else:
+            self._manifest_source = None
+            self._remote_index = RemoteIndex.build(
+                self._s3_client, self._bucket_name(),
+                max_workers=self._max_workers())
+
+        self._index_from_manifest = manifest is not None
+
+    def _local_etag(self, full_path, remote_etag=None, stat_result=None):
+        """
+        Compute the `ETag` of the file at `full_path`.
+
+        Without `remote_etag`, this is the `ETag` s3 assigns if we upload the
+        file, which for a large file is that of a multipart upload. With it, we
+        also compute the `ETag` the file would have if it had been uploaded the
+        way the remote object was (in a single request, or in however many
+        parts `remote_etag` says), so that we recognize a large file as
+        unchanged no matter which tool uploaded it.
+
+        If the file is unchanged since we last hashed it, we return the `ETag`
+        from the hash cache without reading the file.
+
+        Args:
+            full_path (str): The path to the local file.
+            remote_etag (Optional[str]): The `ETag` of the object on s3 we
+                compare the file with.
+            stat_result (Optional[os.stat_result]): The `stat` of the file, if
+                we already have it.
+
+        Returns:
+            str: `remote_etag` if the file matches it, and otherwise the
+                `ETag` s3 assigns if we upload the file.
+        """
+        with self._metrics.phase(DeployMetrics.HASH):
+            size = (stat_result.st_size if stat_result is not None
+                    else os.path.getsize(full_path))
+            upload_part_size = self._etags.upload_part_size(size)
+            part_sizes = [upload_part_size]
+
+            if remote_etag is not None:
+                part_sizes.extend(part_size for part_size in
+                                  self._etags.part_sizes_for(size, remote_etag)
+                                  if part_size not in part_sizes)
+
+            etags = self._file_etags(full_path, part_sizes, stat_result)
+
+        if remote_etag in etags.values():
+            return remote_etag
+
+        return etags[upload_part_size]
+
+    def _file_etags(self, full_path, part_sizes, stat_result=None):
+        """
+        Compute the `ETag` of the file at `full_path` for each part size, from
+        the hash cache where possible and otherwise in a single pass through
+        the file.
+
+        Args:
+            full_path (str): The path to the local file.
+            part_sizes (list): The part sizes, where `None` means a single
+                request.
+            stat_result (Optional[os.stat_result]): The `stat` of the file, if
+                we already have it.
+
+        Returns:
+            dict: The `ETag` for each part size.
+        """
+        if self._hash_cache is None:
+            return self._etags.compute(full_path, part_sizes)
+
+        full_path = os.path.abspath(full_path)
+
+        if stat_result is None:
+            stat_result = os.stat(full_path)
+        etags = {}
+
+        for part_size in part_sizes:
+            cached_etag = self._hash_cache.lookup(full_path, stat_result,
+                                                  EtagCalculator.algorithm(part_size))
+
+            if cached_etag is not None:
+                etags[part_size] = cached_etag
+
+        missing = [part_size for part_size in part_sizes if part_size not in etags]
+
+        if missing:
+            computed = self._etags.compute(full_path, missing)
+
+            for part_size, etag in computed.items():
+                self._hash_cache.store(full_path, stat_result,
+                                       EtagCalculator.algorithm(part_size), etag)
+
+            etags.update(computed)
+
+        return etags
+
+    def configure_bucket_as_website(self):
+        """
+        For a bucket to serve as a static website, AWS requires some specific
+        configuration.
+        """
+        with self._metrics.phase(DeployMetrics.CONFIGURE_WEBSITE):
+            self._s3_client.put_bucket_website(
+                Bucket=self._bucket_name(),
+                WebsiteConfiguration=self._website_config()
+            )
+
+    def aws_naming(self):
+        """
+        Many of our methods for generating the names that we use for AWS objects
+        (like buckets) are private, which makes sense. However, often in tests
+        we need to access these names. As such, this method returns a hash of
+        all AWS specific names. The implementation of this method means we can
+        access the information while keeping private methods private.
+
+        Returns:
+            dict: A dictionary of the names of aws objects.
+        """
+        return {self.BUCKET_NAME: self._bucket_name()}
+
+
+    def _bucket_name(self):
+        """
+        The name of the bucket we use for hosting our static site.
+
+        Returns:
+            str: The bucket name.
+        """
+        return self.config.get(Config.DOMAIN_FIELD)
+
+    @staticmethod
+    def _public_bucket_policy(bucket_name):
+        """
+        A helper method for getting a bucket policy which allows anyone to view
+        our static website.
+
+        Args:
+            bucket_name (str): The bucket for which we are creating the policy.
+
+        Returns:
+            str: A json dump of the policy.
+        """
+
+        json_policy = {
+            "Version":"2012-10-17",
+            "Statement": [{
+                "Sid": "Allow Public Access to All Objects",
+                "Effect": "Allow",
+                "Principal": "*",
+                "Action": "s3:GetObject",
+                "Resource": "arn:aws:s3:::{0}/*".format(bucket_name)
+            }]
+        }
+
+        return json.dumps(json_policy)
+
+    def _website_config(self):
+        """
+        Helper method returning the configuration for the api call to transform
+        our bucket into a website.
+
+        Returns:
+            dict: Configuration stored within a dictionary.
+        """
+        website_config = {
+            "IndexDocument": {
+                "Suffix": self._config.get(Config.INDEX_SUFFIX_FIELD)
+            },
+            "ErrorDocument": {
+                "Key": self._config.get(Config.ERROR_KEY_FIELD)
+            }
+        }
+
+        return website_config
+
+    @staticmethod
+    def predict_content_type(key):
+        """
+        Predict the `ContentType` we upload as part of the keys metadata, using
+        the shared `ContentTypeResolver` without any configured overrides.
+
+        Args:
+            key (str): The key name.
+
+        Returns:
+            str: The predicted content type (i.e. 'text/html').
+        """
+        return ContentTypeResolver.default().resolve(key)
@@ -0,0 +1,192 @@
+"""
+This file contains the `BatchDeploy` class, which deploys several sites in a
+single process, as well as any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+from collections import namedtuple
+from concurrent import futures
+
+from .app import Sdep
+from .config import Config
+from .metrics import DeployMetrics
+from .transfer import TransferPolicy
+
+# SiteResult is the result of deploying one site of a batch, recording the
+# site's domain, its `UploadSummary` (or `None` if the deploy failed), the
+# seconds the deploy took and the error with which it failed, if any.
+SiteResult = namedtuple("SiteResult", "name summary seconds error")
+
+class BatchDeploy(object):
+    """
+    Deploys the sites of several configurations in one process.
+
+    Starting `sdep` once per site means importing boto3, creating a client and
+    opening connections (with their TLS handshakes) once per site. Instead, the
+    sites of a batch share one client (per set of credentials and region), and
+    so its connection pool and its `ThrottleController`, and one pool of
+    workers, which takes the files of every site in the order they are
+    submitted, so that no site waits while another has idle workers.
+
+    Args:
+        configs ([Config]): The configuration of each site.
+        max_workers (Optional[int]): The number of workers shared by every
+            site. By default, the largest `max_workers` of any site.
+
+    Returns:
+        BatchDeploy: An instance of the `BatchDeploy` class.
+
+    Raises:
+        TransferPolicyError: If a site's transfer classes are invalid.
+    """
+
+    def __init__(self, configs, max_workers=None):
+        self._metrics = DeployMetrics()
+        self._max_workers = max_workers or max(
+            max(1, config.get_int(Config.MAX_WORKERS_FIELD)) for config in configs)
+        self._max_concurrency = max(
+            TransferPolicy(config.get_json(Config.TRANSFER_CLASSES_FIELD) or None)
+            .max_concurrency() for config in configs)
+        self._clients = {}
+        self._executor = futures.ThreadPoolExecutor(max_workers=self._max_workers)
+        self._sites = [Sdep(config, s3_client=self._client_for(config),
+                            executor=self._executor)
+                       for config in configs]
+
+    @property
+    def sites(self):
+        """
+        Returns:
+            [Sdep]: The `Sdep` of each site, in the order of their configs.
+        """
+        return self._sites
+
+    @property
+    def metrics(self):
+        """
+        The requests made for every site, and the phase timings and counters
+        of every site added together, with the time the batch took as the
+        `total` phase.
+
+        Returns:
+            DeployMetrics: The metrics.
+        """
+        metrics = DeployMetrics()
+        metrics.add_time(DeployMetrics.TOTAL,
+                         self._metrics.phase_seconds(DeployMetrics.TOTAL))
+        metrics.merge(self._metrics)
+
+        for sdep in self._sites:
+            metrics.merge(sdep.metrics)
+
+        return metrics
+
+    def create(self, resume=False):
+        """
+        Create every site, as `Sdep#create` does.
+
+        Args:
+            resume (bool): Whether to resume interrupted deploys.
+
+        Returns:
+            [SiteResult]: The result for each site.
+        """
+        return self._run(lambda sdep: sdep.create(resume=resume))
+
+    def update(self, prune=False, resume=False):
+        """
+        Update every site, as `Sdep#update` does.
+
+        Args:
+            prune (bool): Whether to delete stale objects from s3.
+            resume (bool): Whether to resume interrupted deploys.
+
+        Returns:
+            [SiteResult]: The result for each site.
+        """
+        return self._run(lambda sdep: sdep.update(prune=prune, resume=resume))
+
+    def close(self):
+        """
+        Stop the shared workers and close each site, once we are done
+        deploying.
+        """
+        self._executor.shutdown()
+
+        for sdep in self._sites:
+            sdep.close()
+
+    def _run(self, deploy):
+        """
+        Deploy every site, several at once.
+
+        Each site is driven by its own thread, which walks and hashes the site
+        and queues its files in the shared pool of workers, so we run as many
+        sites at once as there are workers.
+
+        Args:
+            deploy (function): Deploys the site of the `Sdep` passed to it.
+
+        Returns:
+            [SiteResult]: The result for each site, in the order of `sites`.
+        """
+        num_drivers = min(len(self._sites), self._max_workers)
+
+        with self._metrics.phase(DeployMetrics.TOTAL):
+            with futures.ThreadPoolExecutor(max_workers=num_drivers) as drivers:
+                results = list(drivers.map(
+                    lambda sdep: self._deploy_site(sdep, deploy), self._sites))
+
+        return results
+
+    def _deploy_site(self, sdep, deploy):
+        """
+        Deploy a single site, recording its failure rather than stopping the
+        rest of the batch.
+
+        Args:
+            sdep (Sdep): The `Sdep` of the site.
+            deploy (function): Deploys the site of the `Sdep` passed to it.
+
+        Returns:
+            SiteResult: The result for the site.
+        """
+        name = sdep.config.get(Config.DOMAIN_FIELD)
+        started = sdep.metrics.phase_seconds(DeployMetrics.TOTAL)
+
+        # One broken site (i.e. a bucket we cannot write to) should not keep
+        # the others from deploying, so we report any error with the site.
+        # pylint: disable=broad-except
+        try:
+            summary = deploy(sdep)
+            error = None
+        except Exception as err:
+            summary = None
+            error = err
+
+        seconds = sdep.metrics.phase_seconds(DeployMetrics.TOTAL) - started
+
+        return SiteResult(name=name, summary=summary, seconds=seconds, error=error)
+
+    def _client_for(self, config):
+        """
+        Args:
+            config (Config): The configuration of a site.
+
+        Returns:
+            S3.Client: The client shared by every site with the same auth
+                tokens, endpoint and region. A client signs for and creates
+                buckets in its own region, so sites in other regions need
+                their own.
+        """
+        key = (config.get(Config.AWS_ACCESS_KEY_ID_FIELD),
+               config.get(Config.AWS_SECRET_ACCESS_KEY_FIELD),
+               config.get(Config.ENDPOINT_URL_FIELD),
+               config.get(Config.REGION_FIELD))
+
+        if key not in self._clients:
+            self._clients[key] = Sdep.connect(config, self._max_workers,
+                                              self._max_concurrency, self._metrics)
+
+        return self._clients[key]
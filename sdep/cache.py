@@ -0,0 +1,189 @@
+"""
+This file contains the `HashCache` class, a persistent local cache of file
+digests, as well as any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import os
+import sqlite3
+import threading
+import time
+
+class HashCache(object):
+    """
+    A cache, stored in an SQLite database, mapping a file's path, size,
+    modification time and inode to a digest of its contents. As long as none of
+    those change, we can trust the cached digest and never read the file.
+
+    Rows are keyed by absolute path, so deploys of different sites can share a
+    single cache file, and SQLite's locking makes it safe for several `sdep`
+    processes to use the same cache at once.
+
+    Args:
+        cache_file (str): The path to the SQLite database. We create it, and any
+            missing parent directories, if it does not exist.
+
+    Returns:
+        HashCache: An instance of the `HashCache` class.
+    """
+
+    # The number of new digests we hold in memory before writing them to the
+    # database, so that hashing many files does not commit once per file.
+    FLUSH_THRESHOLD = 500
+
+    # A file modified this recently (in seconds) may be modified again within
+    # the resolution of its mtime without the mtime changing, so we do not
+    # trust a digest computed for it on a later run.
+    RACY_WINDOW = 2
+
+    # How long (in seconds) we wait for another process to release its lock on
+    # the database before giving up.
+    LOCK_TIMEOUT = 30
+
+    def __init__(self, cache_file):
+        cache_dir = os.path.dirname(os.path.abspath(cache_file))
+
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._connection = sqlite3.connect(cache_file, timeout=self.LOCK_TIMEOUT,
+                                           check_same_thread=False)
+
+        with self._lock:
+            # Write-ahead logging lets one process read while another writes.
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS digests ("
+                "path TEXT NOT NULL, "
+                "algorithm TEXT NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "mtime_ns INTEGER NOT NULL, "
+                "inode INTEGER NOT NULL, "
+                "digest TEXT NOT NULL, "
+                "PRIMARY KEY (path, algorithm))"
+            )
+            self._connection.commit()
+
+    def lookup(self, full_path, stat_result, algorithm):
+        """
+        Find the cached digest for `full_path`, if its size, mtime and inode
+        still match `stat_result`.
+
+        Args:
+            full_path (str): The absolute path to the file.
+            stat_result (os.stat_result): The current `stat` of the file.
+            algorithm (str): The name of the digest.
+
+        Returns:
+            str: The cached digest or `None` if there is no valid entry.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, inode, digest FROM digests "
+                "WHERE path = ? AND algorithm = ?", (full_path, algorithm)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        size, mtime_ns, inode, cached_digest = row
+
+        if (size, mtime_ns, inode) != self._stat_key(stat_result):
+            return None
+
+        return cached_digest
+
+    def store(self, full_path, stat_result, algorithm, computed_digest):
+        """
+        Record the digest of `full_path`. The write is buffered until we have
+        `FLUSH_THRESHOLD` pending entries or `flush` is called.
+
+        Args:
+            full_path (str): The absolute path to the file.
+            stat_result (os.stat_result): The `stat` of the file taken before
+                computing its digest.
+            algorithm (str): The name of the digest.
+            computed_digest (str): The digest of the file.
+        """
+        if time.time() - stat_result.st_mtime < self.RACY_WINDOW:
+            return
+
+        size, mtime_ns, inode = self._stat_key(stat_result)
+
+        with self._lock:
+            self._pending.append((full_path, algorithm, size, mtime_ns, inode,
+                                  computed_digest))
+            should_flush = len(self._pending) >= self.FLUSH_THRESHOLD
+
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """
+        Write every pending digest to the database.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO digests "
+                "(path, algorithm, size, mtime_ns, inode, digest) "
+                "VALUES (?, ?, ?, ?, ?, ?)", self._pending
+            )
+            self._connection.commit()
+            self._pending = []
+
+    def clear(self, directory=None):
+        """
+        Invalidate cached digests, forcing the affected files to be hashed again
+        on the next run.
+
+        Args:
+            directory (Optional[str]): If given, only invalidate the digests of
+                files below this directory (i.e. a single site's files).
+                Otherwise, invalidate everything.
+        """
+        # Write any pending digests first, so that the `DELETE` also covers
+        # them and we keep those of other sites.
+        self.flush()
+
+        with self._lock:
+            if directory is None:
+                self._connection.execute("DELETE FROM digests")
+            else:
+                # We match on a prefix with `substr` instead of `LIKE`, so that
+                # `%` and `_` in paths are not treated as wildcards.
+                prefix = os.path.join(os.path.abspath(directory), "")
+                self._connection.execute(
+                    "DELETE FROM digests WHERE substr(path, 1, ?) = ?",
+                    (len(prefix), prefix)
+                )
+
+            self._connection.commit()
+
+    def close(self):
+        """
+        Flush any pending digests and close the database.
+        """
+        self.flush()
+
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def _stat_key(stat_result):
+        """
+        The parts of a file's `stat` which, if unchanged, mean its contents are
+        unchanged.
+
+        Args:
+            stat_result (os.stat_result): The `stat` of the file.
+
+        Returns:
+            (int, int, int): The size, mtime in nanoseconds and inode.
+        """
+        return stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino
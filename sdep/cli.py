@@ -7,15 +7,38 @@ We build our cli with [click](http://click.pocoo.org/5/).
 
 # pylint: disable=import-error
 
+import os
 import sys
 
 import click
 
 from .app import Sdep
-from .config import Config, ConfigParseError
+from .batch import BatchDeploy
+from .compress import UnsupportedEncodingError
+from .config import Config, ConfigImproperFormatError, ConfigParseError
+from .headers import HeaderRuleError
+from .plan import Plan, StalePlanError
+from .release import ReleaseError
+from .scanner import SiteDirError
+from .transfer import TransferPolicyError
 
-CONFIG_HELP = "The configuration file to use."
+CONFIG_HELP = ("The configuration file to use. Repeat it, or give a directory of "
+               "configuration files, to deploy several sites at once.")
 TEST_HELP = "Set this option if testing `cli`. Nothing will execute."
+MAX_WORKERS_HELP = "The maximum number of files to upload at once."
+CLEAR_CACHE_HELP = "Forget the cached digests of this site's files before running."
+PRUNE_HELP = "On update, delete objects from S3 which no longer exist locally."
+RESUME_HELP = "On create or update, resume a deploy which was interrupted."
+METRICS_FILE_HELP = "Write deploy metrics to this file (`-` for stdout)."
+METRICS_FORMAT_HELP = "The format of the metrics file."
+
+class MetricsFormats(object):
+    """
+    An enumeration of the formats in which `sdep` can write deploy metrics.
+    """
+    # pylint: disable=too-few-public-methods
+    JSON = "json"
+    STATSD = "statsd"
 
 class Actions(object):
     """
@@ -24,33 +47,74 @@ class Actions(object):
     # pylint: disable=too-few-public-methods
     CREATE = "create"
     UPDATE = "update"
+    PLAN = "plan"
+    APPLY = "apply"
+    RELEASE = "release"
+    ROLLBACK = "rollback"
+    WATCH = "watch"
 
 @click.command()
 @click.argument('action')
-@click.option("--config", help=CONFIG_HELP)
+@click.argument('target', required=False)
+@click.option("--config", help=CONFIG_HELP, multiple=True)
 @click.option("--test/--no-test", help=TEST_HELP, default=False)
-def cli(action, config, test):
+@click.option("--max-workers", type=click.IntRange(min=1), help=MAX_WORKERS_HELP)
+@click.option("--clear-cache", is_flag=True, help=CLEAR_CACHE_HELP, default=False)
+@click.option("--prune/--no-prune", help=PRUNE_HELP, default=False)
+@click.option("--resume", is_flag=True, help=RESUME_HELP, default=False)
+@click.option("--metrics-file", help=METRICS_FILE_HELP)
+@click.option("--metrics-format", help=METRICS_FORMAT_HELP, default=MetricsFormats.JSON,
+              type=click.Choice([MetricsFormats.JSON, MetricsFormats.STATSD]))
+def cli(action, target, config, test, max_workers, clear_cache, prune, resume,
+        metrics_file, metrics_format):
     """
     This function specifies the command line interface.
 
     Args:
-        action (str): Which action, (create|update) we want `sdep` to take.
-        config (str): The path to our configuration file.
+        action (str): Which action,
+            (create|update|plan|apply|release|rollback|watch) we want `sdep` to
+            take.
+        target (str): The file to which `plan` writes the plan and from which
+            `apply` reads it, or the release to which `rollback` returns.
+        config (tuple): The paths to our configuration files, or directories
+            of them. Several files deploy several sites at once.
+        max_workers (int): If set, overrides the configured number of upload
+            workers.
+        clear_cache (bool): Whether to invalidate the local hash cache for this
+            site before running.
+        prune (bool): Whether `update` (or the plan made by `plan`, or the
+            first deploy of `watch`) should delete stale objects from s3.
+        resume (bool): Whether `create` or `update` should resume an
+            interrupted deploy.
+        metrics_file (str): If set, the file to which we write deploy metrics.
+        metrics_format (str): The format (json|statsd) of the metrics.
     """
-    poss_actions = [Actions.CREATE, Actions.UPDATE]
+    poss_actions = [Actions.CREATE, Actions.UPDATE, Actions.PLAN, Actions.APPLY,
+                    Actions.RELEASE, Actions.ROLLBACK, Actions.WATCH]
 
     if action not in poss_actions:
         # @TODO Specify the method to use for returning with an error.
         click.echo("Error not specified.", err=True)
         sys.exit(1)
 
+    elif action in [Actions.PLAN, Actions.APPLY] and target is None:
+        click.echo("The {0} action requires a plan file.".format(action), err=True)
+        sys.exit(1)
+
+    elif is_batch(config) and action not in [Actions.CREATE, Actions.UPDATE]:
+        click.echo("The {0} action deploys a single site.".format(action), err=True)
+        sys.exit(1)
+
     else:
         if test:
             click.echo("Running {0}".format(action))
+        elif is_batch(config):
+            deploy_batch(action, config, max_workers, clear_cache, prune, resume,
+                         metrics_file, metrics_format)
         else:
             try:
-                if config is not None:
-                    configuration = Config(config_file=config)
+                if config:
+                    configuration = Config(config_file=config[0])
                 else:
                     configuration = Config()
 
@@ -58,12 +122,287 @@ def cli(action, config, test):
                 click.echo("Error generating configuration.", err=True)
                 sys.exit(1)
 
-            sdep = Sdep(config=configuration)
+            if max_workers is not None:
+                configuration.put(Config.MAX_WORKERS_FIELD, max_workers)
+
+            try:
+                sdep = Sdep(config=configuration)
+            except (ConfigImproperFormatError, HeaderRuleError,
+                    UnsupportedEncodingError, TransferPolicyError) as err:
+                click.echo("Error in configuration: {0}".format(err), err=True)
+                sys.exit(1)
+
+            try:
+                # Plans and releases only know of a single bucket, so rather than
+                # leave the `targets` behind without a word, we refuse.
+                if action in [Actions.PLAN, Actions.APPLY, Actions.RELEASE,
+                              Actions.ROLLBACK] and \
+                        configuration.get_json(Config.TARGETS_FIELD):
+                    click.echo("The {0} action deploys a single bucket, but `targets` "
+                               "is set.".format(action), err=True)
+                    sys.exit(1)
+
+                if clear_cache:
+                    sdep.clear_hash_cache()
+
+                try:
+                    if action == Actions.PLAN:
+                        plan = sdep.plan(prune=prune)
+                        plan.save(target)
+                        echo_plan(plan)
+                    elif action == Actions.RELEASE:
+                        try:
+                            release_summary = sdep.release()
+                        except ReleaseError as err:
+                            click.echo("Error releasing: {0}".format(err), err=True)
+                            sys.exit(1)
+
+                        click.echo("Released {0}: uploaded {1} new files, copied {2} "
+                                   "changed files live.".format(
+                                       release_summary.release_id,
+                                       release_summary.uploaded,
+                                       release_summary.copied))
+                    elif action == Actions.ROLLBACK:
+                        try:
+                            release_id = sdep.rollback(target)
+                        except ReleaseError as err:
+                            click.echo("Error rolling back: {0}".format(err), err=True)
+                            sys.exit(1)
+
+                        click.echo("Rolled back to {0}.".format(release_id))
+                    elif action == Actions.WATCH:
+                        watch_site(sdep, prune)
+                    else:
+                        if action == Actions.CREATE:
+                            summary = sdep.create(resume=resume)
+                        elif action == Actions.UPDATE:
+                            summary = sdep.update(prune=prune, resume=resume)
+                        elif action == Actions.APPLY:
+                            summary = apply_plan(sdep, target)
+
+                        echo_summary(summary, prune)
+                except SiteDirError as err:
+                    click.echo("Error in site directory: {0}".format(err), err=True)
+                    sys.exit(1)
+
+                if metrics_file is not None:
+                    write_metrics(sdep.metrics, metrics_file, metrics_format)
+            finally:
+                sdep.close()
+
+def is_batch(config):
+    """
+    Args:
+        config (tuple): The `--config` paths given.
+
+    Returns:
+        bool: Whether they name several sites to deploy at once.
+    """
+    return len(config) > 1 or any(os.path.isdir(path) for path in config)
+
+def config_files(config):
+    """
+    Args:
+        config (tuple): The `--config` paths given.
+
+    Returns:
+        [str]: The configuration files they name, with each directory replaced
+            by the files in it, in alphabetical order.
+    """
+    files = []
+
+    for path in config:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if os.path.isfile(os.path.join(path, name)))
+        else:
+            files.append(path)
+
+    return files
+
+def deploy_batch(action, config, max_workers, clear_cache, prune, resume,
+                 metrics_file=None, metrics_format=MetricsFormats.JSON):
+    """
+    Create or update several sites at once, sharing one s3 client and one pool
+    of workers, and describe what happened to each.
+
+    Args:
+        action (str): Either `create` or `update`.
+        config (tuple): The `--config` paths given.
+        max_workers (int): If set, the number of workers shared by every site.
+        clear_cache (bool): Whether to invalidate the local hash cache for each
+            site before running.
+        prune (bool): Whether `update` should delete stale objects from s3.
+        resume (bool): Whether to resume interrupted deploys.
+        metrics_file (str): If set, the file to which we write the metrics of
+            the whole batch.
+        metrics_format (str): The format (json|statsd) of the metrics.
+    """
+    configurations = []
+
+    for config_file in config_files(config):
+        # `Config` falls back to the default configuration when a file does
+        # not exist, which would deploy the same site several times.
+        if not os.path.isfile(config_file):
+            click.echo("Configuration file {0} does not exist.".format(config_file),
+                       err=True)
+            sys.exit(1)
+
+        try:
+            configurations.append(Config(config_file=config_file))
+        except ConfigParseError:
+            click.echo("Error generating configuration from {0}.".format(config_file),
+                       err=True)
+            sys.exit(1)
+
+    try:
+        batch = BatchDeploy(configurations, max_workers=max_workers)
+    except (ConfigImproperFormatError, HeaderRuleError,
+            UnsupportedEncodingError, TransferPolicyError) as err:
+        click.echo("Error in configuration: {0}".format(err), err=True)
+        sys.exit(1)
+
+    try:
+        if clear_cache:
+            for sdep in batch.sites:
+                sdep.clear_hash_cache()
+
+        if action == Actions.CREATE:
+            results = batch.create(resume=resume)
+        else:
+            results = batch.update(prune=prune, resume=resume)
+    finally:
+        batch.close()
+
+    failed = echo_batch(results, batch.metrics)
+
+    if metrics_file is not None:
+        write_metrics(batch.metrics, metrics_file, metrics_format)
+
+    if failed:
+        sys.exit(1)
+
+def echo_batch(results, metrics):
+    """
+    Describe what a batch deploy did to each site.
+
+    Args:
+        results ([SiteResult]): The result for each site.
+        metrics (DeployMetrics): The metrics of the whole batch.
+
+    Returns:
+        int: The number of sites which failed to deploy.
+    """
+    failed = 0
+
+    for result in results:
+        if result.error is not None:
+            failed += 1
+            click.echo("{0}: failed after {1:.2f}s: {2}".format(
+                result.name, result.seconds, result.error), err=True)
+        else:
+            click.echo("{0}: uploaded {1}, copied {2}, skipped {3}, deleted {4} "
+                       "in {5:.2f}s.".format(result.name, result.summary.uploaded,
+                                             result.summary.copied,
+                                             result.summary.skipped,
+                                             result.summary.deleted,
+                                             result.seconds))
+
+    click.echo("Deployed {0} of {1} sites in {2:.2f}s.".format(
+        len(results) - failed, len(results),
+        metrics.phase_seconds(metrics.TOTAL)))
+
+    return failed
+
+def echo_summary(summary, prune):
+    """
+    Describe what a deploy did.
+
+    Args:
+        summary (UploadSummary): The number of files uploaded, copied, skipped
+            and deleted.
+        prune (bool): Whether the deploy pruned stale objects, in which case we
+            report the number deleted even if it is zero.
+    """
+    click.echo("Uploaded {0} files, copied {1} files already on S3, "
+               "skipped {2} unchanged files.".format(
+                   summary.uploaded, summary.copied, summary.skipped))
+
+    if prune or summary.deleted:
+        click.echo("Deleted {0} stale files.".format(summary.deleted))
+
+def watch_site(sdep, prune):
+    """
+    Deploy the site and then every change to it, until interrupted.
+
+    Args:
+        sdep (Sdep): The `Sdep` with which to deploy.
+        prune (bool): Whether the first deploy deletes stale objects.
+    """
+    click.echo("Watching for changes. Press Ctrl-C to stop.")
+
+    try:
+        for summary in sdep.watch(prune=prune):
+            echo_summary(summary, prune)
+            # Only the first deploy prunes, so only report it for that one.
+            prune = False
+    except KeyboardInterrupt:
+        click.echo("Stopped watching.")
+
+def echo_plan(plan):
+    """
+    Describe the changes in a plan.
+
+    Args:
+        plan (Plan): The plan.
+    """
+    counts = plan.counts()
+
+    click.echo("Plan: {0} new, {1} changed, {2} header changes, {3} deleted, "
+               "{4} unchanged.".format(counts[Plan.UPLOAD], counts[Plan.OVERWRITE],
+                                       counts[Plan.HEADERS], counts[Plan.DELETE],
+                                       plan.skipped))
+
+def apply_plan(sdep, plan_file):
+    """
+    Read a plan from `plan_file` and apply it, exiting with an error if the
+    plan cannot be read or is stale.
+
+    Args:
+        sdep (Sdep): The `Sdep` with which to apply the plan.
+        plan_file (str): The path of the plan file.
+
+    Returns:
+        UploadSummary: The number of files uploaded, skipped and deleted.
+    """
+    try:
+        plan = Plan.load(plan_file)
+    except (IOError, ValueError) as err:
+        click.echo("Error reading plan: {0}".format(err), err=True)
+        sys.exit(1)
+
+    try:
+        return sdep.apply(plan)
+    except StalePlanError as err:
+        click.echo("Refusing to apply a stale plan: {0}".format(err), err=True)
+        sys.exit(1)
+
+def write_metrics(metrics, metrics_file, metrics_format):
+    """
+    Write deploy metrics to a file.
+
+    Args:
+        metrics (DeployMetrics): The metrics to write.
+        metrics_file (str): The path of the file, or `-` for stdout.
+        metrics_format (str): The format (json|statsd) in which to write.
+    """
+    if metrics_format == MetricsFormats.STATSD:
+        output = metrics.to_statsd()
+    else:
+        output = metrics.to_json()
 
-            if action == Actions.CREATE:
-                sdep.create()
-            elif action == Actions.UPDATE:
-                sdep.update()
+    with click.open_file(metrics_file, "w") as output_file:
+        output_file.write(output + "\n")
 
 def main():
     """
@@ -0,0 +1,247 @@
+"""
+This file contains the `Compressor` class, which precompresses text files
+before we upload them, as well as any related classes and functions.
+
+S3 website hosting never compresses responses itself, so the only way to serve
+compressed html, css and javascript is to upload the compressed bytes with the
+matching `Content-Encoding`.
+"""
+
+# pylint: disable=import-error
+
+import gzip
+import os
+import shutil
+import tempfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class UnsupportedEncodingError(Exception):
+    """
+    A specialized error we raise when the configuration asks for an encoding we
+    cannot produce, either because we do not know it or because the library
+    producing it is not installed.
+    """
+    # pylint: disable=too-few-public-methods
+    pass
+
+class Compressor(object):
+    """
+    Compresses files whose content type is in `content_types`, keeping the
+    compressed output in `cache_dir` keyed by the digest of the original file
+    and the compression level, so that an unchanged file is never compressed
+    twice.
+
+    The cache is trimmed to `max_cache_size` bytes each time we create a
+    `Compressor`, removing the output we used least recently first. We never
+    trim it while deploying, since a worker may still be uploading any file in
+    it.
+
+    Args:
+        cache_dir (str): The directory in which we store compressed output.
+        encoding (str): The `Content-Encoding` to produce, either `gzip` or
+            `br`. Note that s3 does not negotiate encodings, so every client
+            receives this encoding.
+        content_types (list): The content types worth compressing.
+        min_ratio (float): We only use the compressed output if it is at most
+            this fraction of the size of the original.
+        max_cache_size (Optional[int]): The most bytes of compressed output we
+            keep in `cache_dir`, or `None` for no limit.
+
+    Returns:
+        Compressor: An instance of the `Compressor` class.
+
+    Raises:
+        UnsupportedEncodingError: If we cannot produce `encoding`.
+    """
+
+    GZIP = "gzip"
+    BROTLI = "br"
+
+    # The compression level (quality, for brotli) of each encoding.
+    LEVELS = {GZIP: 9, BROTLI: 11}
+
+    # The suffix of the empty marker file we write when compressing a file
+    # did not save enough space, so we do not try again. The marker's name
+    # also holds the ratio it was judged by, as a different `min_ratio` may
+    # find the same output worth using.
+    SKIP_SUFFIX = ".skip"
+
+    def __init__(self, cache_dir, encoding=GZIP, content_types=None, min_ratio=0.9,
+                 max_cache_size=None):
+        if encoding not in (self.GZIP, self.BROTLI):
+            raise UnsupportedEncodingError(
+                "Unknown encoding '{0}'.".format(encoding))
+
+        if encoding == self.BROTLI and brotli is None:
+            raise UnsupportedEncodingError(
+                "The `brotli` package is required for brotli compression.")
+
+        self._cache_dir = os.path.join(
+            cache_dir, "{0}-{1}".format(encoding, self.LEVELS[encoding]))
+        self._encoding = encoding
+        self._content_types = frozenset(content_types or [])
+        self._min_ratio = min_ratio
+
+        if not os.path.isdir(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+        if max_cache_size is not None:
+            self._trim_cache(cache_dir, max_cache_size)
+
+    @property
+    def encoding(self):
+        """
+        Returns:
+            str: The `Content-Encoding` of our compressed output.
+        """
+        return self._encoding
+
+    def should_compress(self, content_type):
+        """
+        Determine whether files of `content_type` are worth compressing.
+
+        Args:
+            content_type (str): The content type, possibly with parameters such
+                as a `charset`.
+
+        Returns:
+            bool: Whether we should try compressing the file.
+        """
+        return content_type.split(";")[0].strip().lower() in self._content_types
+
+    def compress(self, full_path, digest):
+        """
+        Get the path to the compressed copy of `full_path`, compressing it only
+        if we have not already compressed a file with the same contents.
+
+        Args:
+            full_path (str): The path to the original file.
+            digest (str): The digest of the original file's contents.
+
+        Returns:
+            str: The path to the compressed copy or `None` if compression does
+                not make the file small enough to be worth it.
+        """
+        # We shard the cache into subdirectories by the first two characters of
+        # the digest, so no single directory holds too many files.
+        shard_dir = os.path.join(self._cache_dir, digest[:2])
+        compressed_path = os.path.join(shard_dir, digest)
+        skip_path = "{0}-{1!r}{2}".format(compressed_path, self._min_ratio,
+                                         self.SKIP_SUFFIX)
+        max_size = os.path.getsize(full_path) * self._min_ratio
+
+        if os.path.isfile(compressed_path):
+            if os.path.getsize(compressed_path) > max_size:
+                return None
+
+            # We record the use, so trimming the cache keeps this output.
+            self._touch(compressed_path)
+            return compressed_path
+
+        if os.path.isfile(skip_path):
+            return None
+
+        if not os.path.isdir(shard_dir):
+            try:
+                os.makedirs(shard_dir)
+            except OSError:
+                # Another worker or process may have created it meanwhile.
+                if not os.path.isdir(shard_dir):
+                    raise
+
+        tmp_path = self._compress_to_tmp(full_path, shard_dir)
+
+        if os.path.getsize(tmp_path) > max_size:
+            os.remove(tmp_path)
+            open(skip_path, "w").close()
+            return None
+
+        # Renaming is atomic, so a concurrent deploy either sees the complete
+        # file or no file at all.
+        os.rename(tmp_path, compressed_path)
+
+        return compressed_path
+
+    def _compress_to_tmp(self, full_path, tmp_dir):
+        """
+        Compress `full_path` into a new temporary file in `tmp_dir`.
+
+        Args:
+            full_path (str): The path to the original file.
+            tmp_dir (str): The directory in which to create the temporary file.
+
+        Returns:
+            str: The path to the temporary file.
+        """
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        level = self.LEVELS[self._encoding]
+
+        with os.fdopen(tmp_fd, "wb") as tmp_file:
+            with open(full_path, "rb") as original_file:
+                if self._encoding == self.GZIP:
+                    # We fix the timestamp and leave out the file name, so
+                    # that compressing the same contents always gives the same
+                    # bytes (and so the same `ETag`).
+                    with gzip.GzipFile(filename="", mode="wb", compresslevel=level,
+                                       fileobj=tmp_file, mtime=0) as gzip_file:
+                        shutil.copyfileobj(original_file, gzip_file)
+                else:
+                    tmp_file.write(brotli.compress(original_file.read(),
+                                                   quality=level))
+
+        return tmp_path
+
+    @staticmethod
+    def _touch(path):
+        """
+        Set the modification time of `path` to now, ignoring a file another
+        process removed meanwhile.
+
+        Args:
+            path (str): The path to a file in the cache.
+        """
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _trim_cache(cache_dir, max_cache_size):
+        """
+        Remove the least recently used files in `cache_dir`, across every
+        encoding and level, until the rest take at most `max_cache_size` bytes.
+
+        Args:
+            cache_dir (str): The directory holding the cache.
+            max_cache_size (int): The most bytes to keep.
+        """
+        cached_files = []
+        total_size = 0
+
+        for path, _, files in os.walk(cache_dir):
+            for file_name in files:
+                full_path = os.path.join(path, file_name)
+
+                try:
+                    stat_result = os.stat(full_path)
+                except OSError:
+                    continue
+
+                cached_files.append((stat_result.st_mtime, stat_result.st_size,
+                                     full_path))
+                total_size += stat_result.st_size
+
+        for _, size, full_path in sorted(cached_files):
+            if total_size <= max_cache_size:
+                break
+
+            try:
+                os.remove(full_path)
+            except OSError:
+                continue
+
+            total_size -= size
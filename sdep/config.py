@@ -67,6 +67,24 @@ class Config(object):
     DOMAIN_FIELD = "domain"
     INDEX_SUFFIX_FIELD = "index_suffix"
     ERROR_KEY_FIELD = "error_key"
+    MAX_WORKERS_FIELD = "max_workers"
+    HASH_CACHE_FILE_FIELD = "hash_cache_file"
+    PROTECTED_PREFIXES_FIELD = "protected_prefixes"
+    COMPRESS_FIELD = "compress"
+    COMPRESS_ENCODING_FIELD = "compress_encoding"
+    COMPRESS_TYPES_FIELD = "compress_types"
+    COMPRESS_MIN_RATIO_FIELD = "compress_min_ratio"
+    COMPRESS_CACHE_MAX_SIZE_FIELD = "compress_cache_max_size"
+    MANIFEST_VERIFY_SAMPLE_SIZE_FIELD = "manifest_verify_sample_size"
+    HEADERS_FIELD = "headers"
+    CONTENT_TYPES_FIELD = "content_types"
+    ENDPOINT_URL_FIELD = "endpoint_url"
+    TRANSFER_CLASSES_FIELD = "transfer_classes"
+    DIRECT_UPLOAD_MAX_SIZE_FIELD = "direct_upload_max_size"
+    JOURNAL_DIR_FIELD = "journal_dir"
+    REGION_FIELD = "region"
+    TARGETS_FIELD = "targets"
+    FOLLOW_SYMLINKS_FIELD = "follow_symlinks"
 
     def __init__(self, config_file=None, test_mode=False):
         # @TODO I wonder if it would make more sense for the `Config` class to
@@ -106,6 +124,120 @@ class Config(object):
         """
         return self._config_hash.get(field)
 
+    def get_int(self, field):
+        """
+        Get a configuration value as an integer. Values specified in environment
+        variables are always strings, so we cast them.
+
+        Args:
+            field (str): The field for which we want the configuration value.
+
+        Returns:
+            int: The value or `None` if the value has no specified
+            configuration.
+
+        Raises:
+            ConfigImproperFormatError: If the value is not an integer.
+        """
+        value = self.get(field)
+
+        try:
+            return int(value) if value is not None else None
+        except (TypeError, ValueError) as err:
+            raise ConfigImproperFormatError(
+                "'{0}' is not an integer: {1}".format(field, err))
+
+    def get_float(self, field):
+        """
+        Get a configuration value as a float, casting values specified in
+        environment variables.
+
+        Args:
+            field (str): The field for which we want the configuration value.
+
+        Returns:
+            float: The value or `None` if the value has no specified
+            configuration.
+
+        Raises:
+            ConfigImproperFormatError: If the value is not a number.
+        """
+        value = self.get(field)
+
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError) as err:
+            raise ConfigImproperFormatError(
+                "'{0}' is not a number: {1}".format(field, err))
+
+    def get_bool(self, field):
+        """
+        Get a configuration value as a boolean. In environment variables, we
+        accept `1`, `true` and `yes` (in any case) as true.
+
+        Args:
+            field (str): The field for which we want the configuration value.
+
+        Returns:
+            bool: The value, which is `False` if the value has no specified
+            configuration.
+        """
+        value = self.get(field)
+
+        if isinstance(value, bool) or value is None:
+            return bool(value)
+
+        return str(value).strip().lower() in ("1", "true", "yes")
+
+    def get_list(self, field):
+        """
+        Get a configuration value as a list. In environment variables, we
+        accept a comma separated string.
+
+        Args:
+            field (str): The field for which we want the configuration value.
+
+        Returns:
+            list: The value, which is empty if the value has no specified
+            configuration.
+        """
+        value = self.get(field)
+
+        if value is None:
+            return []
+
+        if isinstance(value, list):
+            return value
+
+        return [item.strip() for item in str(value).split(",") if item.strip()]
+
+    def get_json(self, field):
+        """
+        Get a structured (i.e. list or dictionary) configuration value. In
+        environment variables, we accept the value as a JSON string.
+
+        Args:
+            field (str): The field for which we want the configuration value.
+
+        Returns:
+            object: The value or `None` if the value has no specified
+            configuration.
+
+        Raises:
+            ConfigImproperFormatError: If the value is a string which is not
+                valid JSON.
+        """
+        value = self.get(field)
+
+        if isinstance(value, str):
+            try:
+                return json.loads(value)
+            except json.JSONDecodeError as err:
+                raise ConfigImproperFormatError(
+                    "'{0}' is not valid JSON: {1}".format(field, err))
+
+        return value
+
     def put(self, field, value):
         """
         Insert a `value` for the specified configuration `field`. If the given
@@ -268,7 +400,34 @@ class Config(object):
         """
         return {
             cls.INDEX_SUFFIX_FIELD: "index.html",
-            cls.ERROR_KEY_FIELD: "404.html"
+            cls.ERROR_KEY_FIELD: "404.html",
+            cls.MAX_WORKERS_FIELD: 10,
+            cls.HASH_CACHE_FILE_FIELD: "~/.cache/sdep/hashes.sqlite",
+            cls.PROTECTED_PREFIXES_FIELD: [],
+            cls.COMPRESS_FIELD: False,
+            cls.COMPRESS_ENCODING_FIELD: "gzip",
+            cls.COMPRESS_TYPES_FIELD: [
+                "text/html",
+                "text/css",
+                "text/plain",
+                "text/xml",
+                "application/javascript",
+                "application/json",
+                "application/xml",
+                "image/svg+xml"
+            ],
+            cls.COMPRESS_MIN_RATIO_FIELD: 0.9,
+            cls.COMPRESS_CACHE_MAX_SIZE_FIELD: 256 * 1024 * 1024,
+            cls.MANIFEST_VERIFY_SAMPLE_SIZE_FIELD: 10,
+            cls.HEADERS_FIELD: [],
+            cls.CONTENT_TYPES_FIELD: {},
+            cls.ENDPOINT_URL_FIELD: None,
+            cls.TRANSFER_CLASSES_FIELD: [],
+            cls.DIRECT_UPLOAD_MAX_SIZE_FIELD: 1024 * 1024,
+            cls.JOURNAL_DIR_FIELD: "~/.cache/sdep/journals",
+            cls.REGION_FIELD: None,
+            cls.TARGETS_FIELD: [],
+            cls.FOLLOW_SYMLINKS_FIELD: False
         }
 
     def _prepopulate_config(self):
@@ -280,7 +439,11 @@ class Config(object):
             self.AWS_ACCESS_KEY_ID_FIELD: "MY_ACCESS_KEY",
             self.AWS_SECRET_ACCESS_KEY_FIELD: "MY_SECRET_KEY",
             self.SITE_DIR_FIELD: "./static",
-            self.DOMAIN_FIELD: "sdep-test.com"
+            self.DOMAIN_FIELD: "sdep-test.com",
+            # Tests should never write to the user's real hash cache or
+            # journals.
+            self.HASH_CACHE_FILE_FIELD: "",
+            self.JOURNAL_DIR_FIELD: ""
         }
 
         self._config_hash = self._parse_from_store(
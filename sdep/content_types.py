@@ -0,0 +1,123 @@
+"""
+This file contains the `ContentTypeResolver` class, which predicts the
+`ContentType` of each uploaded object from its extension, as well as any
+related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import mimetypes
+import os
+import threading
+
+class ContentTypeResolver(object):
+    """
+    Maps file extensions to content types. We build a single table once from
+    the system's mimetypes table, our own mappings for types the system table
+    often lacks, and any user overrides, and afterwards every lookup is an exact
+    (case-insensitive) dictionary lookup, memoized per extension.
+
+    Args:
+        overrides (Optional[dict]): A mapping from extension (with or without
+            the leading `.`) to content type, which takes precedence over every
+            other mapping.
+        default_content_type (Optional[str]): The content type of files whose
+            extension we do not recognize.
+
+    Returns:
+        ContentTypeResolver: An instance of the `ContentTypeResolver` class.
+    """
+
+    # Content types the system mimetypes table is often missing. If we do not
+    # specify a content-type, s3 assumes everything is a `binary/octet-stream`.
+    BUILTIN_TYPES = {
+        ".eot": "application/vnd.ms-fontobject",
+        ".ttf": "application/font-sfnt",
+        ".woff": "application/font-woff",
+        ".woff2": "font/woff2",
+        ".otf": "font/opentype",
+        ".scss": "text/css",
+        ".sass": "text/css",
+        ".htc": "text/x-component",
+        ".json": "application/json",
+        ".svg": "image/svg+xml",
+        ".webp": "image/webp",
+        ".wasm": "application/wasm",
+        ".webmanifest": "application/manifest+json"
+    }
+
+    # The content type to return if we are unable to match.
+    DEFAULT_CONTENT_TYPE = "text/plain"
+
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, overrides=None, default_content_type=DEFAULT_CONTENT_TYPE):
+        mimetypes.init()
+
+        table = {}
+
+        for extension, content_type in mimetypes.types_map.items():
+            table[extension.lower()] = content_type
+
+        for extension, content_type in self.BUILTIN_TYPES.items():
+            table.setdefault(extension, content_type)
+
+        for extension, content_type in (overrides or {}).items():
+            table[self._normalize(extension)] = content_type
+
+        self._table = table
+        self._memo = {}
+        self._default_content_type = default_content_type
+
+    @classmethod
+    def default(cls):
+        """
+        A shared resolver without any overrides, which we build the first time
+        it is needed.
+
+        Returns:
+            ContentTypeResolver: The shared resolver.
+        """
+        if cls._default_instance is None:
+            with cls._default_lock:
+                if cls._default_instance is None:
+                    cls._default_instance = cls()
+
+        return cls._default_instance
+
+    def resolve(self, key):
+        """
+        Predict the content type of the object stored under `key`.
+
+        Args:
+            key (str): The key name.
+
+        Returns:
+            str: The predicted content type (i.e. 'text/html').
+        """
+        _, extension = os.path.splitext(key)
+
+        try:
+            return self._memo[extension]
+        except KeyError:
+            content_type = self._table.get(extension.lower(),
+                                           self._default_content_type)
+            self._memo[extension] = content_type
+
+            return content_type
+
+    @staticmethod
+    def _normalize(extension):
+        """
+        Normalize an extension to lower case with a leading `.`.
+
+        Args:
+            extension (str): The extension, i.e. `HTML` or `.html`.
+
+        Returns:
+            str: The normalized extension, i.e. `.html`.
+        """
+        extension = extension.lower()
+
+        return extension if extension.startswith(".") else "." + extension
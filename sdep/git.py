@@ -0,0 +1,139 @@
+"""
+This file contains the `GitWorkTree` class, which asks git what changed in a
+site directory between two commits, as well as any related classes and
+functions.
+"""
+
+# pylint: disable=import-error
+
+import subprocess
+
+class GitError(Exception):
+    """
+    A specialized error we raise when git is missing, or fails to answer a
+    question about a work tree (i.e. because a commit is not in its history).
+    """
+    # pylint: disable=too-few-public-methods
+    pass
+
+class GitWorkTree(object):
+    """
+    A directory inside a git work tree.
+
+    When the built site is committed, git already knows which of its files
+    changed since the commit we last deployed, so we need not walk and hash the
+    whole site to find them. Every path we report is relative to `path`, as
+    our keys are relative to `site_dir`.
+
+    Args:
+        path (str): The directory.
+
+    Returns:
+        GitWorkTree: An instance of the `GitWorkTree` class.
+    """
+
+    def __init__(self, path):
+        self._path = path
+
+    @classmethod
+    def find(cls, path):
+        """
+        Args:
+            path (str): A directory.
+
+        Returns:
+            GitWorkTree: The directory as a `GitWorkTree`, or `None` if it is
+                not inside a git work tree or git is not installed.
+        """
+        work_tree = cls(path)
+
+        try:
+            inside = work_tree._git("rev-parse", "--is-inside-work-tree")
+        except GitError:
+            return None
+
+        return work_tree if inside.strip() == "true" else None
+
+    def head(self):
+        """
+        Returns:
+            str: The SHA of the commit checked out.
+
+        Raises:
+            GitError: If there is no commit checked out.
+        """
+        return self._git("rev-parse", "--verify", "HEAD").strip()
+
+    def uncommitted_paths(self):
+        """
+        Returns:
+            [str]: The path of every file in the directory which differs from
+                what `head` committed, whether changed (staged or not), deleted,
+                untracked or ignored by git, since a full scan would see them
+                all as they are on disk.
+
+        Raises:
+            GitError: If there is no commit checked out.
+        """
+        changed = self._git("diff", "--name-only", "-z", "--no-renames",
+                            "--relative", "HEAD", "--", ".")
+        # Without `--exclude-standard`, untracked files include those git
+        # ignores.
+        untracked = self._git("ls-files", "-z", "--others", "--", ".")
+
+        return [path for path in (changed + untracked).split("\0") if path]
+
+    def changed_paths(self, since):
+        """
+        Args:
+            since (str): The SHA of an earlier commit.
+
+        Returns:
+            [str]: The path of every file added, changed or deleted in the
+                directory between `since` and `head`, with renames reported as
+                a deletion and an addition.
+
+        Raises:
+            GitError: If `since` is not in our history, i.e. after a shallow
+                clone or a rewrite of history.
+        """
+        output = self._git("diff", "--name-only", "-z", "--no-renames",
+                           "--relative", since, "HEAD", "--", ".")
+
+        return [path for path in output.split("\0") if path]
+
+    def files(self):
+        """
+        Returns:
+            [str]: The path of every file committed in the directory.
+        """
+        return [path for path in self._git("ls-files", "-z", "--", ".").split("\0")
+                if path]
+
+    def _git(self, *args):
+        """
+        Run a git command in our directory.
+
+        Args:
+            *args (str): The arguments to git.
+
+        Returns:
+            str: What the command printed.
+
+        Raises:
+            GitError: If git is not installed or the command failed.
+        """
+        try:
+            process = subprocess.Popen(("git",) + args, cwd=self._path,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE,
+                                       universal_newlines=True)
+        except OSError as err:
+            raise GitError("Could not run git: {0}".format(err))
+
+        out, err = process.communicate()
+
+        if process.returncode != 0:
+            raise GitError("git {0} failed: {1}".format(args[0], err.strip()))
+
+        return out
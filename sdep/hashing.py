@@ -0,0 +1,229 @@
+"""
+This file contains the `EtagCalculator` class, which computes locally the
+`ETag` s3 assigns to an object, including objects uploaded in multiple parts,
+as well as any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import hashlib
+
+from .transfer import MIB, adjusted_chunksize
+
+class EtagCalculator(object):
+    """
+    Computes the `ETag` s3 assigns to a file's contents.
+
+    An object uploaded in a single request has the hex md5 digest of its
+    contents as its `ETag`. An object uploaded in parts instead has the md5
+    digest of the concatenated (binary) md5 digests of its parts, followed by
+    `-` and the number of parts, so it depends on the part size used to upload
+    it. `transfer_policy` decides how we upload each file, so we can predict
+    the `ETag` of anything we upload, and for objects uploaded by another tool
+    (or with other transfer settings) we infer the part size from the number of
+    parts.
+
+    Every digest is computed by streaming through the file in `chunk_size`
+    chunks, and every part size we need is computed in the same pass, so
+    hashing a multi-gigabyte file takes a single read and constant memory.
+
+    Args:
+        transfer_policy (TransferPolicy): How we upload files of each size.
+        chunk_size (Optional[int]): The size of the chunks we read.
+
+    Returns:
+        EtagCalculator: An instance of the `EtagCalculator` class.
+    """
+
+    # The part size most tools (including `S3Transfer`) default to, which we
+    # try first for objects we would have uploaded in a single request.
+    DEFAULT_CHUNKSIZE = 8 * MIB
+
+    # The maximum number of part sizes we try when inferring how an object
+    # uploaded by another tool was split.
+    MAX_GUESSES = 8
+
+    def __init__(self, transfer_policy, chunk_size=MIB):
+        self._transfer_policy = transfer_policy
+        self._chunk_size = chunk_size
+
+    def upload_part_size(self, size):
+        """
+        The part size with which we upload a file of `size` bytes.
+
+        Args:
+            size (int): The size of the file in bytes.
+
+        Returns:
+            int: The part size or `None` if we upload the file in a single
+                request.
+        """
+        return self._transfer_policy.part_size(size)
+
+    def part_sizes_for(self, size, etag):
+        """
+        The part sizes with which an object of `size` bytes may have been
+        uploaded to have `etag` as its `ETag`, most likely first.
+
+        Args:
+            size (int): The size of the object in bytes.
+            etag (str): The unquoted `ETag` of the object.
+
+        Returns:
+            list: The part sizes, where `None` means a single request.
+        """
+        parts = part_count(etag)
+
+        if parts is None:
+            return [None]
+
+        preferred = (self._transfer_policy.part_size(size) or
+                     adjusted_chunksize(size, self.DEFAULT_CHUNKSIZE))
+
+        # Every part size at least as big as the object gives a single part.
+        if parts == 1:
+            return [max(preferred, size)]
+
+        candidates = []
+
+        if (parts - 1) * preferred < size <= parts * preferred:
+            candidates.append(preferred)
+
+        # Otherwise, most tools use a whole number of mebibytes.
+        for mebibytes in range(max(1, size // parts // MIB), size // (parts - 1) // MIB + 1):
+            part_size = mebibytes * MIB
+
+            if (len(candidates) < self.MAX_GUESSES and part_size not in candidates and
+                    (parts - 1) * part_size < size <= parts * part_size):
+                candidates.append(part_size)
+
+        return candidates
+
+    def compute(self, full_path, part_sizes):
+        """
+        Compute the `ETag` of the file at `full_path` for every part size in
+        `part_sizes`, in a single pass through the file.
+
+        Args:
+            full_path (str): The path to the file.
+            part_sizes (list): The part sizes, where `None` means a single
+                request.
+
+        Returns:
+            dict: The `ETag` for each part size.
+        """
+        hashers = [PartHasher(part_size) for part_size in part_sizes]
+
+        with open(full_path, "rb") as local_file:
+            for chunk in iter(lambda: local_file.read(self._chunk_size), b""):
+                for hasher in hashers:
+                    hasher.update(chunk)
+
+        return {hasher.part_size: hasher.etag() for hasher in hashers}
+
+    @staticmethod
+    def algorithm(part_size):
+        """
+        The name under which we cache the `ETag` for a part size.
+
+        Args:
+            part_size (int): The part size, or `None` for a single request.
+
+        Returns:
+            str: The name of the digest.
+        """
+        if part_size is None:
+            return "md5"
+
+        return "mpu-{0}".format(part_size)
+
+class PartHasher(object):
+    """
+    Incrementally computes the `ETag` of an object uploaded with a single part
+    size.
+
+    Args:
+        part_size (int): The part size, or `None` for a single request.
+
+    Returns:
+        PartHasher: An instance of the `PartHasher` class.
+    """
+
+    __slots__ = ("part_size", "_digest", "_filled", "_part_digests")
+
+    def __init__(self, part_size):
+        self.part_size = part_size
+        self._digest = hashlib.md5()
+        self._filled = 0
+        self._part_digests = []
+
+    def update(self, data):
+        """
+        Add the next bytes of the file.
+
+        Args:
+            data (bytes): The bytes.
+        """
+        if self.part_size is None:
+            self._digest.update(data)
+            return
+
+        view = memoryview(data)
+        offset = 0
+
+        while offset < len(view):
+            take = min(len(view) - offset, self.part_size - self._filled)
+            self._digest.update(view[offset:offset + take])
+            self._filled += take
+            offset += take
+
+            if self._filled == self.part_size:
+                self._part_digests.append(self._digest.digest())
+                self._digest = hashlib.md5()
+                self._filled = 0
+
+    def etag(self):
+        """
+        Returns:
+            str: The `ETag` of the bytes added so far.
+        """
+        if self.part_size is None:
+            return self._digest.hexdigest()
+
+        part_digests = list(self._part_digests)
+
+        if self._filled > 0 or not part_digests:
+            part_digests.append(self._digest.digest())
+
+        return multipart_etag(part_digests)
+
+def multipart_etag(part_digests):
+    """
+    The `ETag` of an object uploaded in parts.
+
+    Args:
+        part_digests (list): The binary md5 digest of each part, in order.
+
+    Returns:
+        str: The unquoted `ETag`.
+    """
+    return "{0}-{1}".format(hashlib.md5(b"".join(part_digests)).hexdigest(),
+                            len(part_digests))
+
+def part_count(etag):
+    """
+    The number of parts an object was uploaded in, from its `ETag`.
+
+    Args:
+        etag (str): The unquoted `ETag`.
+
+    Returns:
+        int: The number of parts, or `None` if the object was uploaded in a
+            single request.
+    """
+    _, _, parts = etag.rpartition("-")
+
+    if parts == etag or not parts.isdigit():
+        return None
+
+    return int(parts)
@@ -0,0 +1,189 @@
+"""
+This file contains the `HeaderRules` class, which decides the headers (such as
+`Cache-Control`) of each uploaded object from an ordered list of glob rules, as
+well as any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import re
+
+class HeaderRuleError(Exception):
+    """
+    A specialized error we raise when a header rule is improperly specified.
+    """
+    # pylint: disable=too-few-public-methods
+    pass
+
+class HeaderRules(object):
+    """
+    An ordered list of rules, each mapping a glob pattern to the headers of the
+    objects whose key matches it. The first matching rule wins.
+
+    In patterns, `*` matches anything except `/`, `**` matches anything
+    (including `/`) and `?` matches a single character other than `/`. A pattern
+    without a `/` matches the file name in any directory, so `*.html` matches
+    both `index.html` and `blog/post.html`.
+
+    We compile every pattern into a single regular expression, so that resolving
+    the headers of a key is one regular expression match no matter how many
+    rules there are.
+
+    Args:
+        rules (list): The rules, each a dictionary with a `pattern` and a
+            dictionary of `headers`, for example
+            `{"pattern": "assets/**", "headers": {"Cache-Control": "max-age=60"}}`.
+
+    Returns:
+        HeaderRules: An instance of the `HeaderRules` class.
+
+    Raises:
+        HeaderRuleError: If any rule is improperly specified.
+    """
+
+    # The headers we support, and the name of the `ExtraArgs` boto3 uses for
+    # each. Any header beginning with `METADATA_PREFIX` becomes custom metadata.
+    HEADER_ARGS = {
+        "cache-control": "CacheControl",
+        "content-disposition": "ContentDisposition",
+        "content-language": "ContentLanguage",
+        "content-type": "ContentType",
+        "expires": "Expires",
+        "x-amz-website-redirect-location": "WebsiteRedirectLocation"
+    }
+
+    METADATA_PREFIX = "x-amz-meta-"
+
+    def __init__(self, rules):
+        self._extra_args = []
+        patterns = []
+
+        for index, rule in enumerate(rules):
+            try:
+                pattern = rule["pattern"]
+                headers = rule["headers"]
+            except (KeyError, TypeError):
+                raise HeaderRuleError(
+                    "Rule {0} must have a `pattern` and `headers`.".format(index))
+
+            patterns.append("(?P<r{0}>{1})".format(index, translate_glob(pattern)))
+            self._extra_args.append(self._to_extra_args(headers))
+
+        if patterns:
+            self._matcher = re.compile("^(?:{0})$".format("|".join(patterns)))
+        else:
+            self._matcher = None
+
+    def resolve(self, key):
+        """
+        Find the extra arguments (in the form boto3 expects) with which to
+        upload the object stored under `key`.
+
+        The returned dictionary is shared between every key matching the same
+        rule, so callers must not modify it.
+
+        Args:
+            key (str): The key name.
+
+        Returns:
+            dict: The extra arguments, which are empty if no rule matches.
+        """
+        if self._matcher is None:
+            return {}
+
+        match = self._matcher.match(key)
+
+        if match is None:
+            return {}
+
+        # `lastgroup` is the name of the outermost group which matched, which
+        # is the first matching rule because alternatives are tried in order.
+        return self._extra_args[int(match.lastgroup[1:])]
+
+    @classmethod
+    def _to_extra_args(cls, headers):
+        """
+        Convert a dictionary of HTTP headers into boto3's extra arguments.
+
+        Args:
+            headers (dict): The headers.
+
+        Returns:
+            dict: The extra arguments.
+
+        Raises:
+            HeaderRuleError: If we do not support one of the headers.
+        """
+        extra_args = {}
+        metadata = {}
+
+        for header, value in headers.items():
+            lower_header = header.lower()
+
+            if lower_header.startswith(cls.METADATA_PREFIX):
+                metadata[lower_header[len(cls.METADATA_PREFIX):]] = value
+            elif lower_header in cls.HEADER_ARGS:
+                extra_args[cls.HEADER_ARGS[lower_header]] = value
+            else:
+                raise HeaderRuleError("Unsupported header '{0}'.".format(header))
+
+        if metadata:
+            extra_args["Metadata"] = metadata
+
+        return extra_args
+
+def translate_glob(pattern):
+    """
+    Translate a glob pattern, in the syntax `HeaderRules` describes, into a
+    regular expression, which has no capturing groups of its own.
+
+    Args:
+        pattern (str): The glob pattern.
+
+    Returns:
+        str: The regular expression.
+    """
+    anywhere = "/" not in pattern
+    pattern = pattern.lstrip("/")
+    regex = []
+    i = 0
+
+    while i < len(pattern):
+        char = pattern[i]
+
+        if pattern.startswith("**/", i):
+            # `**/` also matches no directories at all.
+            regex.append("(?:.*/)?")
+            i += 3
+            continue
+        elif pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+            continue
+        elif char == "*":
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+
+            if end == -1:
+                regex.append(re.escape(char))
+            else:
+                char_class = pattern[i + 1:end]
+
+                if char_class.startswith("!"):
+                    char_class = "^" + char_class[1:]
+
+                regex.append("[{0}]".format(char_class))
+                i = end + 1
+                continue
+        else:
+            regex.append(re.escape(char))
+
+        i += 1
+
+    if anywhere:
+        return "(?:.*/)?" + "".join(regex)
+
+    return "".join(regex)
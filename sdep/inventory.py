@@ -0,0 +1,211 @@
+"""
+This file contains the `RemoteIndex` class, an in-memory inventory of the
+objects already stored in a bucket, as well as related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import threading
+
+from collections import namedtuple
+from concurrent import futures
+
+# RemoteObject records what we know about a single object stored on s3. The
+# `etag` has its surrounding quotes stripped, so it can be compared directly
+# with a locally computed digest. A listing does not tell us an object's
+# `content_type` or `headers`, so they are `None` unless we learned them from
+# uploading the object or from a manifest.
+RemoteObject = namedtuple("RemoteObject",
+                          "key etag size last_modified content_type headers")
+
+class RemoteIndex(object):
+    """
+    An index of every object in a bucket, built once per run so that deciding
+    whether a file must be uploaded never requires a request to s3.
+
+    Args:
+        remote_objects (Optional[iterable]): The `RemoteObject` instances with
+            which to populate the index.
+
+    Returns:
+        RemoteIndex: An instance of the `RemoteIndex` class.
+    """
+
+    # The delimiter we use to split the bucket into disjoint prefixes which can
+    # be listed in parallel.
+    DELIMITER = "/"
+
+    def __init__(self, remote_objects=None):
+        self._objects = {}
+        self._keys_by_etag = {}
+        self._lock = threading.Lock()
+
+        for remote_object in remote_objects or []:
+            self.add(remote_object)
+
+    @classmethod
+    def build(cls, s3_client, bucket_name, max_workers=1):
+        """
+        List every object in `bucket_name` and return an index of them.
+
+        We first list the top level of the bucket with a delimiter, which gives
+        us the objects at the root and the disjoint "directory" prefixes below
+        it. We then list each of those prefixes in its own worker, so that
+        indexing a bucket with millions of keys does not take one sequential
+        pass through every page.
+
+        Args:
+            s3_client (S3.Client): The client to use for listing.
+            bucket_name (str): The bucket to index.
+            max_workers (int): The maximum number of prefixes to list at once.
+
+        Returns:
+            RemoteIndex: The index of the bucket's objects.
+        """
+        # pylint: disable=protected-access
+        index = cls()
+        prefixes = []
+
+        for page in cls._paginate(s3_client, Bucket=bucket_name,
+                                  Delimiter=cls.DELIMITER):
+            index._add_contents(page)
+            prefixes.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+
+        if len(prefixes) <= 1 or max_workers <= 1:
+            for prefix in prefixes:
+                index._add_prefix(s3_client, bucket_name, prefix)
+        else:
+            with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                listings = [executor.submit(index._add_prefix, s3_client,
+                                            bucket_name, prefix)
+                            for prefix in prefixes]
+
+                for listing in futures.as_completed(listings):
+                    listing.result()
+
+        return index
+
+    def get(self, key):
+        """
+        Get the `RemoteObject` stored under `key`.
+
+        Args:
+            key (str): The key name.
+
+        Returns:
+            RemoteObject: The object or `None` if no such key exists.
+        """
+        return self._objects.get(key)
+
+    def find(self, etag):
+        """
+        Find an object with the given contents, so that we can copy it within
+        the bucket instead of uploading the same bytes again.
+
+        Args:
+            etag (str): The unquoted `ETag` of the contents.
+
+        Returns:
+            str: The key of an object with that `ETag`, or `None` if there is
+                none.
+        """
+        return self._keys_by_etag.get(etag)
+
+    def add(self, remote_object):
+        """
+        Add (or replace) an object in the index. We call this after uploading a
+        file, so the index keeps reflecting the bucket for the rest of the run.
+
+        Args:
+            remote_object (RemoteObject): The object to add.
+        """
+        with self._lock:
+            self._discard(remote_object.key)
+            self._objects[remote_object.key] = remote_object
+            self._keys_by_etag.setdefault(remote_object.etag, remote_object.key)
+
+    def discard(self, key):
+        """
+        Remove `key` from the index if it is present.
+
+        Args:
+            key (str): The key name.
+        """
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        """
+        Remove `key` from the index, while holding the lock.
+
+        If other objects share its `ETag`, `find` no longer returns any of
+        them, which only costs us the chance to copy rather than upload.
+
+        Args:
+            key (str): The key name.
+        """
+        remote_object = self._objects.pop(key, None)
+
+        if (remote_object is not None and
+                self._keys_by_etag.get(remote_object.etag) == key):
+            del self._keys_by_etag[remote_object.etag]
+
+    def keys(self):
+        """
+        Returns:
+            list: Every key in the index.
+        """
+        return list(self._objects.keys())
+
+    def __contains__(self, key):
+        return key in self._objects
+
+    def __iter__(self):
+        return iter(list(self._objects.values()))
+
+    def __len__(self):
+        return len(self._objects)
+
+    def _add_prefix(self, s3_client, bucket_name, prefix):
+        """
+        List every object below `prefix` and add it to the index. Because the
+        prefixes are disjoint, workers never write the same key, and single
+        dictionary assignments are atomic, so this is safe to run in parallel.
+
+        Args:
+            s3_client (S3.Client): The client to use for listing.
+            bucket_name (str): The bucket to list.
+            prefix (str): The prefix to list.
+        """
+        for page in self._paginate(s3_client, Bucket=bucket_name, Prefix=prefix):
+            self._add_contents(page)
+
+    def _add_contents(self, page):
+        """
+        Add the objects from one page of a `list_objects_v2` response.
+
+        Args:
+            page (dict): The response page.
+        """
+        for s3_object in page.get("Contents", []):
+            self.add(RemoteObject(key=s3_object["Key"],
+                                  etag=s3_object["ETag"].strip('"'),
+                                  size=s3_object["Size"],
+                                  last_modified=s3_object["LastModified"],
+                                  content_type=None, headers=None))
+
+    @staticmethod
+    def _paginate(s3_client, **kwargs):
+        """
+        Iterate over every page of a `list_objects_v2` call.
+
+        Args:
+            s3_client (S3.Client): The client to use for listing.
+            kwargs (dict): The arguments for `list_objects_v2`.
+
+        Returns:
+            iterable: The response pages.
+        """
+        paginator = s3_client.get_paginator("list_objects_v2")
+
+        return paginator.paginate(**kwargs)
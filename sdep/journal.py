@@ -0,0 +1,212 @@
+"""
+This file contains the `DeployJournal` class, a local record of every change a
+deploy made to a bucket, from which an interrupted deploy can resume, as well as
+any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import os
+import threading
+
+import simplejson as json
+
+from .inventory import RemoteObject
+from .manifest import Manifest
+
+class DeployJournal(object):
+    """
+    An append-only file recording every object a deploy stores or deletes.
+
+    A deploy deletes the bucket's manifest before its first change and writes a
+    new one once it is done, so if it dies halfway the bucket is left without a
+    manifest and the next deploy must list it and compare every file again. The
+    journal instead starts with the objects the bucket held before the first
+    change (`baseline`) and gains a line per object stored or deleted since, so
+    the baseline plus the journal is exactly what the bucket holds, and a
+    resumed deploy skips every file the interrupted one already stored.
+
+    Writing a line is cheap, but forcing it to disk is not, so we only `fsync`
+    every `fsync_every` lines. Whatever a crash loses is simply stored again.
+
+    Args:
+        journal_file (str): The path of the journal, which must already have
+            been started with `begin`.
+        fsync_every (Optional[int]): The number of lines after which we force
+            the journal to disk.
+
+    Returns:
+        DeployJournal: An instance of the `DeployJournal` class.
+    """
+
+    # The version of the journal format. We ignore journals in any other format.
+    VERSION = 1
+
+    FSYNC_EVERY = 64
+
+    # The kinds of line in the journal.
+    PUT = "put"
+    DELETE = "delete"
+
+    def __init__(self, journal_file, fsync_every=FSYNC_EVERY):
+        self._journal_file = journal_file
+        self._fsync_every = fsync_every
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._output_file = open(journal_file, "a")
+
+    @classmethod
+    def begin(cls, journal_file, bucket_name, baseline, fsync_every=FSYNC_EVERY):
+        """
+        Start a new journal, replacing any existing one, before a deploy first
+        changes the bucket.
+
+        Args:
+            journal_file (str): The path of the journal.
+            bucket_name (str): The bucket the deploy changes.
+            baseline (Optional[Manifest]): The objects in the bucket before the
+                first change, or `None` if we do not know them.
+            fsync_every (Optional[int]): The number of lines after which we
+                force the journal to disk.
+
+        Returns:
+            DeployJournal: The journal, ready for new lines.
+        """
+        journal_dir = os.path.dirname(os.path.abspath(journal_file))
+
+        if not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+
+        header = {
+            "version": cls.VERSION,
+            "bucket_name": bucket_name,
+            "baseline": baseline.to_dict() if baseline is not None else None
+        }
+
+        # We write the header to a temporary file and move it into place, so
+        # that a crash never leaves a journal without its baseline.
+        tmp_file = journal_file + ".tmp"
+
+        with open(tmp_file, "w") as output_file:
+            output_file.write(json.dumps(header, sort_keys=True) + "\n")
+            output_file.flush()
+            os.fsync(output_file.fileno())
+
+        os.rename(tmp_file, journal_file)
+
+        return cls(journal_file, fsync_every=fsync_every)
+
+    def record_put(self, key, etag, size, extra_args):
+        """
+        Record an object the deploy stored. This method is safe to call from
+        multiple worker threads at once.
+
+        Args:
+            key (str): The key of the object.
+            etag (str): The `ETag` of the object.
+            size (int): The size of the object in bytes.
+            extra_args (dict): The arguments, such as `ContentType`, with which
+                we stored the object.
+        """
+        self._append([self.PUT, key, etag, size, extra_args])
+
+    def record_delete(self, key):
+        """
+        Record an object the deploy deleted. This method is safe to call from
+        multiple worker threads at once.
+
+        Args:
+            key (str): The key of the object.
+        """
+        self._append([self.DELETE, key])
+
+    def finish(self):
+        """
+        Close and remove the journal, once the deploy is done and the bucket
+        has a manifest again.
+        """
+        self._output_file.close()
+
+        if os.path.isfile(self._journal_file):
+            os.remove(self._journal_file)
+
+    def _append(self, entry):
+        """
+        Append a line to the journal, forcing it to disk every `fsync_every`
+        lines.
+
+        Args:
+            entry (list): The line.
+        """
+        line = json.dumps(entry, sort_keys=True) + "\n"
+
+        with self._lock:
+            self._output_file.write(line)
+            self._unsynced += 1
+
+            if self._unsynced >= self._fsync_every:
+                self._output_file.flush()
+                os.fsync(self._output_file.fileno())
+                self._unsynced = 0
+
+    @classmethod
+    def read(cls, journal_file, bucket_name):
+        """
+        Read the journal an interrupted deploy to `bucket_name` left behind.
+
+        Args:
+            journal_file (str): The path of the journal.
+            bucket_name (str): The bucket we are deploying to.
+
+        Returns:
+            (Manifest, list): The baseline, which is `None` if the deploy did
+                not know it, and the lines recorded since, or `None` if there
+                is no usable journal for `bucket_name`.
+        """
+        try:
+            with open(journal_file) as input_file:
+                lines = input_file.read().splitlines()
+        except IOError:
+            return None
+
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, json.JSONDecodeError):
+            return None
+
+        if (header.get("version") != cls.VERSION or
+                header.get("bucket_name") != bucket_name):
+            return None
+
+        entries = []
+
+        for line in lines[1:]:
+            # The last line may have been cut short by the crash.
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+
+        baseline = header["baseline"]
+
+        return (Manifest.from_dict(baseline) if baseline is not None else None,
+                entries)
+
+def replay(remote_index, entries):
+    """
+    Apply the lines of a journal to an index of the objects in the bucket.
+
+    Args:
+        remote_index (RemoteIndex): The index, which we change in place.
+        entries (list): The lines of the journal, oldest first.
+    """
+    for entry in entries:
+        if entry[0] == DeployJournal.PUT:
+            _, key, etag, size, extra_args = entry
+            headers = {k: v for k, v in extra_args.items() if k != "ContentType"}
+
+            remote_index.add(RemoteObject(
+                key=key, etag=etag, size=size, last_modified=None,
+                content_type=extra_args["ContentType"], headers=headers))
+        elif entry[0] == DeployJournal.DELETE:
+            remote_index.discard(entry[1])
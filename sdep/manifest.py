@@ -0,0 +1,305 @@
+"""
+This file contains the `Manifest` class, a compressed record of every object a
+deploy left in the bucket, as well as any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import gzip
+import io
+import random
+
+import simplejson as json
+
+from .inventory import RemoteIndex, RemoteObject
+
+class Manifest(object):
+    """
+    A manifest of the objects in a bucket, which we store in the bucket itself
+    at the end of each deploy. Fetching this single object lets the next deploy
+    know what the bucket holds without listing it, which matters both for huge
+    buckets and for CI agents that start every run with a cold local cache.
+
+    A manifest may also record the git commit the deploy came from, and a
+    digest of the settings it was made with, so that the next deploy can ask
+    git which files changed since instead of scanning the whole site.
+
+    Args:
+        remote_objects (iterable): The `RemoteObject` instances in the manifest.
+        commit (Optional[str]): The SHA of the commit the bucket holds.
+        settings (Optional[str]): A digest of the settings which shaped the
+            objects (i.e. their headers).
+
+    Returns:
+        Manifest: An instance of the `Manifest` class.
+    """
+
+    # The prefix under which `sdep` keeps its own objects. Nothing below it is
+    # part of the website.
+    PREFIX = ".sdep/"
+
+    # The key of the manifest object.
+    KEY = PREFIX + "manifest.json.gz"
+
+    # The version of the manifest format. We ignore manifests written in any
+    # other format.
+    VERSION = 1
+
+    # The number of keys whose `ETag` we check against the bucket before
+    # trusting a manifest, unless configured otherwise.
+    VERIFY_SAMPLE_SIZE = 10
+
+    def __init__(self, remote_objects, commit=None, settings=None):
+        self.commit = commit
+        self.settings = settings
+        self._objects = {}
+
+        for remote_object in remote_objects:
+            if not remote_object.key.startswith(self.PREFIX):
+                self._objects[remote_object.key] = remote_object
+
+    @classmethod
+    def from_index(cls, remote_index, commit=None, settings=None):
+        """
+        Create a manifest of every website object in `remote_index`.
+
+        Args:
+            remote_index (RemoteIndex): The index of the bucket.
+            commit (Optional[str]): The SHA of the commit the bucket holds.
+            settings (Optional[str]): A digest of the settings the objects were
+                stored with.
+
+        Returns:
+            Manifest: The manifest.
+        """
+        return cls(remote_index, commit=commit, settings=settings)
+
+    @classmethod
+    def fetch(cls, s3_client, bucket_name, key=None):
+        """
+        Download and parse the manifest stored in `bucket_name`.
+
+        Args:
+            s3_client (S3.Client): The client to use.
+            bucket_name (str): The bucket holding the manifest.
+            key (Optional[str]): The key of the manifest, if not `KEY`.
+
+        Returns:
+            Manifest: The manifest or `None` if the bucket has no (readable)
+                manifest.
+        """
+        try:
+            resp = s3_client.get_object(Bucket=bucket_name, Key=key or cls.KEY)
+        except s3_client.exceptions.ClientError:
+            return None
+
+        try:
+            return cls.loads(resp["Body"].read())
+        except (IOError, ValueError, KeyError, TypeError):
+            return None
+
+    @classmethod
+    def delete(cls, s3_client, bucket_name):
+        """
+        Remove the manifest from `bucket_name`. We do this before changing the
+        bucket, so that a deploy which dies halfway never leaves behind a
+        manifest describing a state the bucket is no longer in.
+
+        Args:
+            s3_client (S3.Client): The client to use.
+            bucket_name (str): The bucket holding the manifest.
+        """
+        s3_client.delete_object(Bucket=bucket_name, Key=cls.KEY)
+
+    @classmethod
+    def head(cls, s3_client, bucket_name):
+        """
+        Find the `ETag` of the manifest stored in `bucket_name`. Every deploy
+        which changes the bucket deletes and rewrites the manifest, so the
+        `ETag` identifies the state of the bucket as `sdep` last left it.
+
+        Args:
+            s3_client (S3.Client): The client to use.
+            bucket_name (str): The bucket holding the manifest.
+
+        Returns:
+            str: The `ETag` of the manifest or `None` if there is none.
+        """
+        try:
+            resp = s3_client.head_object(Bucket=bucket_name, Key=cls.KEY)
+        except s3_client.exceptions.ClientError:
+            return None
+
+        return resp["ETag"].strip('"')
+
+    def put(self, s3_client, bucket_name, key=None):
+        """
+        Store this manifest in `bucket_name`.
+
+        Args:
+            s3_client (S3.Client): The client to use.
+            bucket_name (str): The bucket in which to store the manifest.
+            key (Optional[str]): The key of the manifest, if not `KEY`.
+        """
+        s3_client.put_object(Bucket=bucket_name, Key=key or self.KEY,
+                             Body=self.dumps(),
+                             ContentType="application/json")
+
+    def verify(self, s3_client, bucket_name, sample_size=VERIFY_SAMPLE_SIZE):
+        """
+        Spot check that the bucket still matches this manifest, by comparing
+        the `ETag` of `sample_size` random keys. This catches most changes made
+        to the bucket by something other than `sdep` at the cost of a few
+        requests.
+
+        We fail closed: a manifest we cannot check is never trusted. With a
+        `sample_size` of 0 we always report a mismatch, and an empty manifest is
+        only trusted if a listing of the bucket's root shows nothing outside
+        `PREFIX`.
+
+        Args:
+            s3_client (S3.Client): The client to use.
+            bucket_name (str): The bucket the manifest describes.
+            sample_size (Optional[int]): The number of keys to check. A value
+                at least the size of the manifest checks every key.
+
+        Returns:
+            bool: Whether the sampled keys match.
+        """
+        if sample_size <= 0:
+            return False
+
+        if not self._objects:
+            resp = s3_client.list_objects_v2(Bucket=bucket_name, Delimiter="/")
+
+            return (not resp.get("Contents") and
+                    all(prefix["Prefix"] == self.PREFIX
+                        for prefix in resp.get("CommonPrefixes", [])))
+
+        keys = list(self._objects.keys())
+        sample = random.sample(keys, min(sample_size, len(keys)))
+
+        for key in sample:
+            try:
+                resp = s3_client.head_object(Bucket=bucket_name, Key=key)
+            except s3_client.exceptions.ClientError:
+                return False
+
+            if resp["ETag"].strip('"') != self._objects[key].etag:
+                return False
+
+        return True
+
+    def to_index(self):
+        """
+        Returns:
+            RemoteIndex: An index of the objects in this manifest.
+        """
+        return RemoteIndex(self._objects.values())
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: The objects in this manifest, keyed by key name, in a form
+                which can be serialized as JSON.
+        """
+        return {
+            key: {
+                "etag": remote_object.etag,
+                "size": remote_object.size,
+                "content_type": remote_object.content_type,
+                "headers": remote_object.headers
+            } for key, remote_object in self._objects.items()
+        }
+
+    @classmethod
+    def from_dict(cls, objects):
+        """
+        Create a manifest from the output of `to_dict`.
+
+        Args:
+            objects (dict): The objects, keyed by key name.
+
+        Returns:
+            Manifest: The manifest.
+        """
+        return cls(RemoteObject(key=key, etag=entry["etag"], size=entry["size"],
+                                last_modified=None,
+                                content_type=entry["content_type"],
+                                headers=entry["headers"])
+                   for key, entry in objects.items())
+
+    def dumps(self):
+        """
+        Serialize the manifest as gzipped JSON. We fix the gzip timestamp, so
+        that the same manifest always produces the same bytes.
+
+        Returns:
+            bytes: The serialized manifest.
+        """
+        return gzip_json_dumps({"version": self.VERSION, "objects": self.to_dict(),
+                                "commit": self.commit, "settings": self.settings})
+
+    @classmethod
+    def loads(cls, data):
+        """
+        Parse a manifest serialized with `dumps`.
+
+        Args:
+            data (bytes): The serialized manifest.
+
+        Returns:
+            Manifest: The manifest.
+
+        Raises:
+            ValueError: If the manifest is malformed or of another version.
+        """
+        manifest_data = gzip_json_loads(data)
+
+        if manifest_data.get("version") != cls.VERSION:
+            raise ValueError("Unsupported manifest version.")
+
+        manifest = cls.from_dict(manifest_data["objects"])
+        manifest.commit = manifest_data.get("commit")
+        manifest.settings = manifest_data.get("settings")
+
+        return manifest
+
+    def __len__(self):
+        return len(self._objects)
+
+def gzip_json_dumps(data):
+    """
+    Serialize `data` as compact gzipped JSON. We sort keys and fix the gzip
+    timestamp, so that the same data always produces the same bytes.
+
+    Args:
+        data (dict): The data to serialize.
+
+    Returns:
+        bytes: The serialized data.
+    """
+    raw = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    buf = io.BytesIO()
+
+    with gzip.GzipFile(fileobj=buf, mode="wb", mtime=0) as gzip_file:
+        gzip_file.write(raw.encode("utf-8"))
+
+    return buf.getvalue()
+
+def gzip_json_loads(data):
+    """
+    Parse data serialized with `gzip_json_dumps`.
+
+    Args:
+        data (bytes): The serialized data.
+
+    Returns:
+        dict: The data.
+
+    Raises:
+        IOError: If the data is not gzipped.
+        ValueError: If the data is not JSON.
+    """
+    with gzip.GzipFile(fileobj=io.BytesIO(data), mode="rb") as gzip_file:
+        return json.loads(gzip_file.read().decode("utf-8"))
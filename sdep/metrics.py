@@ -0,0 +1,300 @@
+"""
+This file contains the `DeployMetrics` class, which records per-phase timings
+and counters for a deploy, as well as any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import threading
+import time
+
+from collections import Counter
+
+import simplejson as json
+
+_clock = time.perf_counter
+
+class DeployMetrics(object):
+    """
+    Timings for each phase of a deploy (i.e. walking the tree, hashing, or
+    uploading) and counters (i.e. files uploaded or bytes sent), including the
+    number of requests by s3 operation.
+
+    Phases which run in several worker threads at once (such as uploading)
+    record the total time spent across all workers, so they can exceed the wall
+    clock time of the deploy, which we record as the `total` phase.
+
+    Recording is cheap enough to do for every file: a timing is two clock reads
+    and a counter is a dictionary update.
+
+    Returns:
+        DeployMetrics: An instance of the `DeployMetrics` class.
+    """
+
+    # Names of the counters we record.
+    FILES_SCANNED = "files_scanned"
+    FILES_SKIPPED = "files_skipped"
+    FILES_UPLOADED = "files_uploaded"
+    FILES_DELETED = "files_deleted"
+    FILES_COPIED = "files_copied"
+    BYTES_SENT = "bytes_sent"
+    MULTIPART_COMPLETED = "multipart_completed"
+    MULTIPART_ABORTED = "multipart_aborted"
+    RETRIES = "retries"
+    REQUESTS_THROTTLED = "requests_throttled"
+
+    # Names of the gauges we record.
+    CONCURRENCY = "concurrency"
+
+    # Names of the phases we time.
+    TOTAL = "total"
+    CREATE_BUCKETS = "create_buckets"
+    CONFIGURE_WEBSITE = "configure_website"
+    INDEX = "index"
+    SCAN = "scan"
+    HASH = "hash"
+    CONTENT_TYPE = "content_type"
+    COMPRESS = "compress"
+    UPLOAD = "upload"
+    COPY = "copy"
+    PRUNE = "prune"
+    MANIFEST = "manifest"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = Counter()
+        self._counters = Counter()
+        self._gauges = {}
+        self._requests = Counter()
+
+    def phase(self, name):
+        """
+        Time a phase with a `with` statement. Time spent in the same phase adds
+        up, so `phase` can wrap each file's work individually.
+
+        Args:
+            name (str): The name of the phase.
+
+        Returns:
+            PhaseTimer: A context manager timing its body.
+        """
+        return PhaseTimer(self, name)
+
+    def timed_iter(self, name, iterable):
+        """
+        Iterate over `iterable`, recording the time spent producing each item
+        as the phase `name`. We use this to time walking the directory tree,
+        which is interleaved with processing each file.
+
+        Args:
+            name (str): The name of the phase.
+            iterable (iterable): The iterable to time.
+
+        Yields:
+            object: The items of `iterable`.
+        """
+        iterator = iter(iterable)
+
+        while True:
+            start = _clock()
+
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, _clock() - start)
+                return
+
+            self.add_time(name, _clock() - start)
+
+            yield item
+
+    def add_time(self, name, seconds):
+        """
+        Add to the time spent in a phase.
+
+        Args:
+            name (str): The name of the phase.
+            seconds (float): The time to add.
+        """
+        with self._lock:
+            self._phases[name] += seconds
+
+    def incr(self, name, count=1):
+        """
+        Increment a counter.
+
+        Args:
+            name (str): The name of the counter.
+            count (int): The amount by which to increment it.
+        """
+        with self._lock:
+            self._counters[name] += count
+
+    def attach(self, s3_client):
+        """
+        Count every request `s3_client` makes, by operation, along with its
+        retries, through botocore's event system.
+
+        Args:
+            s3_client (S3.Client): The client to instrument.
+        """
+        s3_client.meta.events.register("after-call.s3", self._record_request)
+
+    def merge(self, other):
+        """
+        Add the phase timings, counters and request counts of another deploy
+        to ours, and take its gauges, i.e. to total the sites of a batch. We
+        leave out its `total` phase, since the sites of a batch run at the same
+        time.
+
+        Args:
+            other (DeployMetrics): The metrics to add.
+        """
+        other_metrics = other.to_dict()
+
+        with self._lock:
+            for name, seconds in other_metrics["phases"].items():
+                if name != self.TOTAL:
+                    self._phases[name] += seconds
+
+            self._counters.update(other_metrics["counters"])
+            self._gauges.update(other_metrics["gauges"])
+            self._requests.update(other_metrics["requests"])
+
+    def gauge(self, name, value):
+        """
+        Set a gauge, which records the latest value of a level rather than a
+        total.
+
+        Args:
+            name (str): The name of the gauge.
+            value (float): The current value.
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def counter(self, name):
+        """
+        Args:
+            name (str): The name of the counter.
+
+        Returns:
+            int: The value of the counter.
+        """
+        return self._counters[name]
+
+    def phase_seconds(self, name):
+        """
+        Args:
+            name (str): The name of the phase.
+
+        Returns:
+            float: The time spent in the phase.
+        """
+        return self._phases[name]
+
+    def requests(self):
+        """
+        Returns:
+            dict: The number of requests made, by s3 operation.
+        """
+        return dict(self._requests)
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: Every phase timing, counter, gauge and request count.
+        """
+        with self._lock:
+            return {
+                "phases": {name: round(seconds, 6)
+                           for name, seconds in self._phases.items()},
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "requests": dict(self._requests)
+            }
+
+    def to_json(self):
+        """
+        Returns:
+            str: The metrics as a JSON document.
+        """
+        return json.dumps(self.to_dict(), sort_keys=True, indent=2)
+
+    def to_statsd(self, prefix="sdep"):
+        """
+        Format the metrics in the StatsD line protocol, with phases as timers
+        (in milliseconds), gauges as gauges and everything else as counters.
+
+        Args:
+            prefix (str): The prefix for every metric name.
+
+        Returns:
+            str: The metrics, one per line.
+        """
+        metrics = self.to_dict()
+        lines = []
+
+        for name, seconds in sorted(metrics["phases"].items()):
+            lines.append("{0}.phase.{1}:{2}|ms".format(prefix, name,
+                                                        int(round(seconds * 1000))))
+
+        for name, count in sorted(metrics["counters"].items()):
+            lines.append("{0}.{1}:{2}|c".format(prefix, name, count))
+
+        for name, value in sorted(metrics["gauges"].items()):
+            lines.append("{0}.{1}:{2}|g".format(prefix, name, value))
+
+        for operation, count in sorted(metrics["requests"].items()):
+            lines.append("{0}.requests.{1}:{2}|c".format(prefix, operation, count))
+
+        return "\n".join(lines)
+
+    def _record_request(self, model, parsed=None, **_):
+        """
+        Record a completed request. botocore calls this once per operation,
+        after any retries.
+
+        Args:
+            model (OperationModel): The operation called.
+            parsed (dict): The parsed response.
+        """
+        retries = 0
+
+        if parsed is not None:
+            retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+
+        with self._lock:
+            self._requests[model.name] += 1
+
+            if retries:
+                self._counters[self.RETRIES] += retries
+
+class PhaseTimer(object):
+    """
+    A context manager adding the time spent in its body to a phase of a
+    `DeployMetrics`.
+
+    Args:
+        metrics (DeployMetrics): The metrics to record to.
+        name (str): The name of the phase.
+
+    Returns:
+        PhaseTimer: An instance of the `PhaseTimer` class.
+    """
+    # pylint: disable=too-few-public-methods
+
+    __slots__ = ("_metrics", "_name", "_start")
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = _clock()
+        return self
+
+    def __exit__(self, *_):
+        self._metrics.add_time(self._name, _clock() - self._start)
+        return False
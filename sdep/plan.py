@@ -0,0 +1,214 @@
+"""
+This file contains the `Plan` class, a record of every change a deploy would
+make to the bucket, which can be computed once and applied later, as well as
+any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import os
+
+from collections import Counter, namedtuple
+
+from .manifest import Manifest, gzip_json_dumps, gzip_json_loads
+
+# PlanEntry records a single change in a `Plan`. For uploads, `etag` is the
+# `ETag` of the bytes we upload, `size` and `mtime_ns` identify the version of
+# the local file we planned against, and `source_etag` is the digest of the
+# local file if we upload a compressed copy of it. Deletions only have a `key`.
+PlanEntry = namedtuple("PlanEntry",
+                       "action key etag size mtime_ns extra_args source_etag")
+
+class StalePlanError(Exception):
+    """
+    A specialized error we raise when the bucket or the local files changed
+    since a plan was made, so that applying it could overwrite someone else's
+    deploy or upload files other than the ones we planned.
+    """
+    # pylint: disable=too-few-public-methods
+    pass
+
+class Plan(object):
+    """
+    Every change a deploy would make to a bucket: the files to upload (new
+    keys, changed contents, or changed headers) and the objects to delete.
+
+    Computing a plan requires walking and hashing the site and learning what
+    the bucket holds, while applying it only requires sending the planned
+    bytes, so the two can run at different times (or on different machines
+    sharing the site directory).
+
+    A plan records the `ETag` of the bucket's manifest when it was made, which
+    changes with every deploy, and refuses to be applied if it no longer
+    matches. It also records the objects in the bucket at that time, so that
+    applying it can write an accurate manifest without listing the bucket.
+
+    Args:
+        bucket_name (str): The bucket the plan changes.
+        manifest_etag (Optional[str]): The `ETag` of the bucket's manifest when
+            we made the plan, or `None` if it had no manifest.
+        baseline (Manifest): The objects in the bucket when we made the plan.
+        entries (list): The `PlanEntry` instances, in the order to apply them.
+        skipped (int): The number of local files which need no change.
+
+    Returns:
+        Plan: An instance of the `Plan` class.
+    """
+
+    # The version of the plan file format. We refuse plans in any other format.
+    VERSION = 1
+
+    # The actions a `PlanEntry` may take.
+    UPLOAD = "upload"
+    OVERWRITE = "overwrite"
+    HEADERS = "headers"
+    DELETE = "delete"
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, bucket_name, manifest_etag, baseline, entries, skipped=0):
+        self.bucket_name = bucket_name
+        self.manifest_etag = manifest_etag
+        self.baseline = baseline
+        self.entries = entries
+        self.skipped = skipped
+
+    def uploads(self):
+        """
+        Returns:
+            list: The entries which upload a file.
+        """
+        return [entry for entry in self.entries if entry.action != self.DELETE]
+
+    def deletes(self):
+        """
+        Returns:
+            list: The entries which delete an object.
+        """
+        return [entry for entry in self.entries if entry.action == self.DELETE]
+
+    def counts(self):
+        """
+        Returns:
+            Counter: The number of entries taking each action.
+        """
+        return Counter(entry.action for entry in self.entries)
+
+    def check_bucket(self, s3_client, bucket_name,
+                     sample_size=Manifest.VERIFY_SAMPLE_SIZE):
+        """
+        Ensure the bucket is still in the state we planned against. An
+        unchanged manifest only shows that no `sdep` deploy ran since, so we
+        also spot check our baseline against the bucket itself.
+
+        Args:
+            s3_client (S3.Client): The client to use.
+            bucket_name (str): The bucket we are about to change.
+            sample_size (Optional[int]): The number of keys of the baseline to
+                check, as for `Manifest.verify`.
+
+        Raises:
+            StalePlanError: If the plan is for another bucket, or the bucket
+                changed since we made the plan.
+        """
+        if bucket_name != self.bucket_name:
+            raise StalePlanError("The plan was made for '{0}', not '{1}'.".format(
+                self.bucket_name, bucket_name))
+
+        if (Manifest.head(s3_client, bucket_name) != self.manifest_etag or
+                not self.baseline.verify(s3_client, bucket_name,
+                                         sample_size=sample_size)):
+            raise StalePlanError(
+                "'{0}' changed since the plan was made.".format(bucket_name))
+
+    def check_local_files(self, site_dir):
+        """
+        Ensure every file we plan to upload is unchanged since we made the plan,
+        using only its `stat`.
+
+        Args:
+            site_dir (str): The root directory of the static site.
+
+        Raises:
+            StalePlanError: If any file changed or no longer exists.
+        """
+        for entry in self.uploads():
+            try:
+                stat_result = os.stat(os.path.join(site_dir, entry.key))
+            except OSError:
+                raise StalePlanError("'{0}' no longer exists.".format(entry.key))
+
+            if (stat_result.st_size, stat_result.st_mtime_ns) != (entry.size,
+                                                                  entry.mtime_ns):
+                raise StalePlanError(
+                    "'{0}' changed since the plan was made.".format(entry.key))
+
+    def save(self, plan_file):
+        """
+        Write the plan to `plan_file`.
+
+        Args:
+            plan_file (str): The path of the plan file.
+        """
+        with open(plan_file, "wb") as output_file:
+            output_file.write(self.dumps())
+
+    @classmethod
+    def load(cls, plan_file):
+        """
+        Read a plan written with `save`.
+
+        Args:
+            plan_file (str): The path of the plan file.
+
+        Returns:
+            Plan: The plan.
+
+        Raises:
+            IOError: If the file cannot be read or is not gzipped.
+            ValueError: If the plan is malformed or of another version.
+        """
+        with open(plan_file, "rb") as input_file:
+            return cls.loads(input_file.read())
+
+    def dumps(self):
+        """
+        Serialize the plan as gzipped JSON.
+
+        Returns:
+            bytes: The serialized plan.
+        """
+        return gzip_json_dumps({
+            "version": self.VERSION,
+            "bucket_name": self.bucket_name,
+            "manifest_etag": self.manifest_etag,
+            "baseline": self.baseline.to_dict(),
+            "entries": [list(entry) for entry in self.entries],
+            "skipped": self.skipped
+        })
+
+    @classmethod
+    def loads(cls, data):
+        """
+        Parse a plan serialized with `dumps`.
+
+        Args:
+            data (bytes): The serialized plan.
+
+        Returns:
+            Plan: The plan.
+
+        Raises:
+            ValueError: If the plan is malformed or of another version.
+        """
+        plan_data = gzip_json_loads(data)
+
+        if plan_data.get("version") != cls.VERSION:
+            raise ValueError("Unsupported plan version.")
+
+        try:
+            return cls(plan_data["bucket_name"], plan_data["manifest_etag"],
+                       Manifest.from_dict(plan_data["baseline"]),
+                       [PlanEntry(*entry) for entry in plan_data["entries"]],
+                       skipped=plan_data["skipped"])
+        except (KeyError, TypeError):
+            raise ValueError("Malformed plan.")
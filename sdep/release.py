@@ -0,0 +1,238 @@
+"""
+This file contains the `ReleaseHistory` class, which records the releases of a
+site deployed in release mode and which of them is live, as well as any related
+classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import hashlib
+import time
+
+import simplejson as json
+
+from .manifest import Manifest
+
+class ReleaseError(Exception):
+    """
+    A specialized error we raise when asked to activate a release which does
+    not exist, or to release into a bucket holding objects which no release
+    put there.
+    """
+    # pylint: disable=too-few-public-methods
+    pass
+
+class ReleaseHistory(object):
+    """
+    The releases stored in a bucket, oldest first, and which of them is live.
+
+    In release mode, the bytes of every file of every release are stored once,
+    named after their `ETag`, below `OBJECT_PREFIX`, and each release is a
+    manifest (`manifest_key`) naming the object behind every key of the site.
+    A release goes live by copying, within the bucket, the stored object of
+    every key whose live object differs onto that key, and deleting the live
+    keys the release does not have. The site keeps its URLs, switching releases
+    only writes the keys which differ between them, and nothing is uploaded
+    again to roll back.
+
+    Args:
+        releases (Optional[list]): The releases, oldest first, each a dictionary
+            with an `id`, the number of `files` and the time it was `created`.
+        active (Optional[str]): The id of the live release.
+        activations (Optional[list]): The id of every release we made live,
+            oldest first, so that we can return to the one live before.
+
+    Returns:
+        ReleaseHistory: An instance of the `ReleaseHistory` class.
+    """
+
+    # The prefix below which we store every release.
+    PREFIX = Manifest.PREFIX + "releases/"
+
+    # The prefix below which we store the bytes of every file of a release.
+    OBJECT_PREFIX = PREFIX + "objects/"
+
+    # The key of the release history object.
+    KEY = Manifest.PREFIX + "releases.json"
+
+    # The length of a release id, in hex digits.
+    ID_LENGTH = 16
+
+    # The number of activations we remember.
+    MAX_ACTIVATIONS = 100
+
+    def __init__(self, releases=None, active=None, activations=None):
+        self.releases = releases or []
+        self.active = active
+        self.activations = activations or ([active] if active is not None else [])
+
+    @classmethod
+    def fetch(cls, s3_client, bucket_name):
+        """
+        Download the release history stored in `bucket_name`.
+
+        Args:
+            s3_client (S3.Client): The client to use.
+            bucket_name (str): The bucket holding the history.
+
+        Returns:
+            ReleaseHistory: The history, which is empty if the bucket has none.
+        """
+        try:
+            resp = s3_client.get_object(Bucket=bucket_name, Key=cls.KEY)
+        except s3_client.exceptions.ClientError:
+            return cls()
+
+        history_data = json.loads(resp["Body"].read().decode("utf-8"))
+
+        return cls(history_data["releases"], history_data["active"],
+                   history_data.get("activations"))
+
+    def put(self, s3_client, bucket_name):
+        """
+        Store this history in `bucket_name`.
+
+        Args:
+            s3_client (S3.Client): The client to use.
+            bucket_name (str): The bucket in which to store the history.
+        """
+        body = json.dumps({"releases": self.releases, "active": self.active,
+                           "activations": self.activations},
+                          sort_keys=True, indent=2)
+
+        s3_client.put_object(Bucket=bucket_name, Key=self.KEY,
+                             Body=body.encode("utf-8"),
+                             ContentType="application/json")
+
+    def add(self, release_id, files):
+        """
+        Record a new release, unless we already have a release with the same
+        contents.
+
+        Args:
+            release_id (str): The id of the release.
+            files (int): The number of files in the release.
+        """
+        if release_id not in self:
+            self.releases.append({
+                "id": release_id,
+                "files": files,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            })
+
+    def get(self, release_id):
+        """
+        Args:
+            release_id (str): The id of a release.
+
+        Returns:
+            dict: The release.
+
+        Raises:
+            ReleaseError: If there is no such release.
+        """
+        for release in self.releases:
+            if release["id"] == release_id:
+                return release
+
+        raise ReleaseError("There is no release '{0}'.".format(release_id))
+
+    def activate(self, release_id):
+        """
+        Record that `release_id` is now live.
+
+        Args:
+            release_id (str): The id of the release.
+
+        Raises:
+            ReleaseError: If there is no such release.
+        """
+        self.get(release_id)
+
+        self.active = release_id
+        self.activations = (self.activations + [release_id])[-self.MAX_ACTIVATIONS:]
+
+    def previous(self):
+        """
+        Returns:
+            str: The id of the release which was live before the live one. This
+                is not necessarily the release created before it, since an
+                earlier release can be made live again.
+
+        Raises:
+            ReleaseError: If there is no earlier release.
+        """
+        for release_id in reversed(self.activations):
+            if release_id != self.active and release_id in self:
+                return release_id
+
+        raise ReleaseError("There is no earlier release to roll back to.")
+
+    def __contains__(self, release_id):
+        return any(release["id"] == release_id for release in self.releases)
+
+    @classmethod
+    def object_key(cls, etag):
+        """
+        Args:
+            etag (str): The `ETag` of the bytes of a file.
+
+        Returns:
+            str: The key under which we store those bytes for every release.
+        """
+        return cls.OBJECT_PREFIX + etag
+
+    @classmethod
+    def stored_etags(cls, s3_client, bucket_name):
+        """
+        List the bytes already stored for earlier releases, which a new release
+        need not upload again.
+
+        Args:
+            s3_client (S3.Client): The client to use.
+            bucket_name (str): The bucket holding the releases.
+
+        Returns:
+            set: The `ETag` of every object below `OBJECT_PREFIX`.
+        """
+        paginator = s3_client.get_paginator("list_objects_v2")
+        etags = set()
+
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=cls.OBJECT_PREFIX):
+            etags.update(obj["Key"][len(cls.OBJECT_PREFIX):]
+                         for obj in page.get("Contents", []))
+
+        return etags
+
+    @classmethod
+    def manifest_key(cls, release_id):
+        """
+        Args:
+            release_id (str): The id of a release.
+
+        Returns:
+            str: The key of the release's manifest, which records the key,
+                `ETag` and headers of every file of the release.
+        """
+        return "{0}{1}.json.gz".format(cls.PREFIX, release_id)
+
+    @classmethod
+    def release_id(cls, files):
+        """
+        Compute the id of a release from its contents, so that releasing the
+        same site twice gives the same id.
+
+        Args:
+            files (iterable): A `(key, etag, extra_args)` tuple for every file in
+                the release.
+
+        Returns:
+            str: The release id.
+        """
+        digest = hashlib.sha1()
+
+        for key, etag, extra_args in sorted(files, key=lambda f: f[0]):
+            digest.update(json.dumps([key, etag, extra_args],
+                                     sort_keys=True).encode("utf-8"))
+
+        return digest.hexdigest()[:cls.ID_LENGTH]
@@ -0,0 +1,300 @@
+"""
+This file contains the `SiteScanner` class, which lists the files of a static
+site, and the `IgnoreRules` class, which decides which of them we leave out, as
+well as any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import os
+import re
+
+from collections import namedtuple
+
+from .headers import translate_glob
+
+# ScannedFile is a file `SiteScanner` found, recording its full path, the key
+# under which we store it and its `stat`, which later steps reuse rather than
+# asking the file system again.
+ScannedFile = namedtuple("ScannedFile", "path key stat")
+
+class SiteDirError(Exception):
+    """
+    A specialized error we raise when the site directory is missing, is not a
+    directory, or holds no files to deploy where we need some.
+    """
+    # pylint: disable=too-few-public-methods
+    pass
+
+class IgnoreRules(object):
+    """
+    The patterns of the files and directories we never deploy, in the syntax
+    of a `.gitignore` file: one pattern per line, `#` starting a comment, `!`
+    bringing back what an earlier pattern left out, a trailing `/` matching
+    only directories and a `/` anywhere else anchoring the pattern to the root
+    of the site. Globs are those `HeaderRules` use. As with git, the last
+    matching pattern wins, and nothing below an ignored directory comes back.
+
+    We compile every pattern into a single regular expression, so checking a
+    path is one match no matter how many patterns there are.
+
+    Args:
+        patterns (list): The patterns, as lines of a `.sdepignore` file.
+
+    Returns:
+        IgnoreRules: An instance of the `IgnoreRules` class.
+    """
+
+    # The file in the root of the site from which we read further patterns.
+    FILE_NAME = ".sdepignore"
+
+    # The patterns we always start from: version control and editor files,
+    # and the ignore file itself.
+    DEFAULT_PATTERNS = [
+        ".git/",
+        ".hg/",
+        ".svn/",
+        ".DS_Store",
+        "Thumbs.db",
+        "*.swp",
+        "*.swo",
+        "*~",
+        "/" + FILE_NAME
+    ]
+
+    def __init__(self, patterns):
+        self.patterns = []
+        file_groups = []
+        dir_groups = []
+
+        for line in patterns:
+            pattern = line.strip()
+
+            if not pattern or pattern.startswith("#"):
+                continue
+
+            self.patterns.append(pattern)
+
+        # We try the patterns last first, since the first alternative which
+        # matches is the one `re` reports.
+        for index in reversed(range(len(self.patterns))):
+            pattern = self.patterns[index]
+            kind = "i"
+
+            if pattern.startswith("!"):
+                kind = "k"
+                pattern = pattern[1:]
+            elif pattern.startswith("\\"):
+                pattern = pattern[1:]
+
+            dir_only = pattern.endswith("/")
+            group = "(?P<{0}{1}>{2})".format(kind, index,
+                                             translate_glob(pattern.rstrip("/")))
+
+            dir_groups.append(group)
+
+            if not dir_only:
+                file_groups.append(group)
+
+        self._file_matcher = self._compile(file_groups)
+        self._dir_matcher = self._compile(dir_groups)
+
+    @classmethod
+    def load(cls, site_dir):
+        """
+        Args:
+            site_dir (str): The root directory of the static site.
+
+        Returns:
+            IgnoreRules: The default patterns, followed by those of the site's
+                `.sdepignore` file, if it has one.
+        """
+        patterns = list(cls.DEFAULT_PATTERNS)
+
+        try:
+            with open(os.path.join(site_dir, cls.FILE_NAME)) as ignore_file:
+                patterns.extend(ignore_file.read().splitlines())
+        except IOError:
+            pass
+
+        return cls(patterns)
+
+    def ignores(self, key, is_dir=False):
+        """
+        Args:
+            key (str): The path of a file or directory, relative to the site.
+            is_dir (bool): Whether the path is a directory.
+
+        Returns:
+            bool: Whether a pattern leaves the path out. We do not look at the
+                directories above it, which `SiteScanner` never descends into
+                if they are ignored.
+        """
+        matcher = self._dir_matcher if is_dir else self._file_matcher
+
+        if matcher is None:
+            return False
+
+        match = matcher.match(key)
+
+        return match is not None and match.lastgroup.startswith("i")
+
+    def ignores_path(self, key):
+        """
+        Args:
+            key (str): The path of a file, relative to the site.
+
+        Returns:
+            bool: Whether a pattern leaves out the file or any directory above
+                it, i.e. for paths which did not come from a `SiteScanner`.
+        """
+        parts = key.split("/")
+
+        for i in range(1, len(parts)):
+            if self.ignores("/".join(parts[:i]), is_dir=True):
+                return True
+
+        return self.ignores(key)
+
+    @staticmethod
+    def _compile(groups):
+        """
+        Args:
+            groups (list): The regular expression group of each pattern.
+
+        Returns:
+            Pattern: A regular expression matching any of them, or `None` if
+                there are none.
+        """
+        if not groups:
+            return None
+
+        return re.compile("^(?:{0})$".format("|".join(groups)))
+
+class SiteScanner(object):
+    """
+    Lists every file of a static site, lazily, so that we can start hashing and
+    uploading the first files before we have seen the last.
+
+    We walk with `os.scandir`, which tells us whether an entry is a file or a
+    directory without a `stat` on most platforms, build each key by appending
+    names to the key of its directory, and never descend into an ignored
+    directory.
+
+    A symlink to a file is deployed with the file's contents. We only descend
+    into a symlink to a directory with `follow_symlinks`, and then never into a
+    directory which is already one of its own parents, so a link pointing back
+    up the tree cannot send us round in circles. Broken symlinks are skipped.
+
+    Args:
+        site_dir (str): The root directory of the static site.
+        ignore_rules (Optional[IgnoreRules]): The files to leave out. Defaults
+            to the rules `IgnoreRules.load` finds for `site_dir`.
+        follow_symlinks (Optional[bool]): Whether to descend into symlinks to
+            directories.
+
+    Returns:
+        SiteScanner: An instance of the `SiteScanner` class.
+    """
+
+    def __init__(self, site_dir, ignore_rules=None, follow_symlinks=False):
+        self._site_dir = site_dir
+        self._ignore_rules = (ignore_rules if ignore_rules is not None
+                              else IgnoreRules.load(site_dir))
+        self._follow_symlinks = follow_symlinks
+
+    def scan(self):
+        """
+        Yields:
+            ScannedFile: Every file of the site which is not ignored.
+
+        Raises:
+            SiteDirError: If `site_dir` does not exist or is not a directory.
+                We never treat it as an empty site, since pruning would then
+                delete every object in the bucket.
+        """
+        if not os.path.isdir(self._site_dir):
+            raise SiteDirError("The site directory '{0}' does not exist or is not "
+                               "a directory.".format(self._site_dir))
+
+        root_stat = os.stat(self._site_dir)
+
+        # Each directory still to scan, with its key prefix and the identities
+        # of it and its parents.
+        pending = [(self._site_dir, "", frozenset([self._identity(root_stat)]))]
+
+        while pending:
+            path, prefix, parents = pending.pop()
+
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+
+            subdirs = []
+
+            for entry in entries:
+                key = prefix + entry.name
+
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+
+                if is_dir:
+                    if self._ignore_rules.ignores(key, is_dir=True):
+                        continue
+
+                    subdir = self._subdir(entry, key, parents)
+
+                    if subdir is not None:
+                        subdirs.append(subdir)
+                elif not self._ignore_rules.ignores(key):
+                    try:
+                        stat_result = entry.stat()
+                    except OSError:
+                        # A broken symlink, or a file removed as we scan.
+                        continue
+
+                    yield ScannedFile(path=entry.path, key=key, stat=stat_result)
+
+            # We push subdirectories in reverse, so we scan them in the order
+            # `scandir` listed them.
+            pending.extend(reversed(subdirs))
+
+    def _subdir(self, entry, key, parents):
+        """
+        Args:
+            entry (DirEntry): A directory of the site.
+            key (str): The key of the directory.
+            parents (frozenset): The identities of the directory containing it
+                and that directory's parents.
+
+        Returns:
+            tuple: The directory to scan, as queued by `scan`, or `None` if we
+                should not descend into it.
+        """
+        if entry.is_symlink() and not self._follow_symlinks:
+            return None
+
+        try:
+            identity = self._identity(entry.stat())
+        except OSError:
+            return None
+
+        if identity in parents:
+            return None
+
+        return entry.path, key + "/", parents | frozenset([identity])
+
+    @staticmethod
+    def _identity(stat_result):
+        """
+        Args:
+            stat_result (os.stat_result): The `stat` of a directory.
+
+        Returns:
+            (int, int): The device and inode, which identify the directory
+                however we reached it.
+        """
+        return stat_result.st_dev, stat_result.st_ino
@@ -0,0 +1,300 @@
+"""
+This file contains the `AdaptiveLimiter` class, which adapts the number of
+requests we have in flight to s3 to how fast s3 accepts them, and the
+`ThrottleController` class, which applies it (and jittered retries) to every
+request a client makes, as well as any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import random
+import threading
+import time
+
+_clock = time.perf_counter
+
+class AdaptiveLimiter(object):
+    """
+    A limit on the number of requests in flight, adjusted additive-increase,
+    multiplicative-decrease (AIMD) style, as TCP adjusts its window.
+
+    Every request which succeeds promptly raises the limit by `1 / limit`, so
+    the limit grows by about one per round of requests. A throttled request
+    (s3's `SlowDown`) halves it, but only once per round: requests which were
+    already in flight when we cut the limit were sent at the old limit, so
+    their throttling tells us nothing new. A request which takes more than
+    `latency_factor` times as long (per unit of data) as the fastest we have
+    seen means the connection is saturated, so we stop growing.
+
+    Args:
+        initial (int): The limit we start at.
+        maximum (int): The highest limit, i.e. the number of connections.
+        minimum (Optional[int]): The lowest limit.
+        latency_factor (Optional[float]): How much slower than the fastest
+            request a request may be before we stop growing.
+
+    Returns:
+        AdaptiveLimiter: An instance of the `AdaptiveLimiter` class.
+    """
+
+    # The factor by which we cut the limit when throttled.
+    DECREASE_FACTOR = 0.5
+
+    LATENCY_FACTOR = 4.0
+
+    def __init__(self, initial, maximum, minimum=1,
+                 latency_factor=LATENCY_FACTOR):
+        self._maximum = maximum
+        self._minimum = minimum
+        self._latency_factor = latency_factor
+        self._limit = float(max(minimum, min(initial, maximum)))
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._sequence = 0
+        self._recovery_sequence = 0
+        self._min_latency = None
+
+    @property
+    def limit(self):
+        """
+        Returns:
+            int: The number of requests we currently allow in flight.
+        """
+        return int(self._limit)
+
+    def acquire(self):
+        """
+        Wait until another request may be sent.
+
+        Returns:
+            int: A ticket identifying the request, to pass to `on_throttle`.
+        """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+
+            self._in_flight += 1
+            self._sequence += 1
+
+            return self._sequence
+
+    def release(self):
+        """
+        Record that a request is no longer in flight.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency):
+        """
+        Record a request which succeeded.
+
+        Args:
+            latency (float): How long the request took, per unit of data.
+
+        Returns:
+            bool: Whether the limit changed.
+        """
+        with self._condition:
+            if self._min_latency is None or latency < self._min_latency:
+                self._min_latency = latency
+
+            if (latency > self._min_latency * self._latency_factor or
+                    self._limit >= self._maximum):
+                return False
+
+            previous = int(self._limit)
+            self._limit = min(self._maximum, self._limit + 1.0 / self._limit)
+            self._condition.notify_all()
+
+            return int(self._limit) != previous
+
+    def on_throttle(self, ticket):
+        """
+        Record a request which s3 throttled.
+
+        Args:
+            ticket (int): The ticket `acquire` gave the request.
+
+        Returns:
+            bool: Whether the limit changed.
+        """
+        with self._condition:
+            if ticket <= self._recovery_sequence:
+                return False
+
+            previous = int(self._limit)
+            self._limit = max(self._minimum, self._limit * self.DECREASE_FACTOR)
+            self._recovery_sequence = self._sequence
+
+            return int(self._limit) != previous
+
+class ThrottleController(object):
+    """
+    Applies an `AdaptiveLimiter` to every request an s3 client makes, and
+    retries throttled requests after a jittered exponential backoff.
+
+    We hook into botocore's event system, so the limit covers every request
+    (single uploads, the parts of multipart uploads, copies and deletions)
+    whichever thread makes it. botocore's own retry handler still decides on
+    every error other than throttling, within the same `max_attempts`.
+
+    Args:
+        limiter (AdaptiveLimiter): The limit on requests in flight.
+        metrics (Optional[DeployMetrics]): The metrics in which we record the
+            limit and the number of throttled requests.
+        max_attempts (Optional[int]): The attempts we make at each request.
+        base_delay (Optional[float]): The seconds we wait, at most, before the
+            first retry, which doubles with every further retry.
+        max_delay (Optional[float]): The most seconds we wait before a retry.
+
+    Returns:
+        ThrottleController: An instance of the `ThrottleController` class.
+    """
+
+    MAX_ATTEMPTS = 8
+    BASE_DELAY = 0.1
+    MAX_DELAY = 20.0
+
+    # The error codes with which s3 (and s3 compatible services) throttle us.
+    THROTTLE_CODES = frozenset([
+        "SlowDown",
+        "Throttling",
+        "ThrottlingException",
+        "RequestLimitExceeded",
+        "TooManyRequestsException",
+        "ServiceUnavailable",
+        "503"
+    ])
+
+    # We compare latencies per this many bytes, so that a large part is not
+    # mistaken for congestion, while every small request counts the same.
+    LATENCY_UNIT = 64 * 1024
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, limiter, metrics=None, max_attempts=MAX_ATTEMPTS,
+                 base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self._limiter = limiter
+        self._metrics = metrics
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._local = threading.local()
+        self._random = random.Random()
+
+    def attach(self, s3_client):
+        """
+        Apply the limit and retries to every request `s3_client` makes.
+
+        Args:
+            s3_client (S3.Client): The client to control. It should be created
+                with `max_attempts` attempts in botocore's `standard` retry mode.
+        """
+        events = s3_client.meta.events
+        events.register("before-send.s3", self._before_send)
+        events.register_first("needs-retry.s3", self._needs_retry)
+
+        self._record_limit()
+
+    def delay(self, attempts):
+        """
+        The time to wait before retrying a throttled request, chosen uniformly
+        at random up to an exponentially growing cap ("full jitter"), so that
+        requests throttled together do not all retry together.
+
+        Args:
+            attempts (int): The number of attempts made so far.
+
+        Returns:
+            float: The seconds to wait.
+        """
+        return self._random.uniform(
+            0, min(self._max_delay, self._base_delay * 2 ** (attempts - 1)))
+
+    def _before_send(self, request, **_):
+        """
+        Wait for room under the limit before botocore sends a request.
+
+        Args:
+            request (AWSPreparedRequest): The request.
+        """
+        # A request which failed before botocore asked whether to retry it
+        # never gave back its place.
+        if getattr(self._local, "pending", None) is not None:
+            self._limiter.release()
+
+        ticket = self._limiter.acquire()
+        size = int(request.headers.get("Content-Length") or 0)
+
+        self._local.pending = (ticket, _clock(), size)
+
+    def _needs_retry(self, response=None, attempts=1, caught_exception=None, **_):
+        """
+        Adapt the limit to the outcome of a request, and decide whether to
+        retry it if it was throttled.
+
+        Args:
+            response (tuple): The HTTP response and the parsed response, or
+                `None` if the request failed without a response.
+            attempts (int): The number of attempts made so far.
+            caught_exception (Exception): The error, if the request failed
+                without a response.
+
+        Returns:
+            float: The seconds to wait before retrying, or `None` to leave the
+                decision to botocore.
+        """
+        pending = getattr(self._local, "pending", None)
+
+        if pending is None:
+            return None
+
+        self._local.pending = None
+        ticket, started, size = pending
+        self._limiter.release()
+
+        if self._is_throttled(response):
+            if self._metrics is not None:
+                self._metrics.incr(self._metrics.REQUESTS_THROTTLED)
+
+            if self._limiter.on_throttle(ticket):
+                self._record_limit()
+
+            if attempts < self._max_attempts:
+                return self.delay(attempts)
+
+            return None
+
+        if caught_exception is None:
+            units = max(1.0, float(size) / self.LATENCY_UNIT)
+            latency = (_clock() - started) / units
+
+            if self._limiter.on_success(latency):
+                self._record_limit()
+
+        return None
+
+    def _is_throttled(self, response):
+        """
+        Args:
+            response (tuple): The HTTP response and the parsed response, or
+                `None`.
+
+        Returns:
+            bool: Whether s3 throttled the request.
+        """
+        if response is None:
+            return False
+
+        http_response, parsed = response
+        code = (parsed or {}).get("Error", {}).get("Code")
+
+        return code in self.THROTTLE_CODES or http_response.status_code == 503
+
+    def _record_limit(self):
+        """
+        Record the current limit in the metrics.
+        """
+        if self._metrics is not None:
+            self._metrics.gauge(self._metrics.CONCURRENCY, self._limiter.limit)
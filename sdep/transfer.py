@@ -0,0 +1,187 @@
+"""
+This file contains the `TransferPolicy` class, which picks the transfer settings
+(multipart or not, part size and concurrency) for each file from its size, as
+well as any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+MIB = 1024 * 1024
+
+class TransferPolicyError(Exception):
+    """
+    A specialized error we raise when the transfer classes are improperly
+    specified.
+    """
+    # pylint: disable=too-few-public-methods
+    pass
+
+class TransferPolicy(object):
+    """
+    Transfer settings for each class of file size.
+
+    Static sites are mostly many small files with a few large ones (videos,
+    archives), and no single setting suits both: splitting a medium file into
+    parts only adds requests, while a multi-gigabyte file needs many parts in
+    flight to use the available bandwidth. Each class therefore applies to
+    every file of at least `min_size` bytes (up to the next class), and either
+    uploads them in a single request (no `multipart_chunksize`) or in parts of
+    `multipart_chunksize` bytes, `max_concurrency` parts at a time.
+
+    We decide per file, from its size, as we reach it, rather than from the
+    sizes of all files up front, so that uploads can start while we are still
+    walking the site.
+
+    Args:
+        classes (Optional[list]): The classes, each a dictionary with a
+            `min_size` and optionally a `multipart_chunksize` and
+            `max_concurrency`. Defaults to `DEFAULT_CLASSES`.
+
+    Returns:
+        TransferPolicy: An instance of the `TransferPolicy` class.
+
+    Raises:
+        TransferPolicyError: If the classes are improperly specified.
+    """
+
+    DEFAULT_CLASSES = [
+        {"min_size": 0},
+        {"min_size": 64 * MIB, "multipart_chunksize": 16 * MIB, "max_concurrency": 8},
+        {"min_size": 1024 * MIB, "multipart_chunksize": 64 * MIB, "max_concurrency": 16}
+    ]
+
+    # The limits s3 places on uploads.
+    MAX_SINGLE_UPLOAD_SIZE = 5 * 1024 * MIB
+    MAX_PARTS = 10000
+    MIN_PART_SIZE = 5 * MIB
+    MAX_PART_SIZE = 5 * 1024 * MIB
+
+    # The part size we use for a file too big for a single request which falls
+    # in a class without a part size.
+    FALLBACK_CHUNKSIZE = 64 * MIB
+
+    def __init__(self, classes=None):
+        classes = classes or self.DEFAULT_CLASSES
+
+        try:
+            self._classes = sorted(
+                (int(c["min_size"]),
+                 int(c["multipart_chunksize"]) if c.get("multipart_chunksize") else None,
+                 int(c.get("max_concurrency", 1)))
+                for c in classes)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise TransferPolicyError(
+                "Each transfer class must have a numeric `min_size`.")
+
+        if self._classes[0][0] != 0:
+            raise TransferPolicyError("The smallest transfer class must start at 0.")
+
+        if any(max_concurrency < 1 for _, _, max_concurrency in self._classes):
+            raise TransferPolicyError("`max_concurrency` must be at least 1.")
+
+    def part_size(self, size):
+        """
+        The part size with which we upload a file of `size` bytes.
+
+        Args:
+            size (int): The size of the file in bytes.
+
+        Returns:
+            int: The part size, adjusted to the limits of s3, or `None` if we
+                upload the file in a single request.
+        """
+        _, chunksize, _ = self._class_for(size)
+
+        if chunksize is None:
+            if size <= self.MAX_SINGLE_UPLOAD_SIZE:
+                return None
+
+            chunksize = self.FALLBACK_CHUNKSIZE
+
+        return adjusted_chunksize(size, chunksize)
+
+    def transfer_configs(self):
+        """
+        A `TransferConfig` for each class, in the order of `class_index`.
+
+        Files of a class which uploads in parts are always at least its
+        `min_size`, so we use that as the multipart threshold, while classes
+        which upload in a single request never reach their threshold (except
+        for files s3 would refuse in a single request).
+
+        Returns:
+            list: The `TransferConfig` instances.
+        """
+        # boto3 takes a good part of a second to import, so we only import it
+        # once we are about to transfer something.
+        from boto3.s3.transfer import TransferConfig
+
+        configs = []
+
+        for min_size, chunksize, max_concurrency in self._classes:
+            if chunksize is None:
+                configs.append(TransferConfig(
+                    multipart_threshold=self.MAX_SINGLE_UPLOAD_SIZE + 1,
+                    multipart_chunksize=self.FALLBACK_CHUNKSIZE,
+                    max_concurrency=max_concurrency))
+            else:
+                configs.append(TransferConfig(
+                    multipart_threshold=min_size,
+                    multipart_chunksize=chunksize,
+                    max_concurrency=max_concurrency))
+
+        return configs
+
+    def class_index(self, size):
+        """
+        Args:
+            size (int): The size of a file in bytes.
+
+        Returns:
+            int: The index of the class the file belongs to.
+        """
+        return self._classes.index(self._class_for(size))
+
+    def max_concurrency(self):
+        """
+        Returns:
+            int: The highest number of parts of one file we upload at once.
+        """
+        return max(max_concurrency for _, _, max_concurrency in self._classes)
+
+    def _class_for(self, size):
+        """
+        Args:
+            size (int): The size of a file in bytes.
+
+        Returns:
+            (int, int, int): The minimum size, part size and concurrency of the
+                class the file belongs to.
+        """
+        match = self._classes[0]
+
+        for transfer_class in self._classes:
+            if size >= transfer_class[0]:
+                match = transfer_class
+
+        return match
+
+def adjusted_chunksize(size, chunksize):
+    """
+    Adjust a part size to the limits of s3 for a file of `size` bytes, exactly
+    as `S3Transfer` does.
+
+    Args:
+        size (int): The size of the file in bytes.
+        chunksize (int): The desired part size.
+
+    Returns:
+        int: The part size.
+    """
+    chunksize = min(max(chunksize, TransferPolicy.MIN_PART_SIZE),
+                    TransferPolicy.MAX_PART_SIZE)
+
+    while -(-size // chunksize) > TransferPolicy.MAX_PARTS:
+        chunksize *= 2
+
+    return chunksize
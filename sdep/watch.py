@@ -0,0 +1,328 @@
+"""
+This file contains the `SiteWatcher` class, which reports the files of a static
+site which change, as well as any related classes and functions.
+"""
+
+# pylint: disable=import-error
+
+import os
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+class SiteWatcher(object):
+    """
+    Watches a site directory and reports which of its files changed, in
+    batches.
+
+    Static site generators rewrite many files in quick succession, so we wait
+    until the site has been quiet for `debounce` seconds before reporting a
+    batch, rather than reporting every file as it is written. A batch may
+    include files which were rewritten with identical bytes; comparing contents
+    is left to the caller.
+
+    We use inotify (through the optional `inotify_simple` package) where it is
+    available, and otherwise poll the `stat` of every file every
+    `poll_interval` seconds.
+
+    Args:
+        site_dir (str): The root directory of the static site.
+        debounce (Optional[float]): The seconds without changes after which we
+            report a batch.
+        poll_interval (Optional[float]): The seconds between polls, when
+            polling.
+        use_inotify (Optional[bool]): Whether to use inotify. Defaults to
+            whether `inotify_simple` is installed.
+
+    Returns:
+        SiteWatcher: An instance of the `SiteWatcher` class.
+    """
+
+    DEBOUNCE = 0.5
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, site_dir, debounce=DEBOUNCE, poll_interval=POLL_INTERVAL,
+                 use_inotify=None):
+        if use_inotify is None:
+            use_inotify = inotify_simple is not None
+
+        self._debounce = debounce
+
+        if use_inotify:
+            self._backend = InotifyBackend(site_dir)
+        else:
+            self._backend = PollingBackend(site_dir, poll_interval)
+
+        self._started = False
+
+    def start(self):
+        """
+        Start watching. Changes made after this call are reported by `batches`,
+        even if we only call it later.
+        """
+        if not self._started:
+            self._backend.start()
+            self._started = True
+
+    def batches(self):
+        """
+        Wait for changes and report them, forever.
+
+        Yields:
+            set: The keys (paths relative to the site directory) of the files
+                which were created, changed or deleted, or `None` if we lost
+                track of the site (i.e. because the whole directory was replaced)
+                and any file may have changed.
+        """
+        self.start()
+
+        while True:
+            changes = self._backend.changes(None)
+            lost_track = changes is None
+            batch = changes or set()
+
+            # Keep collecting until the site has been quiet for a while.
+            while True:
+                changes = self._backend.changes(self._debounce)
+
+                if changes is None:
+                    lost_track = True
+                elif changes:
+                    batch |= changes
+                else:
+                    break
+
+            yield None if lost_track else batch
+
+class PollingBackend(object):
+    """
+    Finds changed files by comparing the `stat` of every file between polls.
+
+    Args:
+        site_dir (str): The root directory of the static site.
+        poll_interval (float): The seconds between polls.
+
+    Returns:
+        PollingBackend: An instance of the `PollingBackend` class.
+    """
+
+    def __init__(self, site_dir, poll_interval):
+        self._site_dir = site_dir
+        self._poll_interval = poll_interval
+        self._snapshot = {}
+
+    def start(self):
+        """
+        Record the state of the site we report changes against.
+        """
+        self._snapshot = self._take_snapshot()
+
+    def changes(self, timeout):
+        """
+        Wait for changes.
+
+        Args:
+            timeout (Optional[float]): The most seconds to wait, or `None` to
+                wait until there are changes.
+
+        Returns:
+            set: The keys of the files which changed, which is empty if none
+                changed within `timeout`.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            if deadline is None:
+                time.sleep(self._poll_interval)
+            else:
+                time.sleep(max(0, min(self._poll_interval, deadline - time.time())))
+
+            snapshot = self._take_snapshot()
+            changed = set(key for key in set(snapshot) | set(self._snapshot)
+                          if snapshot.get(key) != self._snapshot.get(key))
+            self._snapshot = snapshot
+
+            if changed or (deadline is not None and time.time() >= deadline):
+                return changed
+
+    def _take_snapshot(self):
+        """
+        Returns:
+            dict: The size, modification time and inode of every file, by key.
+        """
+        snapshot = {}
+
+        for path, _, files in os.walk(self._site_dir):
+            for file_name in files:
+                full_path = os.path.join(path, file_name)
+
+                try:
+                    stat_result = os.stat(full_path)
+                except OSError:
+                    continue
+
+                snapshot[full_path[len(self._site_dir) + 1:]] = (
+                    stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
+
+        return snapshot
+
+class InotifyBackend(object):
+    """
+    Finds changed files with inotify, watching every directory of the site.
+
+    Args:
+        site_dir (str): The root directory of the static site.
+
+    Returns:
+        InotifyBackend: An instance of the `InotifyBackend` class.
+    """
+
+    def __init__(self, site_dir):
+        flags = inotify_simple.flags
+
+        self._site_dir = site_dir
+        self._inotify = None
+        self._dirs = {}
+
+        # We only report a file once it is completely written or moved into
+        # place, not on every write.
+        self._mask = (flags.CLOSE_WRITE | flags.CREATE | flags.DELETE |
+                      flags.MOVED_FROM | flags.MOVED_TO | flags.DELETE_SELF |
+                      flags.MOVE_SELF)
+
+    def start(self):
+        """
+        Watch every directory of the site.
+        """
+        self._inotify = inotify_simple.INotify()
+        self._watch_tree("")
+
+    def changes(self, timeout):
+        """
+        Wait for changes.
+
+        Args:
+            timeout (Optional[float]): The most seconds to wait, or `None` to
+                wait until there are changes.
+
+        Returns:
+            set: The keys of the files which changed, which is empty if none
+                changed within `timeout`, or `None` if we lost track of the
+                site.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            if deadline is None:
+                events = self._inotify.read()
+            else:
+                events = self._inotify.read(
+                    timeout=max(0, int((deadline - time.time()) * 1000)))
+
+            changed = self._changed_keys(events)
+
+            # Events we ignore, such as a file being created but not yet
+            # written, do not end a quiet period.
+            if changed is None or changed or (deadline is not None and
+                                              time.time() >= deadline):
+                return changed
+
+    def _changed_keys(self, events):
+        """
+        Args:
+            events (list): The inotify events.
+
+        Returns:
+            set: The keys of the files the events changed, or `None` if we
+                lost track of the site.
+        """
+        flags = inotify_simple.flags
+        changed = set()
+
+        for event in events:
+            if event.mask & flags.Q_OVERFLOW:
+                return self._restart()
+
+            rel_dir = self._dirs.get(event.wd)
+
+            if rel_dir is None:
+                continue
+
+            if event.mask & (flags.DELETE_SELF | flags.MOVE_SELF):
+                # The site directory itself was replaced, so start over.
+                if rel_dir == "":
+                    return self._restart()
+
+                continue
+
+            if event.mask & flags.IGNORED:
+                del self._dirs[event.wd]
+                continue
+
+            # Events without a name are about a watched directory itself.
+            if not event.name:
+                continue
+
+            key = os.path.join(rel_dir, event.name) if rel_dir else event.name
+
+            if event.mask & flags.ISDIR:
+                if event.mask & (flags.CREATE | flags.MOVED_TO):
+                    changed |= self._watch_tree(key)
+                elif event.mask & flags.MOVED_FROM:
+                    # We are not told which files moved out with the directory.
+                    return self._restart()
+            elif not event.mask & flags.CREATE:
+                # Files are reported once written, by `CLOSE_WRITE`.
+                changed.add(key)
+
+        return changed
+
+    def _watch_tree(self, rel_dir):
+        """
+        Watch a directory and every directory below it.
+
+        Args:
+            rel_dir (str): The directory, relative to the site directory.
+
+        Returns:
+            set: The keys of the files already in the directory, which may have
+                been written before we watched it.
+        """
+        keys = set()
+        root = os.path.join(self._site_dir, rel_dir) if rel_dir else self._site_dir
+
+        for path, _, files in os.walk(root):
+            rel_path = path[len(self._site_dir) + 1:]
+
+            try:
+                watch = self._inotify.add_watch(path, self._mask)
+            except OSError:
+                continue
+
+            self._dirs[watch] = rel_path
+
+            for file_name in files:
+                keys.add(os.path.join(rel_path, file_name) if rel_path else file_name)
+
+        return keys
+
+    def _restart(self):
+        """
+        Stop watching and watch the site from scratch, waiting for the site
+        directory to exist again.
+
+        Returns:
+            None: We lost track of which files changed.
+        """
+        self._inotify.close()
+        self._dirs = {}
+
+        while not os.path.isdir(self._site_dir):
+            time.sleep(SiteWatcher.POLL_INTERVAL)
+
+        self.start()
+
+        return None
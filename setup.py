@@ -29,12 +29,25 @@ setup(
     # Make sure to tag releases appropriately.
     download_url="https://github.com/mattjmcnaughton/sdep/tarball/{0}".format(version),
     keywords=["deployments", "cli"],
+    # We rely on `concurrent.futures` and `os.scandir`, which first shipped
+    # together in Python 3.5.
+    python_requires=">=3.5",
+    classifiers=[
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
+    ],
     # Dependencies for `sdep`.
     install_requires=[
         "boto3>=1.0.0",
         "click>=6.0",
         "simplejson>=3.0",
     ],
+    # Optional dependencies, installed with i.e. `pip install sdep[brotli]`.
+    extras_require={
+        "brotli": ["brotli"],
+        # Without `inotify_simple`, `watch` polls the site for changes instead.
+        "watch": ["inotify_simple"],
+    },
     # Install `sdep` to the user's site-packages directory.
     packages=["sdep"],
     # Tell pip to generate a script called `sdep` which will invoke
@@ -0,0 +1,121 @@
+"""
+Tests for `batch.py`, particularly the `BatchDeploy` class.
+"""
+
+# pylint: disable=import-error
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import boto3
+
+from moto import mock_s3
+
+from sdep.batch import BatchDeploy
+from sdep.config import Config
+from sdep.metrics import DeployMetrics
+
+class BatchDeployTestCase(unittest.TestCase):
+    """
+    Test cases for the `BatchDeploy` class.
+    """
+
+    DOMAINS = ["one.sdep-test.com", "two.sdep-test.com", "three.sdep-test.com"]
+
+    def setUp(self):
+        self._tmp_dirs = []
+        self._configs = []
+
+        for i, domain in enumerate(self.DOMAINS):
+            site_dir = tempfile.mkdtemp()
+            self._tmp_dirs.append(site_dir)
+
+            for j in range(i + 1):
+                with open(os.path.join(site_dir, "{0}.html".format(j)), "w") as site_file:
+                    site_file.write("{0} {1}".format(domain, j))
+
+            config = Config(test_mode=True)
+            config.put(Config.DOMAIN_FIELD, domain)
+            config.put(Config.SITE_DIR_FIELD, site_dir)
+            config.put(Config.MAX_WORKERS_FIELD, 2)
+            self._configs.append(config)
+
+    def tearDown(self):
+        for tmp_dir in self._tmp_dirs:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @mock_s3
+    def test_create_and_update(self):
+        """
+        Test that a batch deploys every site, counting every request in the
+        batch's metrics, and reports each site's result in order.
+        """
+        batch = BatchDeploy(self._configs)
+
+        results = batch.create()
+        self.assertEqual([result.name for result in results], self.DOMAINS)
+        self.assertEqual([result.summary.uploaded for result in results], [1, 2, 3])
+        self.assertTrue(all(result.error is None for result in results))
+
+        s3_client = boto3.client("s3", aws_access_key_id="TEST_ID",
+                                 aws_secret_access_key="TEST_KEY")
+
+        for i, domain in enumerate(self.DOMAINS):
+            resp_objects = s3_client.list_objects(Bucket=domain)
+            # The site's files, plus the manifest.
+            self.assertEqual(len(resp_objects["Contents"]), i + 2)
+
+        results = batch.update()
+        self.assertEqual([result.summary.skipped for result in results], [1, 2, 3])
+
+        batch.close()
+
+        metrics = batch.metrics
+        self.assertEqual(metrics.counter(DeployMetrics.FILES_UPLOADED), 6)
+        self.assertEqual(metrics.counter(DeployMetrics.FILES_SKIPPED), 6)
+        self.assertEqual(metrics.requests()["CreateBucket"], 3)
+
+    @mock_s3
+    def test_sites_in_several_regions(self):
+        """
+        Test that sites with the same credentials but in different regions
+        each get a client of their own, so each bucket is created in its
+        region.
+        """
+        regions = ["eu-west-1", "us-west-2", None]
+
+        for config, region in zip(self._configs, regions):
+            config.put(Config.REGION_FIELD, region)
+
+        batch = BatchDeploy(self._configs)
+        results = batch.create()
+        batch.close()
+
+        self.assertTrue(all(result.error is None for result in results))
+
+        s3_client = boto3.client("s3", aws_access_key_id="TEST_ID",
+                                 aws_secret_access_key="TEST_KEY")
+
+        for domain, region in zip(self.DOMAINS, regions):
+            location = s3_client.get_bucket_location(Bucket=domain)
+            self.assertEqual(location.get("LocationConstraint"), region)
+
+    @mock_s3
+    def test_failed_site(self):
+        """
+        Test that a site which fails to deploy does not stop the others.
+        """
+        s3_client = boto3.client("s3", aws_access_key_id="TEST_ID",
+                                 aws_secret_access_key="TEST_KEY")
+        s3_client.create_bucket(Bucket=self.DOMAINS[0])
+        s3_client.create_bucket(Bucket=self.DOMAINS[2])
+
+        batch = BatchDeploy(self._configs)
+        results = batch.update()
+        batch.close()
+
+        self.assertEqual([result.error is None for result in results],
+                         [True, False, True])
+        self.assertEqual(results[2].summary.uploaded, 3)
@@ -0,0 +1,146 @@
+"""
+Tests for `cache.py`, particularly the `HashCache` class.
+"""
+
+# pylint: disable=import-error
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from sdep.cache import HashCache
+
+class HashCacheTestCase(unittest.TestCase):
+    """
+    Test cases for the `HashCache` class.
+    """
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._cache_file = os.path.join(self._tmp_dir, "cache", "hashes.sqlite")
+        self._computed = []
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def test_unchanged_file_not_rehashed(self):
+        """
+        Test that once a file's digest is cached, we never compute it again
+        while the file is unchanged, even from a new cache instance.
+        """
+        site_file = self._create_file("site/index.html", "TEST")
+
+        cache = HashCache(self._cache_file)
+        self.assertEqual(self._digest(cache, site_file), "TEST")
+        cache.close()
+
+        cache = HashCache(self._cache_file)
+        self.assertEqual(self._digest(cache, site_file), "TEST")
+        cache.close()
+
+        self.assertEqual(len(self._computed), 1)
+
+    def test_changed_file_rehashed(self):
+        """
+        Test that changing a file's contents (and so its size and mtime)
+        invalidates its cached digest.
+        """
+        site_file = self._create_file("site/index.html", "TEST")
+
+        cache = HashCache(self._cache_file)
+        self._digest(cache, site_file)
+
+        self._create_file("site/index.html", "CHANGED", age=50)
+
+        self.assertEqual(self._digest(cache, site_file), "CHANGED")
+        self.assertEqual(len(self._computed), 2)
+
+        cache.close()
+
+    def test_clear_directory(self):
+        """
+        Test that clearing the cache for one site leaves other sites' digests
+        untouched.
+        """
+        first_file = self._create_file("first/index.html", "FIRST")
+        second_file = self._create_file("second/index.html", "SECOND")
+
+        cache = HashCache(self._cache_file)
+        self._digest(cache, first_file)
+        self._digest(cache, second_file)
+
+        cache.clear(os.path.join(self._tmp_dir, "first"))
+
+        self._digest(cache, first_file)
+        self._digest(cache, second_file)
+
+        self.assertEqual(self._computed, [first_file, second_file, first_file])
+
+        cache.close()
+
+    def _digest(self, cache, full_path):
+        """
+        Get the digest of a file the way a deploy does, from the cache if it
+        has a valid entry and otherwise by computing and storing it.
+
+        Args:
+            cache (HashCache): The cache.
+            full_path (str): The path to the file.
+
+        Returns:
+            str: The digest of the file.
+        """
+        stat_result = os.stat(full_path)
+        cached_digest = cache.lookup(full_path, stat_result, "md5")
+
+        if cached_digest is not None:
+            return cached_digest
+
+        computed_digest = self._compute(full_path)
+        cache.store(full_path, stat_result, "md5", computed_digest)
+
+        return computed_digest
+
+    def _compute(self, full_path):
+        """
+        A stand in for a real digest, which records the files it was asked to
+        hash and returns their contents.
+
+        Args:
+            full_path (str): The path to the file.
+
+        Returns:
+            str: The contents of the file.
+        """
+        self._computed.append(full_path)
+
+        with open(full_path) as site_file:
+            return site_file.read()
+
+    def _create_file(self, name, contents, age=100):
+        """
+        Create a file below our temporary directory, with an mtime far enough in
+        the past that the cache trusts it.
+
+        Args:
+            name (str): The file's path relative to the temporary directory.
+            contents (str): The contents of the file.
+            age (int): How many seconds in the past to set the file's mtime.
+
+        Returns:
+            str: The absolute path to the file.
+        """
+        full_path = os.path.join(self._tmp_dir, name)
+
+        if not os.path.isdir(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+
+        with open(full_path, "w") as site_file:
+            site_file.write(contents)
+
+        mtime = time.time() - age
+        os.utime(full_path, (mtime, mtime))
+
+        return full_path
@@ -4,6 +4,11 @@ Tests for the `cli`.
 
 # pylint: disable=import-error
 
+import json
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
 
 from click.testing import CliRunner
@@ -14,6 +19,10 @@ class CliTestCase(unittest.TestCase):
     """
     A collection of test cases for the cli.
     """
+
+    # The modules which only an upload (or another call to s3) should import.
+    DEFERRED_MODULES = ["boto3", "botocore", "s3transfer"]
+
     def __init__(self, *args, **kwargs):
         unittest.TestCase.__init__(self, *args, **kwargs)
         self._runner = CliRunner()
@@ -22,10 +31,11 @@ class CliTestCase(unittest.TestCase):
         """
         Test the cli recognizes the actions that should exist.
         """
-        actions = ["create", "update"]
+        actions = ["create", "update", "plan", "apply", "release", "rollback",
+                   "watch"]
 
         for action in actions:
-            result = self._runner.invoke(cli, [action, "--test"])
+            result = self._runner.invoke(cli, [action, "plan.json.gz", "--test"])
 
             self.assertEqual(result.exit_code, 0)
             self.assertTrue(action in result.output)
@@ -41,3 +51,128 @@ class CliTestCase(unittest.TestCase):
             result = self._runner.invoke(cli, [false_action, "--test"])
 
             self.assertNotEqual(result.exit_code, 0)
+
+    def test_cli_max_workers(self):
+        """
+        Test the cli accepts a positive number of upload workers and rejects
+        anything else.
+        """
+        result = self._runner.invoke(cli, ["update", "--test", "--max-workers", "4"])
+        self.assertEqual(result.exit_code, 0)
+
+        result = self._runner.invoke(cli, ["update", "--test", "--max-workers", "0"])
+        self.assertNotEqual(result.exit_code, 0)
+
+    def test_cli_prune(self):
+        """
+        Test the cli accepts the prune flag.
+        """
+        result = self._runner.invoke(cli, ["update", "--test", "--prune"])
+        self.assertEqual(result.exit_code, 0)
+
+    def test_cli_metrics_format(self):
+        """
+        Test the cli accepts the metrics formats we support and rejects
+        anything else.
+        """
+        for metrics_format in ["json", "statsd"]:
+            result = self._runner.invoke(cli, ["update", "--test", "--metrics-file", "-",
+                                               "--metrics-format", metrics_format])
+            self.assertEqual(result.exit_code, 0)
+
+        result = self._runner.invoke(cli, ["update", "--test", "--metrics-format", "xml"])
+        self.assertNotEqual(result.exit_code, 0)
+
+    def test_cli_plan_file_required(self):
+        """
+        Test the cli requires a plan file for the plan and apply actions.
+        """
+        for action in ["plan", "apply"]:
+            result = self._runner.invoke(cli, [action, "--test"])
+            self.assertNotEqual(result.exit_code, 0)
+
+    def test_cli_batch_actions(self):
+        """
+        Test the cli deploys several sites at once only with create or update.
+        """
+        configs = ["--config", "one.sdeprc", "--config", "two.sdeprc"]
+
+        result = self._runner.invoke(cli, ["update", "--test"] + configs)
+        self.assertEqual(result.exit_code, 0)
+
+        result = self._runner.invoke(cli, ["release", "--test"] + configs)
+        self.assertNotEqual(result.exit_code, 0)
+
+    def test_cli_single_bucket_actions_refuse_targets(self):
+        """
+        Test the cli refuses to plan, apply, release or roll back a site with
+        `targets`, which these actions would leave behind.
+        """
+        config_file = self._create_config_file(
+            targets=[{"bucket_name": "eu.sdep-test.com"}])
+
+        for action, target in [("plan", "deploy.plan"), ("apply", "deploy.plan"),
+                               ("release", None), ("rollback", None)]:
+            args = [action] + ([target] if target else []) + ["--config", config_file]
+            result = self._runner.invoke(cli, args)
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn("`targets` is set", result.output)
+
+        os.remove(config_file)
+
+    def test_cli_number_config_error(self):
+        """
+        Test the cli reports a setting which is not a number as an error in the
+        configuration, naming the setting.
+        """
+        config_file = self._create_config_file(max_workers="abc")
+
+        result = self._runner.invoke(cli, ["update", "--config", config_file])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Error in configuration: 'max_workers'", result.output)
+
+        os.remove(config_file)
+
+    def test_cli_import_is_light(self):
+        """
+        Test that importing the cli leaves boto3 unimported, so that
+        `sdep --help` and config errors stay quick.
+        """
+        check = ("import sys, sdep.cli; "
+                 "print(','.join(sorted(set({0}) & set(sys.modules))))"
+                 .format(self.DEFERRED_MODULES))
+        process = subprocess.Popen([sys.executable, "-c", check],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+        out, _ = process.communicate()
+
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(out.strip(), "")
+
+    @staticmethod
+    def _create_config_file(**fields):
+        """
+        A helper method to create a configuration file for a site which needs
+        no hash cache.
+
+        Args:
+            fields (dict): The fields to set besides the required ones.
+
+        Returns:
+            str: The path to the configuration file.
+        """
+        config = {
+            "aws_access_key_id": "MY_ACCESS_KEY",
+            "aws_secret_access_key": "MY_SECRET_KEY",
+            "site_dir": tempfile.gettempdir(),
+            "domain": "sdep-test.com",
+            "hash_cache_file": ""
+        }
+        config.update(fields)
+
+        _, file_name = tempfile.mkstemp()
+
+        with open(file_name, "w+") as new_config_file:
+            new_config_file.write(json.dumps(config))
+
+        return file_name
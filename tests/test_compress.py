@@ -0,0 +1,132 @@
+"""
+Tests for `compress.py`, particularly the `Compressor` class.
+"""
+
+# pylint: disable=import-error
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from sdep.compress import Compressor, UnsupportedEncodingError
+
+class CompressorTestCase(unittest.TestCase):
+    """
+    Test cases for the `Compressor` class.
+    """
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._compressor = Compressor(os.path.join(self._tmp_dir, "cache"),
+                                      content_types=["text/html"])
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def test_should_compress(self):
+        """
+        Test that we only compress the configured content types, ignoring any
+        parameters.
+        """
+        self.assertTrue(self._compressor.should_compress("text/html"))
+        self.assertTrue(self._compressor.should_compress("text/html; charset=utf-8"))
+        self.assertFalse(self._compressor.should_compress("image/png"))
+
+    def test_compress(self):
+        """
+        Test that compressing gives a valid gzip file, and that compressing the
+        same contents again reuses the cached output.
+        """
+        contents = b"<html>" + b"TEST " * 1000 + b"</html>"
+        full_path = self._create_file("index.html", contents)
+
+        compressed_path = self._compressor.compress(full_path, "abcdef")
+
+        with gzip.open(compressed_path, "rb") as gzip_file:
+            self.assertEqual(gzip_file.read(), contents)
+
+        with patch.object(Compressor, "_compress_to_tmp") as compress_to_tmp:
+            self.assertEqual(self._compressor.compress(full_path, "abcdef"),
+                             compressed_path)
+            self.assertFalse(compress_to_tmp.called)
+
+    def test_compress_not_worth_it(self):
+        """
+        Test that we do not use compressed output which is not small enough,
+        and remember not to try again.
+        """
+        full_path = self._create_file("random.html", os.urandom(4096))
+
+        self.assertEqual(self._compressor.compress(full_path, "123456"), None)
+
+        with patch.object(Compressor, "_compress_to_tmp") as compress_to_tmp:
+            self.assertEqual(self._compressor.compress(full_path, "123456"), None)
+            self.assertFalse(compress_to_tmp.called)
+
+    def test_skip_depends_on_ratio(self):
+        """
+        Test that a file we skipped as not compressing well enough for one
+        `min_ratio` is still compressed for a more lenient one.
+        """
+        full_path = self._create_file("half.html", os.urandom(4096) + b"TEST" * 1024)
+        cache_dir = os.path.join(self._tmp_dir, "cache")
+
+        strict = Compressor(cache_dir, content_types=["text/html"], min_ratio=0.3)
+        self.assertEqual(strict.compress(full_path, "abcdef"), None)
+
+        lenient = Compressor(cache_dir, content_types=["text/html"], min_ratio=0.9)
+        self.assertNotEqual(lenient.compress(full_path, "abcdef"), None)
+
+        # The output the lenient compressor cached is still too big for us.
+        self.assertEqual(strict.compress(full_path, "abcdef"), None)
+
+    def test_trim_cache(self):
+        """
+        Test that creating a compressor trims the cache to its maximum size,
+        removing the output used least recently first.
+        """
+        contents = b"<html>" + b"TEST " * 1000 + b"</html>"
+        full_path = self._create_file("index.html", contents)
+        cache_dir = os.path.join(self._tmp_dir, "cache")
+
+        old_path = self._compressor.compress(full_path, "aaaaaa")
+        new_path = self._compressor.compress(full_path, "bbbbbb")
+        os.utime(old_path, (0, 0))
+
+        Compressor(cache_dir, max_cache_size=os.path.getsize(new_path))
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(new_path))
+
+    def test_unsupported_encoding(self):
+        """
+        Test that we refuse encodings we cannot produce.
+        """
+        with self.assertRaises(UnsupportedEncodingError):
+            Compressor(self._tmp_dir, encoding="compress")
+
+        with patch("sdep.compress.brotli", None):
+            with self.assertRaises(UnsupportedEncodingError):
+                Compressor(self._tmp_dir, encoding=Compressor.BROTLI)
+
+    def _create_file(self, name, contents):
+        """
+        Create a file in our temporary directory.
+
+        Args:
+            name (str): The name of the file.
+            contents (bytes): The contents of the file.
+
+        Returns:
+            str: The path to the file.
+        """
+        full_path = os.path.join(self._tmp_dir, name)
+
+        with open(full_path, "wb") as new_file:
+            new_file.write(contents)
+
+        return full_path
@@ -16,7 +16,7 @@ import simplejson as json
 
 from mock import patch
 
-from sdep.config import Config, ConfigParseError
+from sdep.config import Config, ConfigImproperFormatError, ConfigParseError
 
 class ConfigTestCase(unittest.TestCase):
     """
@@ -113,6 +113,39 @@ class ConfigTestCase(unittest.TestCase):
         with self.assertRaises(ConfigParseError):
             Config(config_file=config_file)
 
+    def test_get_json_error(self):
+        """
+        Test that a field which is not valid JSON raises an error naming the
+        field and what is wrong with it.
+        """
+        config = Config(test_mode=True)
+        config.put(Config.HEADERS_FIELD, "[{")
+
+        with self.assertRaises(ConfigImproperFormatError) as context:
+            config.get_json(Config.HEADERS_FIELD)
+
+        self.assertIn(Config.HEADERS_FIELD, str(context.exception))
+        self.assertIn("line 1", str(context.exception))
+
+    def test_get_number_error(self):
+        """
+        Test that a field which is not a number raises an error naming the
+        field, as it would otherwise surface as a bare `ValueError`.
+        """
+        config = Config(test_mode=True)
+        config.put(Config.MAX_WORKERS_FIELD, "abc")
+        config.put(Config.COMPRESS_MIN_RATIO_FIELD, "abc")
+
+        with self.assertRaises(ConfigImproperFormatError) as context:
+            config.get_int(Config.MAX_WORKERS_FIELD)
+
+        self.assertIn(Config.MAX_WORKERS_FIELD, str(context.exception))
+
+        with self.assertRaises(ConfigImproperFormatError) as context:
+            config.get_float(Config.COMPRESS_MIN_RATIO_FIELD)
+
+        self.assertIn(Config.COMPRESS_MIN_RATIO_FIELD, str(context.exception))
+
     @classmethod
     def _config_dict(cls):
         """
@@ -0,0 +1,64 @@
+"""
+Tests for `content_types.py`, particularly the `ContentTypeResolver` class.
+"""
+
+# pylint: disable=import-error
+
+import unittest
+
+from sdep.content_types import ContentTypeResolver
+
+class ContentTypeResolverTestCase(unittest.TestCase):
+    """
+    Test cases for the `ContentTypeResolver` class.
+    """
+
+    def test_resolve(self):
+        """
+        Test that we resolve common, built in and unknown extensions.
+        """
+        resolver = ContentTypeResolver()
+
+        self.assertEqual(resolver.resolve("index.html"), "text/html")
+        self.assertEqual(resolver.resolve("css/style.css"), "text/css")
+        self.assertEqual(resolver.resolve("style.scss"), "text/css")
+        self.assertEqual(resolver.resolve("fonts/icons.eot"),
+                         "application/vnd.ms-fontobject")
+        self.assertEqual(resolver.resolve("test.nomatch"),
+                         ContentTypeResolver.DEFAULT_CONTENT_TYPE)
+        self.assertEqual(resolver.resolve("LICENSE"),
+                         ContentTypeResolver.DEFAULT_CONTENT_TYPE)
+
+    def test_exact_extension_match(self):
+        """
+        Test that extensions match exactly, so i.e. `.tf` is not mistaken for
+        `.ttf` and `.woff2` is not mistaken for `.woff`.
+        """
+        resolver = ContentTypeResolver(overrides={"ttf": "font/ttf"})
+
+        self.assertEqual(resolver.resolve("main.tf"),
+                         ContentTypeResolver.DEFAULT_CONTENT_TYPE)
+        self.assertEqual(resolver.resolve("icons.ttf"), "font/ttf")
+        self.assertNotEqual(resolver.resolve("icons.woff2"),
+                            resolver.resolve("icons.woff"))
+
+    def test_case_insensitive(self):
+        """
+        Test that extensions are matched regardless of case, both repeatedly
+        (through the memo) and for overrides.
+        """
+        resolver = ContentTypeResolver(overrides={".MD": "text/markdown"})
+
+        for _ in range(2):
+            self.assertEqual(resolver.resolve("INDEX.HTML"), "text/html")
+            self.assertEqual(resolver.resolve("README.md"), "text/markdown")
+
+    def test_overrides(self):
+        """
+        Test that user overrides take precedence over every other mapping.
+        """
+        resolver = ContentTypeResolver(overrides={"html": "text/html; charset=utf-8"})
+
+        self.assertEqual(resolver.resolve("index.html"), "text/html; charset=utf-8")
+        self.assertEqual(ContentTypeResolver.default().resolve("index.html"),
+                         "text/html")
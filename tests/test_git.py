@@ -0,0 +1,127 @@
+"""
+Tests for `git.py`, particularly the `GitWorkTree` class.
+"""
+
+# pylint: disable=import-error
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from sdep.git import GitError, GitWorkTree
+
+def run_git(repo_dir, *args):
+    """
+    Run a git command in `repo_dir`, as a test author with no global config.
+
+    Args:
+        repo_dir (str): The directory to run git in.
+        *args (str): The arguments to git.
+
+    Returns:
+        str: What the command printed.
+    """
+    return subprocess.check_output(
+        ("git", "-c", "user.name=sdep", "-c", "user.email=sdep@example.com") + args,
+        cwd=repo_dir, universal_newlines=True)
+
+class GitWorkTreeTestCase(unittest.TestCase):
+    """
+    Test cases for the `GitWorkTree` class.
+    """
+
+    def setUp(self):
+        self._repo_dir = tempfile.mkdtemp()
+        self._site_dir = os.path.join(self._repo_dir, "site")
+
+        os.makedirs(os.path.join(self._site_dir, "css"))
+
+        for name in ["index.html", "about.html", os.path.join("css", "main.css")]:
+            self._write(name, "TEST")
+
+        self._write_outside("README", "TEST")
+
+        run_git(self._repo_dir, "init", "-q")
+        run_git(self._repo_dir, "add", "-A")
+        run_git(self._repo_dir, "commit", "-q", "-m", "First")
+
+    def tearDown(self):
+        shutil.rmtree(self._repo_dir, ignore_errors=True)
+
+    def test_find(self):
+        """
+        Test that we only find work trees where there is one.
+        """
+        self.assertNotEqual(GitWorkTree.find(self._site_dir), None)
+
+        other_dir = tempfile.mkdtemp()
+        self.assertEqual(GitWorkTree.find(other_dir), None)
+        shutil.rmtree(other_dir, ignore_errors=True)
+
+    def test_changed_paths(self):
+        """
+        Test that we report the files changed, added and deleted within the
+        site directory, relative to it, and nothing outside it.
+        """
+        work_tree = GitWorkTree.find(self._site_dir)
+        first = work_tree.head()
+
+        self._write("index.html", "CHANGED")
+        self._write("new.html", "NEW")
+        os.remove(os.path.join(self._site_dir, "css", "main.css"))
+        self._write_outside("README", "CHANGED")
+
+        self.assertEqual(sorted(work_tree.uncommitted_paths()),
+                         ["css/main.css", "index.html", "new.html"])
+
+        run_git(self._repo_dir, "add", "-A")
+        run_git(self._repo_dir, "commit", "-q", "-m", "Second")
+
+        self.assertEqual(work_tree.uncommitted_paths(), [])
+        self.assertNotEqual(work_tree.head(), first)
+        self.assertEqual(sorted(work_tree.changed_paths(first)),
+                         ["css/main.css", "index.html", "new.html"])
+        self.assertEqual(sorted(work_tree.files()),
+                         ["about.html", "index.html", "new.html"])
+
+        with self.assertRaises(GitError):
+            work_tree.changed_paths("0" * 40)
+
+    def test_untracked_files_are_uncommitted(self):
+        """
+        Test that untracked files, even those git ignores, count as
+        uncommitted, since a full scan would deploy them.
+        """
+        work_tree = GitWorkTree.find(self._site_dir)
+
+        self._write_outside(".gitignore", "*.log\n")
+        run_git(self._repo_dir, "add", ".gitignore")
+        run_git(self._repo_dir, "commit", "-q", "-m", "Ignore logs")
+        self.assertEqual(work_tree.uncommitted_paths(), [])
+
+        self._write("build.log", "TEST")
+        self.assertEqual(work_tree.uncommitted_paths(), ["build.log"])
+
+    def _write(self, name, contents):
+        """
+        Write a file of the site.
+
+        Args:
+            name (str): The path of the file, relative to the site.
+            contents (str): The contents.
+        """
+        with open(os.path.join(self._site_dir, name), "w") as site_file:
+            site_file.write(contents)
+
+    def _write_outside(self, name, contents):
+        """
+        Write a file of the repository, outside the site.
+
+        Args:
+            name (str): The path of the file, relative to the repository.
+            contents (str): The contents.
+        """
+        with open(os.path.join(self._repo_dir, name), "w") as repo_file:
+            repo_file.write(contents)
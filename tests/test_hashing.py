@@ -0,0 +1,77 @@
+"""
+Tests for `hashing.py`, particularly the `EtagCalculator` class.
+"""
+
+# pylint: disable=import-error
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from sdep.hashing import EtagCalculator, part_count
+from sdep.transfer import MIB, TransferPolicy
+
+class EtagCalculatorTestCase(unittest.TestCase):
+    """
+    Test cases for the `EtagCalculator` class.
+    """
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._calculator = EtagCalculator(TransferPolicy([
+            {"min_size": 0},
+            {"min_size": 8 * MIB, "multipart_chunksize": 8 * MIB}
+        ]), chunk_size=3 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def test_compute(self):
+        """
+        Test computing the plain and multipart `ETag` of a file in one pass,
+        with chunks which do not line up with the parts.
+        """
+        contents = os.urandom(20 * 1024)
+        full_path = os.path.join(self._tmp_dir, "file")
+
+        with open(full_path, "wb") as new_file:
+            new_file.write(contents)
+
+        part_size = 8 * 1024
+        parts = [contents[i:i + part_size] for i in range(0, len(contents), part_size)]
+        expected = "{0}-3".format(hashlib.md5(b"".join(
+            hashlib.md5(part).digest() for part in parts)).hexdigest())
+
+        etags = self._calculator.compute(full_path, [None, part_size])
+
+        self.assertEqual(etags[None], hashlib.md5(contents).hexdigest())
+        self.assertEqual(etags[part_size], expected)
+
+    def test_upload_part_size(self):
+        """
+        Test that we only upload large files in parts, adjusting the part size
+        so no file needs more than 10000 parts.
+        """
+        self.assertEqual(self._calculator.upload_part_size(MIB), None)
+        self.assertEqual(self._calculator.upload_part_size(100 * MIB), 8 * MIB)
+        self.assertEqual(self._calculator.upload_part_size(100000 * MIB), 16 * MIB)
+
+    def test_part_sizes_for(self):
+        """
+        Test inferring the part size of an object from its `ETag`, trying our
+        own part size first.
+        """
+        self.assertEqual(self._calculator.part_sizes_for(100, "abc"), [None])
+        self.assertEqual(self._calculator.part_sizes_for(100 * MIB, "abc-13")[0], 8 * MIB)
+        self.assertEqual(self._calculator.part_sizes_for(100 * MIB, "abc-7"),
+                         [15 * MIB, 16 * MIB])
+        self.assertEqual(self._calculator.part_sizes_for(MIB, "abc-1"), [8 * MIB])
+
+    def test_part_count(self):
+        """
+        Test reading the number of parts from an `ETag`.
+        """
+        self.assertEqual(part_count("d41d8cd98f00b204e9800998ecf8427e"), None)
+        self.assertEqual(part_count("d41d8cd98f00b204e9800998ecf8427e-12"), 12)
@@ -0,0 +1,73 @@
+"""
+Tests for `headers.py`, particularly the `HeaderRules` class.
+"""
+
+# pylint: disable=import-error
+
+import unittest
+
+from sdep.headers import HeaderRuleError, HeaderRules
+
+class HeaderRulesTestCase(unittest.TestCase):
+    """
+    Test cases for the `HeaderRules` class.
+    """
+
+    def test_resolve(self):
+        """
+        Test that each key gets the headers of the first rule it matches.
+        """
+        rules = HeaderRules([
+            {"pattern": "assets/**",
+             "headers": {"Cache-Control": "public, max-age=31536000, immutable"}},
+            {"pattern": "*.html", "headers": {"Cache-Control": "max-age=60"}},
+            {"pattern": "downloads/*.pdf",
+             "headers": {"Content-Disposition": "attachment",
+                         "x-amz-meta-Owner": "docs"}}
+        ])
+
+        immutable = {"CacheControl": "public, max-age=31536000, immutable"}
+        short_ttl = {"CacheControl": "max-age=60"}
+
+        self.assertEqual(rules.resolve("assets/css/main.css"), immutable)
+        self.assertEqual(rules.resolve("assets/index.html"), immutable)
+        self.assertEqual(rules.resolve("index.html"), short_ttl)
+        self.assertEqual(rules.resolve("blog/post/index.html"), short_ttl)
+        self.assertEqual(rules.resolve("downloads/guide.pdf"),
+                         {"ContentDisposition": "attachment",
+                          "Metadata": {"owner": "docs"}})
+        self.assertEqual(rules.resolve("downloads/old/guide.pdf"), {})
+        self.assertEqual(rules.resolve("img/logo.png"), {})
+
+    def test_glob_syntax(self):
+        """
+        Test the `?`, character class and `**/` parts of the glob syntax.
+        """
+        rules = HeaderRules([
+            {"pattern": "v?/**/[!_]*.js", "headers": {"Cache-Control": "no-cache"}}
+        ])
+
+        self.assertNotEqual(rules.resolve("v1/app.js"), {})
+        self.assertNotEqual(rules.resolve("v2/lib/deep/app.js"), {})
+        self.assertEqual(rules.resolve("v10/app.js"), {})
+        self.assertEqual(rules.resolve("v1/_private.js"), {})
+
+    def test_no_rules(self):
+        """
+        Test that without rules, every key resolves to no headers.
+        """
+        self.assertEqual(HeaderRules([]).resolve("index.html"), {})
+
+    def test_bad_rules(self):
+        """
+        Test that improperly specified rules raise a `HeaderRuleError`.
+        """
+        bad_rules = [
+            [{"pattern": "*.html"}],
+            [{"pattern": "*.html", "headers": {"Content-Encoding": "gzip"}}],
+            ["*.html"]
+        ]
+
+        for rules in bad_rules:
+            with self.assertRaises(HeaderRuleError):
+                HeaderRules(rules)
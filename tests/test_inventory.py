@@ -0,0 +1,114 @@
+"""
+Tests for `inventory.py`, particularly the `RemoteIndex` class.
+"""
+
+# pylint: disable=import-error
+
+import hashlib
+import unittest
+
+import boto3
+
+from moto import mock_s3
+
+from sdep.inventory import RemoteIndex, RemoteObject
+
+class RemoteIndexTestCase(unittest.TestCase):
+    """
+    Test cases for the `RemoteIndex` class.
+    """
+
+    BUCKET_NAME = "sdep-test.com"
+
+    def __init__(self, *args, **kwargs):
+        unittest.TestCase.__init__(self, *args, **kwargs)
+
+        self._s3_client = boto3.client("s3", aws_access_key_id="TEST_ID",
+                                       aws_secret_access_key="TEST_KEY")
+
+    @mock_s3
+    def test_build_index(self):
+        """
+        Test that building the index records every object in the bucket, both
+        at the root and below prefixes, whether or not we list in parallel.
+        """
+        keys = ["index.html", "css/main.css", "js/app.js", "js/vendor/lib.js",
+                "img/logo.png"]
+        self._create_bucket_with_keys(keys)
+
+        for max_workers in [1, 4]:
+            index = RemoteIndex.build(self._s3_client, self.BUCKET_NAME,
+                                      max_workers=max_workers)
+
+            self.assertEqual(len(index), len(keys))
+
+            for key in keys:
+                expected_etag = hashlib.md5(key.encode("utf-8")).hexdigest()
+
+                self.assertTrue(key in index)
+                self.assertEqual(index.get(key).etag, expected_etag)
+                self.assertEqual(index.get(key).size, len(key))
+
+    @mock_s3
+    def test_build_index_empty_bucket(self):
+        """
+        Test that building the index of an empty bucket gives an empty index.
+        """
+        self._create_bucket_with_keys([])
+
+        index = RemoteIndex.build(self._s3_client, self.BUCKET_NAME)
+
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.get("index.html"), None)
+
+    def test_add_and_discard(self):
+        """
+        Test that we can keep the index up to date as we change the bucket.
+        """
+        index = RemoteIndex()
+        index.add(RemoteObject(key="index.html", etag="abc", size=3,
+                               last_modified=None, content_type="text/html",
+                               headers={}))
+
+        self.assertEqual(index.get("index.html").etag, "abc")
+
+        index.discard("index.html")
+        index.discard("never-added.html")
+
+        self.assertFalse("index.html" in index)
+
+    def test_find(self):
+        """
+        Test finding an object by its contents, including after the object is
+        overwritten or removed.
+        """
+        index = RemoteIndex()
+
+        for key, etag in [("a.html", "abc"), ("b.html", "abc"), ("c.html", "def")]:
+            index.add(RemoteObject(key=key, etag=etag, size=3, last_modified=None,
+                                   content_type="text/html", headers={}))
+
+        self.assertEqual(index.find("abc"), "a.html")
+        self.assertEqual(index.find("def"), "c.html")
+        self.assertEqual(index.find("ghi"), None)
+
+        index.add(RemoteObject(key="c.html", etag="ghi", size=3, last_modified=None,
+                               content_type="text/html", headers={}))
+        index.discard("a.html")
+
+        self.assertEqual(index.find("def"), None)
+        self.assertEqual(index.find("ghi"), "c.html")
+        self.assertEqual(index.find("abc"), None)
+
+    def _create_bucket_with_keys(self, keys):
+        """
+        Create our test bucket, with each key's contents equal to its name.
+
+        Args:
+            keys (list): The keys to create.
+        """
+        self._s3_client.create_bucket(Bucket=self.BUCKET_NAME)
+
+        for key in keys:
+            self._s3_client.put_object(Bucket=self.BUCKET_NAME, Key=key,
+                                       Body=key.encode("utf-8"))
@@ -0,0 +1,74 @@
+"""
+Tests for `journal.py`, particularly the `DeployJournal` class.
+"""
+
+# pylint: disable=import-error
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sdep.inventory import RemoteIndex, RemoteObject
+from sdep.journal import DeployJournal, replay
+from sdep.manifest import Manifest
+
+class DeployJournalTestCase(unittest.TestCase):
+    """
+    Test cases for the `DeployJournal` class.
+    """
+
+    BUCKET_NAME = "sdep-test.com"
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._journal_file = os.path.join(self._tmp_dir, "journals", "site.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def test_read_and_replay(self):
+        """
+        Test that the baseline plus the recorded lines give the objects in the
+        bucket, ignoring a line cut short by a crash.
+        """
+        baseline = Manifest.from_index(RemoteIndex([
+            RemoteObject(key="index.html", etag="a", size=1, last_modified=None,
+                         content_type="text/html", headers={}),
+            RemoteObject(key="old.html", etag="b", size=1, last_modified=None,
+                         content_type="text/html", headers={})
+        ]))
+
+        journal = DeployJournal.begin(self._journal_file, self.BUCKET_NAME, baseline,
+                                      fsync_every=1)
+        journal.record_put("index.html", "c", 2, {"ContentType": "text/html",
+                                                  "CacheControl": "max-age=60"})
+        journal.record_delete("old.html")
+
+        with open(self._journal_file, "a") as journal_output:
+            journal_output.write('["put", "new.ht')
+
+        read_baseline, entries = DeployJournal.read(self._journal_file, self.BUCKET_NAME)
+        self.assertEqual(len(entries), 2)
+
+        remote_index = read_baseline.to_index()
+        replay(remote_index, entries)
+
+        self.assertEqual(sorted(remote_index.keys()), ["index.html"])
+        self.assertEqual(remote_index.get("index.html").etag, "c")
+        self.assertEqual(remote_index.get("index.html").headers,
+                         {"CacheControl": "max-age=60"})
+
+        journal.finish()
+        self.assertFalse(os.path.isfile(self._journal_file))
+
+    def test_read_other_bucket(self):
+        """
+        Test that we ignore a missing journal, or the journal of another bucket.
+        """
+        self.assertEqual(DeployJournal.read(self._journal_file, self.BUCKET_NAME), None)
+
+        DeployJournal.begin(self._journal_file, "other.com", None)
+
+        self.assertEqual(DeployJournal.read(self._journal_file, self.BUCKET_NAME), None)
+        self.assertEqual(DeployJournal.read(self._journal_file, "other.com"), (None, []))
@@ -0,0 +1,133 @@
+"""
+Tests for `manifest.py`, particularly the `Manifest` class.
+"""
+
+# pylint: disable=import-error
+
+import unittest
+
+import boto3
+
+from moto import mock_s3
+
+from sdep.inventory import RemoteObject
+from sdep.manifest import Manifest
+
+class ManifestTestCase(unittest.TestCase):
+    """
+    Test cases for the `Manifest` class.
+    """
+
+    BUCKET_NAME = "sdep-test.com"
+
+    def __init__(self, *args, **kwargs):
+        unittest.TestCase.__init__(self, *args, **kwargs)
+
+        self._s3_client = boto3.client("s3", aws_access_key_id="TEST_ID",
+                                       aws_secret_access_key="TEST_KEY")
+
+    def test_round_trip(self):
+        """
+        Test that a serialized manifest parses back to the same objects, that
+        serializing is deterministic, and that `sdep`'s own keys are excluded.
+        """
+        manifest = Manifest([
+            self._remote_object("index.html", "abc"),
+            self._remote_object("css/main.css", "def"),
+            self._remote_object(Manifest.KEY, "ghi")
+        ])
+
+        self.assertEqual(manifest.dumps(), manifest.dumps())
+
+        index = Manifest.loads(manifest.dumps()).to_index()
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.get("css/main.css").etag, "def")
+        self.assertEqual(index.get("index.html").content_type, "text/html")
+        self.assertFalse(Manifest.KEY in index)
+
+    def test_round_trip_source(self):
+        """
+        Test that the commit and settings digest a manifest records survive
+        serializing, and default to `None`.
+        """
+        objects = [self._remote_object("index.html", "abc")]
+
+        manifest = Manifest.loads(Manifest(objects, commit="1234",
+                                           settings="5678").dumps())
+        self.assertEqual((manifest.commit, manifest.settings), ("1234", "5678"))
+
+        manifest = Manifest.loads(Manifest(objects).dumps())
+        self.assertEqual((manifest.commit, manifest.settings), (None, None))
+
+    def test_loads_rejects_bad_data(self):
+        """
+        Test that data which is not a manifest raises a `ValueError` or an
+        `IOError`, both of which `fetch` treats as a missing manifest.
+        """
+        with self.assertRaises((IOError, ValueError)):
+            Manifest.loads(b"not a manifest")
+
+    @mock_s3
+    def test_fetch_and_verify(self):
+        """
+        Test fetching a stored manifest, and that verifying it fails once the
+        bucket no longer matches.
+        """
+        self._s3_client.create_bucket(Bucket=self.BUCKET_NAME)
+
+        self.assertEqual(Manifest.fetch(self._s3_client, self.BUCKET_NAME), None)
+
+        resp = self._s3_client.put_object(Bucket=self.BUCKET_NAME,
+                                          Key="index.html", Body=b"TEST")
+        etag = resp["ETag"].strip('"')
+
+        Manifest([self._remote_object("index.html", etag)]).put(
+            self._s3_client, self.BUCKET_NAME)
+
+        manifest = Manifest.fetch(self._s3_client, self.BUCKET_NAME)
+        self.assertEqual(len(manifest), 1)
+        self.assertTrue(manifest.verify(self._s3_client, self.BUCKET_NAME))
+
+        self._s3_client.put_object(Bucket=self.BUCKET_NAME, Key="index.html",
+                                   Body=b"CHANGED")
+        self.assertFalse(manifest.verify(self._s3_client, self.BUCKET_NAME))
+
+    @mock_s3
+    def test_verify_fails_closed(self):
+        """
+        Test that a manifest we cannot check is not trusted: without a sample,
+        or when it is empty but the bucket is not.
+        """
+        self._s3_client.create_bucket(Bucket=self.BUCKET_NAME)
+
+        resp = self._s3_client.put_object(Bucket=self.BUCKET_NAME,
+                                          Key="index.html", Body=b"TEST")
+        manifest = Manifest([self._remote_object("index.html",
+                                                 resp["ETag"].strip('"'))])
+
+        self.assertTrue(manifest.verify(self._s3_client, self.BUCKET_NAME,
+                                        sample_size=1))
+        self.assertFalse(manifest.verify(self._s3_client, self.BUCKET_NAME,
+                                         sample_size=0))
+
+        Manifest([]).put(self._s3_client, self.BUCKET_NAME)
+        self.assertFalse(Manifest([]).verify(self._s3_client, self.BUCKET_NAME))
+
+        self._s3_client.delete_object(Bucket=self.BUCKET_NAME, Key="index.html")
+        self.assertTrue(Manifest([]).verify(self._s3_client, self.BUCKET_NAME))
+
+    @staticmethod
+    def _remote_object(key, etag):
+        """
+        Create a `RemoteObject` for an html file.
+
+        Args:
+            key (str): The key name.
+            etag (str): The `ETag`.
+
+        Returns:
+            RemoteObject: The object.
+        """
+        return RemoteObject(key=key, etag=etag, size=4, last_modified=None,
+                            content_type="text/html", headers={})
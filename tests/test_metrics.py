@@ -0,0 +1,88 @@
+"""
+Tests for `metrics.py`, particularly the `DeployMetrics` class.
+"""
+
+# pylint: disable=import-error
+
+import unittest
+
+import boto3
+
+from moto import mock_s3
+
+import simplejson as json
+
+from sdep.metrics import DeployMetrics
+
+class DeployMetricsTestCase(unittest.TestCase):
+    """
+    Test cases for the `DeployMetrics` class.
+    """
+
+    def test_phases_and_counters(self):
+        """
+        Test that time spent in the same phase adds up, and that counters
+        increment.
+        """
+        metrics = DeployMetrics()
+
+        for _ in range(3):
+            with metrics.phase(DeployMetrics.HASH):
+                pass
+
+        metrics.add_time(DeployMetrics.HASH, 1.5)
+        metrics.incr(DeployMetrics.FILES_UPLOADED)
+        metrics.incr(DeployMetrics.BYTES_SENT, 1024)
+
+        self.assertTrue(metrics.phase_seconds(DeployMetrics.HASH) >= 1.5)
+        self.assertEqual(metrics.counter(DeployMetrics.FILES_UPLOADED), 1)
+        self.assertEqual(metrics.counter(DeployMetrics.BYTES_SENT), 1024)
+        self.assertEqual(metrics.counter(DeployMetrics.FILES_SKIPPED), 0)
+
+    def test_timed_iter(self):
+        """
+        Test that timing an iterable yields all of its items and records the
+        phase.
+        """
+        metrics = DeployMetrics()
+
+        items = list(metrics.timed_iter(DeployMetrics.SCAN, iter([1, 2, 3])))
+
+        self.assertEqual(items, [1, 2, 3])
+        self.assertTrue(DeployMetrics.SCAN in metrics.to_dict()["phases"])
+
+    def test_formats(self):
+        """
+        Test the JSON and StatsD output formats.
+        """
+        metrics = DeployMetrics()
+        metrics.add_time(DeployMetrics.UPLOAD, 0.25)
+        metrics.incr(DeployMetrics.FILES_UPLOADED, 2)
+        metrics.gauge(DeployMetrics.CONCURRENCY, 12)
+
+        self.assertEqual(json.loads(metrics.to_json())["counters"],
+                         {DeployMetrics.FILES_UPLOADED: 2})
+        self.assertEqual(json.loads(metrics.to_json())["gauges"],
+                         {DeployMetrics.CONCURRENCY: 12})
+
+        statsd_lines = metrics.to_statsd().split("\n")
+        self.assertTrue("sdep.phase.upload:250|ms" in statsd_lines)
+        self.assertTrue("sdep.files_uploaded:2|c" in statsd_lines)
+        self.assertTrue("sdep.concurrency:12|g" in statsd_lines)
+
+    @mock_s3
+    def test_attach(self):
+        """
+        Test that attaching to a client counts its requests by operation.
+        """
+        s3_client = boto3.client("s3", aws_access_key_id="TEST_ID",
+                                 aws_secret_access_key="TEST_KEY")
+        metrics = DeployMetrics()
+        metrics.attach(s3_client)
+
+        s3_client.create_bucket(Bucket="sdep-test.com")
+        s3_client.list_buckets()
+        s3_client.list_buckets()
+
+        self.assertEqual(metrics.requests(),
+                         {"CreateBucket": 1, "ListBuckets": 2})
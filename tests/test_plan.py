@@ -0,0 +1,86 @@
+"""
+Tests for `plan.py`, particularly the `Plan` class.
+"""
+
+# pylint: disable=import-error
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sdep.manifest import Manifest
+from sdep.plan import Plan, PlanEntry, StalePlanError
+
+class PlanTestCase(unittest.TestCase):
+    """
+    Test cases for the `Plan` class.
+    """
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        """
+        Test that a saved plan loads back with the same entries.
+        """
+        plan = Plan("sdep-test.com", "abc", Manifest([]), [
+            self._upload_entry("index.html", b"TEST"),
+            PlanEntry(Plan.DELETE, "old.html", None, None, None, None, None)
+        ], skipped=3)
+
+        plan_file = os.path.join(self._tmp_dir, "plan.json.gz")
+        plan.save(plan_file)
+        loaded = Plan.load(plan_file)
+
+        self.assertEqual(loaded.entries, plan.entries)
+        self.assertEqual(loaded.manifest_etag, "abc")
+        self.assertEqual(loaded.skipped, 3)
+        self.assertEqual([e.key for e in loaded.deletes()], ["old.html"])
+
+        with self.assertRaises((IOError, ValueError)):
+            Plan.loads(b"not a plan")
+
+    def test_check_local_files(self):
+        """
+        Test that a plan is stale once a file it uploads changes.
+        """
+        plan = Plan("sdep-test.com", None, Manifest([]),
+                    [self._upload_entry("index.html", b"TEST")])
+
+        plan.check_local_files(self._tmp_dir)
+
+        with open(os.path.join(self._tmp_dir, "index.html"), "ab") as index_file:
+            index_file.write(b"CHANGED")
+
+        with self.assertRaises(StalePlanError):
+            plan.check_local_files(self._tmp_dir)
+
+        os.remove(os.path.join(self._tmp_dir, "index.html"))
+
+        with self.assertRaises(StalePlanError):
+            plan.check_local_files(self._tmp_dir)
+
+    def _upload_entry(self, key, contents):
+        """
+        Create a local file and a plan entry uploading it.
+
+        Args:
+            key (str): The key of the file.
+            contents (bytes): The contents of the file.
+
+        Returns:
+            PlanEntry: The entry.
+        """
+        full_path = os.path.join(self._tmp_dir, key)
+
+        with open(full_path, "wb") as new_file:
+            new_file.write(contents)
+
+        stat_result = os.stat(full_path)
+
+        return PlanEntry(Plan.UPLOAD, key, "etag", stat_result.st_size,
+                         stat_result.st_mtime_ns, {"ContentType": "text/html"}, None)
@@ -0,0 +1,52 @@
+"""
+Tests for `release.py`, particularly the `ReleaseHistory` class.
+"""
+
+# pylint: disable=import-error
+
+import unittest
+
+from sdep.release import ReleaseError, ReleaseHistory
+
+class ReleaseHistoryTestCase(unittest.TestCase):
+    """
+    Test cases for the `ReleaseHistory` class.
+    """
+
+    def test_release_id(self):
+        """
+        Test that the release id depends on the contents of the release, but
+        not on the order in which we found its files.
+        """
+        files = [("index.html", "abc", {"ContentType": "text/html"}),
+                 ("main.css", "def", {"ContentType": "text/css"})]
+
+        self.assertEqual(ReleaseHistory.release_id(files),
+                         ReleaseHistory.release_id(reversed(files)))
+        self.assertNotEqual(ReleaseHistory.release_id(files),
+                            ReleaseHistory.release_id(files[:1]))
+
+    def test_previous(self):
+        """
+        Test finding the release which was live before the live one, even after
+        an earlier release is made live again.
+        """
+        history = ReleaseHistory()
+        history.add("first", 2)
+        history.add("second", 2)
+        history.add("first", 2)
+
+        self.assertEqual(len(history.releases), 2)
+
+        history.activate("first")
+        with self.assertRaises(ReleaseError):
+            history.previous()
+
+        history.activate("second")
+        self.assertEqual(history.previous(), "first")
+
+        history.activate("first")
+        self.assertEqual(history.previous(), "second")
+
+        with self.assertRaises(ReleaseError):
+            history.activate("unknown")
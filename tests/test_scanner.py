@@ -0,0 +1,161 @@
+"""
+Tests for `scanner.py`, particularly the `IgnoreRules` and `SiteScanner`
+classes.
+"""
+
+# pylint: disable=import-error
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from sdep.scanner import IgnoreRules, SiteScanner
+
+class IgnoreRulesTestCase(unittest.TestCase):
+    """
+    Test cases for the `IgnoreRules` class.
+    """
+
+    def test_patterns(self):
+        """
+        Test comments, anchored and unanchored patterns, directory-only
+        patterns and negation, where the last matching pattern wins.
+        """
+        rules = IgnoreRules([
+            "# Source maps",
+            "*.map",
+            "!vendor/*.map",
+            "",
+            "/drafts",
+            "tmp/"
+        ])
+
+        self.assertEqual(rules.patterns, ["*.map", "!vendor/*.map", "/drafts", "tmp/"])
+
+        self.assertTrue(rules.ignores("app.js.map"))
+        self.assertTrue(rules.ignores("js/app.js.map"))
+        self.assertFalse(rules.ignores("vendor/lib.js.map"))
+        self.assertFalse(rules.ignores("app.js"))
+
+        self.assertTrue(rules.ignores("drafts", is_dir=True))
+        self.assertFalse(rules.ignores("blog/drafts", is_dir=True))
+
+        self.assertTrue(rules.ignores("blog/tmp", is_dir=True))
+        self.assertFalse(rules.ignores("blog/tmp"))
+
+        self.assertTrue(rules.ignores_path("blog/tmp/post.html"))
+        self.assertFalse(rules.ignores_path("blog/post.html"))
+
+    def test_load(self):
+        """
+        Test that we always leave out version control and editor files, and
+        read further patterns from the site's `.sdepignore`.
+        """
+        site_dir = tempfile.mkdtemp()
+
+        rules = IgnoreRules.load(site_dir)
+        self.assertTrue(rules.ignores(".git", is_dir=True))
+        self.assertTrue(rules.ignores("blog/.DS_Store"))
+        self.assertTrue(rules.ignores("index.html.swp"))
+        self.assertFalse(rules.ignores("index.html"))
+
+        with open(os.path.join(site_dir, IgnoreRules.FILE_NAME), "w") as ignore_file:
+            ignore_file.write("*.map\n!.DS_Store\n")
+
+        rules = IgnoreRules.load(site_dir)
+        self.assertTrue(rules.ignores(IgnoreRules.FILE_NAME))
+        self.assertTrue(rules.ignores("app.js.map"))
+        self.assertFalse(rules.ignores(".DS_Store"))
+
+        shutil.rmtree(site_dir, ignore_errors=True)
+
+class SiteScannerTestCase(unittest.TestCase):
+    """
+    Test cases for the `SiteScanner` class.
+    """
+
+    def setUp(self):
+        self._site_dir = tempfile.mkdtemp()
+
+        for name in ["index.html", "css/main.css", "css/main.css.map",
+                     "node_modules/lib/index.js", ".git/HEAD", ".DS_Store"]:
+            self._write(name, "TEST")
+
+        self._write(IgnoreRules.FILE_NAME, "*.map\nnode_modules/\n")
+
+    def tearDown(self):
+        shutil.rmtree(self._site_dir, ignore_errors=True)
+
+    def test_scan(self):
+        """
+        Test that we find every file which is not ignored, under its key and
+        with its `stat`, and never descend into ignored directories.
+        """
+        scanned_dirs = []
+        scandir = os.scandir
+
+        def record_scandir(path):
+            """
+            Record each directory we scan.
+
+            Args:
+                path (str): The directory.
+
+            Returns:
+                iterator: Its entries.
+            """
+            scanned_dirs.append(os.path.relpath(path, self._site_dir))
+            return scandir(path)
+
+        with patch("sdep.scanner.os.scandir", side_effect=record_scandir):
+            scanned = list(SiteScanner(self._site_dir).scan())
+
+        self.assertEqual(sorted(scanned_file.key for scanned_file in scanned),
+                         ["css/main.css", "index.html"])
+        self.assertEqual(sorted(scanned_dirs), [".", "css"])
+
+        for scanned_file in scanned:
+            self.assertEqual(scanned_file.path,
+                             os.path.join(self._site_dir, scanned_file.key))
+            self.assertEqual(scanned_file.stat.st_size, len("TEST"))
+
+    def test_symlinks(self):
+        """
+        Test that we deploy symlinked files, skip broken symlinks, and only
+        descend into symlinked directories when asked to, without looping.
+        """
+        os.symlink(os.path.join(self._site_dir, "index.html"),
+                   os.path.join(self._site_dir, "home.html"))
+        os.symlink(os.path.join(self._site_dir, "missing.html"),
+                   os.path.join(self._site_dir, "broken.html"))
+        os.symlink(self._site_dir, os.path.join(self._site_dir, "css", "loop"))
+        os.symlink(os.path.join(self._site_dir, "css"),
+                   os.path.join(self._site_dir, "styles"))
+
+        keys = sorted(scanned_file.key for scanned_file in
+                      SiteScanner(self._site_dir).scan())
+        self.assertEqual(keys, ["css/main.css", "home.html", "index.html"])
+
+        keys = sorted(scanned_file.key for scanned_file in
+                      SiteScanner(self._site_dir, follow_symlinks=True).scan())
+        self.assertEqual(keys, ["css/main.css", "home.html", "index.html",
+                                "styles/main.css"])
+
+    def _write(self, name, contents):
+        """
+        Write a file of the site, creating its directory if needed.
+
+        Args:
+            name (str): The path of the file, relative to the site.
+            contents (str): The contents.
+        """
+        full_path = os.path.join(self._site_dir, name)
+
+        if not os.path.isdir(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+
+        with open(full_path, "w") as site_file:
+            site_file.write(contents)
@@ -0,0 +1,186 @@
+"""
+Tests for `throttle.py`, particularly the `AdaptiveLimiter` and
+`ThrottleController` classes.
+"""
+
+# pylint: disable=import-error
+
+import threading
+import unittest
+
+import boto3
+
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config as BotocoreConfig
+from moto import mock_s3
+
+from sdep.metrics import DeployMetrics
+from sdep.throttle import AdaptiveLimiter, ThrottleController
+
+class AdaptiveLimiterTestCase(unittest.TestCase):
+    """
+    Test cases for the `AdaptiveLimiter` class.
+    """
+
+    def test_increase(self):
+        """
+        Test that the limit grows by about one per round of prompt requests, up
+        to the maximum, and stops growing when requests slow down.
+        """
+        limiter = AdaptiveLimiter(4, 6)
+
+        for _ in range(5):
+            limiter.on_success(1.0)
+
+        self.assertEqual(limiter.limit, 5)
+
+        for _ in range(5):
+            limiter.on_success(10.0)
+
+        self.assertEqual(limiter.limit, 5)
+
+        for _ in range(20):
+            limiter.on_success(1.0)
+
+        self.assertEqual(limiter.limit, 6)
+
+    def test_decrease_once_per_round(self):
+        """
+        Test that requests throttled together halve the limit only once, down
+        to the minimum.
+        """
+        limiter = AdaptiveLimiter(8, 8, minimum=2)
+        tickets = [limiter.acquire() for _ in range(8)]
+
+        self.assertTrue(limiter.on_throttle(tickets[0]))
+        self.assertFalse(limiter.on_throttle(tickets[1]))
+        self.assertEqual(limiter.limit, 4)
+
+        for _ in tickets:
+            limiter.release()
+
+        self.assertTrue(limiter.on_throttle(limiter.acquire()))
+        self.assertEqual(limiter.limit, 2)
+
+        self.assertFalse(limiter.on_throttle(limiter.acquire()))
+        self.assertEqual(limiter.limit, 2)
+
+    def test_acquire_waits(self):
+        """
+        Test that `acquire` blocks while the limit is reached.
+        """
+        limiter = AdaptiveLimiter(1, 1)
+        limiter.acquire()
+
+        acquired = threading.Event()
+
+        def acquire():
+            """
+            Acquire a place and signal that we did.
+            """
+            limiter.acquire()
+            acquired.set()
+
+        waiter = threading.Thread(target=acquire)
+        waiter.start()
+
+        self.assertFalse(acquired.wait(0.05))
+
+        limiter.release()
+        self.assertTrue(acquired.wait(1))
+
+        waiter.join()
+
+class ThrottleControllerTestCase(unittest.TestCase):
+    """
+    Test cases for the `ThrottleController` class.
+    """
+
+    BUCKET_NAME = "sdep-test.com"
+
+    SLOW_DOWN = (b"<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+                 b"<Error><Code>SlowDown</Code>"
+                 b"<Message>Please reduce your request rate.</Message></Error>")
+
+    @mock_s3
+    def test_retries_throttled_requests(self):
+        """
+        Test that throttled requests are retried until they succeed, and that
+        throttling lowers the limit and is recorded in the metrics.
+        """
+        s3_client = boto3.client(
+            "s3", aws_access_key_id="TEST_ID", aws_secret_access_key="TEST_KEY",
+            config=BotocoreConfig(retries={
+                "mode": "standard",
+                "max_attempts": ThrottleController.MAX_ATTEMPTS}))
+        s3_client.create_bucket(Bucket=self.BUCKET_NAME)
+
+        metrics = DeployMetrics()
+        controller = ThrottleController(AdaptiveLimiter(8, 8), metrics=metrics,
+                                        base_delay=0.001)
+        controller.attach(s3_client)
+        metrics.attach(s3_client)
+        self.assertEqual(metrics.to_dict()["gauges"][DeployMetrics.CONCURRENCY], 8)
+
+        throttled = [3]
+
+        def throttle(request, **_):
+            """
+            Answer the first few uploads with `SlowDown`, as a busy bucket
+            would.
+
+            Args:
+                request (AWSPreparedRequest): The request.
+
+            Returns:
+                AWSResponse: The error, or `None` to send the request.
+            """
+            if request.method != "PUT" or not throttled[0]:
+                return None
+
+            throttled[0] -= 1
+
+            return AWSResponse(request.url, 503, {}, FakeRawResponse(self.SLOW_DOWN))
+
+        s3_client.meta.events.register_first("before-send.s3", throttle)
+
+        for i in range(4):
+            s3_client.put_object(Bucket=self.BUCKET_NAME, Key="{0}.html".format(i),
+                                 Body=b"TEST")
+
+        resp_objects = s3_client.list_objects(Bucket=self.BUCKET_NAME)
+        self.assertEqual(len(resp_objects["Contents"]), 4)
+
+        self.assertEqual(metrics.counter(DeployMetrics.REQUESTS_THROTTLED), 3)
+        self.assertEqual(metrics.counter(DeployMetrics.RETRIES), 3)
+        self.assertTrue(metrics.to_dict()["gauges"][DeployMetrics.CONCURRENCY] < 8)
+
+    def test_delay(self):
+        """
+        Test that the delay before a retry is jittered under a cap which
+        doubles with every attempt, up to the maximum.
+        """
+        controller = ThrottleController(AdaptiveLimiter(1, 1), base_delay=1.0,
+                                        max_delay=5.0)
+
+        for attempts, cap in [(1, 1.0), (2, 2.0), (3, 4.0), (10, 5.0)]:
+            delays = [controller.delay(attempts) for _ in range(50)]
+
+            self.assertTrue(all(0 <= delay <= cap for delay in delays))
+            self.assertTrue(len(set(delays)) > 1)
+
+class FakeRawResponse(object):
+    """
+    A stand-in for the raw HTTP response botocore reads a body from.
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, body):
+        self._body = body
+
+    def stream(self):
+        """
+        Yields:
+            bytes: The body.
+        """
+        yield self._body
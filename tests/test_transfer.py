@@ -0,0 +1,76 @@
+"""
+Tests for `transfer.py`, particularly the `TransferPolicy` class.
+"""
+
+# pylint: disable=import-error
+
+import unittest
+
+from sdep.transfer import MIB, TransferPolicy, TransferPolicyError, adjusted_chunksize
+
+class TransferPolicyTestCase(unittest.TestCase):
+    """
+    Test cases for the `TransferPolicy` class.
+    """
+
+    def setUp(self):
+        self._policy = TransferPolicy()
+
+    def test_part_size(self):
+        """
+        Test that we upload small and medium files in a single request, and
+        large files in parts which grow with the file.
+        """
+        self.assertEqual(self._policy.part_size(2 * 1024), None)
+        self.assertEqual(self._policy.part_size(32 * MIB), None)
+        self.assertEqual(self._policy.part_size(100 * MIB), 16 * MIB)
+        self.assertEqual(self._policy.part_size(4096 * MIB), 64 * MIB)
+
+    def test_part_size_too_big_for_single_request(self):
+        """
+        Test that a file s3 refuses in a single request is uploaded in parts,
+        even if its class uploads in a single request.
+        """
+        policy = TransferPolicy([{"min_size": 0}])
+
+        self.assertEqual(policy.part_size(6 * 1024 * MIB),
+                         TransferPolicy.FALLBACK_CHUNKSIZE)
+
+    def test_transfer_configs(self):
+        """
+        Test that each class has a `TransferConfig` which only splits the files
+        of the class into parts when the class uploads in parts.
+        """
+        configs = self._policy.transfer_configs()
+
+        self.assertEqual(len(configs), 3)
+        self.assertEqual(self._policy.class_index(2 * 1024), 0)
+        self.assertEqual(self._policy.class_index(100 * MIB), 1)
+        self.assertEqual(self._policy.class_index(4096 * MIB), 2)
+
+        self.assertTrue(configs[0].multipart_threshold > 64 * MIB)
+        self.assertEqual(configs[1].multipart_threshold, 64 * MIB)
+        self.assertEqual(configs[1].multipart_chunksize, 16 * MIB)
+        self.assertEqual(configs[2].max_concurrency, 16)
+        self.assertEqual(self._policy.max_concurrency(), 16)
+
+    def test_improper_classes(self):
+        """
+        Test that we refuse classes which do not cover every size or lack a
+        minimum size.
+        """
+        with self.assertRaises(TransferPolicyError):
+            TransferPolicy([{"min_size": 1024}])
+
+        with self.assertRaises(TransferPolicyError):
+            TransferPolicy([{"multipart_chunksize": 8 * MIB}])
+
+        with self.assertRaises(TransferPolicyError):
+            TransferPolicy([{"min_size": 0, "max_concurrency": 0}])
+
+    def test_adjusted_chunksize(self):
+        """
+        Test that we keep part sizes within the limits of s3.
+        """
+        self.assertEqual(adjusted_chunksize(100 * MIB, MIB), 5 * MIB)
+        self.assertEqual(adjusted_chunksize(100000 * MIB, 8 * MIB), 16 * MIB)
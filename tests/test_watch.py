@@ -0,0 +1,89 @@
+"""
+Tests for `watch.py`, particularly the `SiteWatcher` class.
+"""
+
+# pylint: disable=import-error
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from sdep import watch
+from sdep.watch import SiteWatcher
+
+class SiteWatcherTestCase(unittest.TestCase):
+    """
+    Test cases for the `SiteWatcher` class.
+    """
+
+    def setUp(self):
+        self._site_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self._site_dir, "public"))
+
+        for key in ["index.html", "public/index.js"]:
+            self._write(key, "TEST")
+
+    def tearDown(self):
+        shutil.rmtree(self._site_dir, ignore_errors=True)
+
+    def test_polling(self):
+        """
+        Test that polling reports created, changed and deleted files in a
+        single batch.
+        """
+        self._check_batches(SiteWatcher(self._site_dir, debounce=0.05,
+                                        poll_interval=0.02, use_inotify=False))
+
+    def test_falls_back_to_polling(self):
+        """
+        Test that without `inotify_simple` installed, a watcher which does not
+        ask for a backend polls, and still reports every change.
+        """
+        with patch.object(watch, "inotify_simple", None):
+            watcher = SiteWatcher(self._site_dir, debounce=0.05, poll_interval=0.02)
+
+        self._check_batches(watcher)
+
+    @unittest.skipIf(watch.inotify_simple is None, "inotify_simple is not installed")
+    def test_inotify(self):
+        """
+        Test that inotify reports created, changed and deleted files in a
+        single batch, including files in new directories.
+        """
+        self._check_batches(SiteWatcher(self._site_dir, debounce=0.05,
+                                        use_inotify=True))
+
+    def _check_batches(self, watcher):
+        """
+        Make changes to the site and check the watcher reports them.
+
+        Args:
+            watcher (SiteWatcher): The watcher of the site.
+        """
+        watcher.start()
+
+        self._write("index.html", "CHANGED")
+        os.remove(os.path.join(self._site_dir, "public", "index.js"))
+        os.makedirs(os.path.join(self._site_dir, "docs"))
+        self._write("docs/page.html", "NEW")
+
+        batches = watcher.batches()
+        self.assertEqual(next(batches),
+                         set(["index.html", "public/index.js", "docs/page.html"]))
+
+        self._write("docs/page.html", "NEWER")
+        self.assertEqual(next(batches), set(["docs/page.html"]))
+
+    def _write(self, key, contents):
+        """
+        Write a file of the site.
+
+        Args:
+            key (str): The path of the file, relative to the site.
+            contents (str): The contents of the file.
+        """
+        with open(os.path.join(self._site_dir, key), "w") as site_file:
+            site_file.write(contents)